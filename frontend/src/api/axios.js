@@ -27,6 +27,37 @@ api.interceptors.request.use(
   }
 );
 
+// One refresh at a time: concurrent 401s wait for the same promise instead
+// of each presenting the (soon to be rotated) refresh token again
+let refreshPromise = null;
+
+const refreshTokens = () => {
+  if (!refreshPromise) {
+    refreshPromise = (async () => {
+      const refreshToken = localStorage.getItem('refresh_token');
+      if (!refreshToken) {
+        throw new Error('No refresh token available');
+      }
+
+      const response = await axios.post(
+        `${API_BASE_URL}/auth/token/refresh/`,
+        { refresh: refreshToken }
+      );
+
+      // Refresh tokens are rotated: keep the new one, the old one is spent
+      const { access, refresh } = response.data;
+      localStorage.setItem('access_token', access);
+      if (refresh) {
+        localStorage.setItem('refresh_token', refresh);
+      }
+      return access;
+    })().finally(() => {
+      refreshPromise = null;
+    });
+  }
+  return refreshPromise;
+};
+
 // Response interceptor to handle token expiration
 api.interceptors.response.use(
   (response) => response,
@@ -38,19 +69,7 @@ api.interceptors.response.use(
       originalRequest._retry = true;
 
       try {
-        const refreshToken = localStorage.getItem('refresh_token');
-        if (!refreshToken) {
-          throw new Error('No refresh token available');
-        }
-
-        // Try to refresh the token
-        const response = await axios.post(
-          `${API_BASE_URL}/auth/token/refresh/`,
-          { refresh: refreshToken }
-        );
-
-        const { access } = response.data;
-        localStorage.setItem('access_token', access);
+        const access = await refreshTokens();
 
         // Retry original request with new token
         originalRequest.headers.Authorization = `Bearer ${access}`;
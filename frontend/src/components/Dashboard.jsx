@@ -1,6 +1,6 @@
 /**
  * Dashboard component - Protected route
- * Displays user profile with decrypted Aadhaar number
+ * Displays user profile with the masked Aadhaar number
  */
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
@@ -59,11 +59,6 @@ const Dashboard = () => {
     });
   };
 
-  const maskAadhaar = (aadhaar) => {
-    if (!aadhaar || aadhaar.length !== 12) return aadhaar;
-    return `XXXX-XXXX-${aadhaar.slice(-4)}`;
-  };
-
   if (loading) {
     return (
       <div className="dashboard-container">
@@ -154,14 +149,10 @@ const Dashboard = () => {
           </div>
           
           <div className="detail-item">
-            <label>Aadhaar Number (Decrypted)</label>
-            {userData?.aadhaar ? (
+            <label>Aadhaar Number</label>
+            {userData?.aadhaar_masked ? (
               <div className="aadhaar-display">
-                <p className="aadhaar-number">{userData.aadhaar}</p>
-                <p className="aadhaar-masked">Masked: {maskAadhaar(userData.aadhaar)}</p>
-                <small className="security-text">
-                  ✓ Decrypted securely on server-side
-                </small>
+                <p className="aadhaar-masked">{userData.aadhaar_masked}</p>
               </div>
             ) : (
               <p className="text-muted">Not provided</p>
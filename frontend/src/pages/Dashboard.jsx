@@ -6,6 +6,7 @@ const Dashboard = () => {
   const navigate = useNavigate();
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [aadhaar, setAadhaar] = useState(null);
 
   useEffect(() => {
     const fetchProfile = async () => {
@@ -24,6 +25,21 @@ const Dashboard = () => {
     fetchProfile();
   }, []);
 
+  // The profile only carries the masked number; the full one is fetched
+  // on demand from the (audited) reveal endpoint and never cached
+  const toggleAadhaar = async () => {
+    if (aadhaar) {
+      setAadhaar(null);
+      return;
+    }
+    try {
+      const response = await api.get('profile/aadhaar/');
+      setAadhaar(response.data.aadhaar);
+    } catch (error) {
+      console.error("Failed to reveal Aadhaar", error);
+    }
+  };
+
   const handleLogout = () => {
     localStorage.removeItem('access_token');
     localStorage.removeItem('refresh_token');
@@ -76,7 +92,7 @@ const Dashboard = () => {
           <div style={{ display: 'flex', alignItems: 'center', marginBottom: '8px' }}>
             <span style={{ fontSize: '18px', marginRight: '8px' }}>🔒</span>
             <label style={{ fontSize: '12px', fontWeight: 'bold', color: '#00695c', textTransform: 'uppercase', marginBottom: 0 }}>
-              Decrypted Aadhaar ID
+              Aadhaar ID
             </label>
           </div>
           
@@ -87,10 +103,18 @@ const Dashboard = () => {
             letterSpacing: '2px',
             fontFamily: 'monospace' 
           }}>
-            {user?.aadhaar || "Not Provided"}
+            {aadhaar || user?.aadhaar_masked || "Not Provided"}
           </div>
+          {user?.aadhaar_masked && (
+            <button
+              onClick={toggleAadhaar}
+              style={{ marginTop: '10px', padding: '6px 16px', fontSize: '12px' }}
+            >
+              {aadhaar ? 'Hide' : 'Reveal'}
+            </button>
+          )}
           <div style={{ fontSize: '11px', color: '#00796b', marginTop: '5px' }}>
-            * This data was encrypted in DB and decrypted just for you.
+            * Stored encrypted. The full number is decrypted only when you reveal it.
           </div>
         </div>
 
@@ -0,0 +1,92 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+Benchmarks are plain scripts, run from the ``identity_service`` directory:
+
+    python benchmarks/<name>.py --help
+
+Those that need a database create a throwaway test database, so they never
+touch ``db.sqlite3``.
+"""
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(settings_module='identity_service.settings'):
+    """
+    Put the project on sys.path and configure Django.
+    """
+    if str(PROJECT_DIR) not in sys.path:
+        sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """
+    Create a throwaway test database for the duration of the block.
+    """
+    from django.db import connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_names = []
+    for alias in connections:
+        connection = connections[alias]
+        old_names.append((connection, connection.settings_dict['NAME']))
+        connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        for connection, old_name in old_names:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def timed(func, iterations):
+    """
+    Call ``func`` repeatedly and return per-call timings in microseconds.
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def summarize(samples):
+    """
+    Return mean, p50 and p99 of a list of samples.
+    """
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return {
+        'mean': statistics.fmean(ordered),
+        'p50': statistics.median(ordered),
+        'p99': p99,
+    }
+
+
+def print_table(headers, rows):
+    """
+    Print rows as a fixed-width table.
+    """
+    widths = [
+        max(len(str(header)), *(len(str(row[i])) for row in rows))
+        for i, header in enumerate(headers)
+    ]
+    line = '  '.join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(str(c).ljust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,50 @@
+"""
+Profile GET latency with a masked vs decrypted Aadhaar.
+
+Times GET /api/profile/ in both PROFILE_AADHAAR_MODE settings and the
+explicit reveal endpoint, for a user with an Aadhaar number on file.
+
+    python benchmarks/aadhaar_display.py --requests 2000
+"""
+import argparse
+
+from _common import print_table, setup_django, summarize, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+
+    with test_database():
+        from users.models import User
+        from users.tokens import FamilyRefreshToken
+
+        user = User.objects.create_user(
+            username='bench', email='bench@example.com', password='bench-pass-123'
+        )
+        user.set_aadhaar('123456789012')
+        user.save()
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {FamilyRefreshToken.for_user(user).access_token}'}
+        client = Client()
+
+        rows = []
+        for label, url, mode in (
+            ('profile, masked', '/api/profile/', 'masked'),
+            ('profile, plaintext', '/api/profile/', 'plaintext'),
+            ('reveal endpoint', '/api/profile/aadhaar/', 'masked'),
+        ):
+            settings.PROFILE_AADHAAR_MODE = mode
+            client.get(url, **auth)
+            stats = summarize(timed(lambda: client.get(url, **auth), args.requests))
+            rows.append([label, f"{stats['mean']:.1f}", f"{stats['p50']:.1f}", f"{stats['p99']:.1f}"])
+
+    print_table(['request', 'mean us', 'p50 us', 'p99 us'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Storage size and crypto throughput: legacy base64/CBC text vs binary AES-GCM.
+
+Encrypts a synthetic fixture of random 12-digit Aadhaar numbers in both
+formats, decrypts them back, and stores each set in its own SQLite file to
+compare on-disk size.
+
+    python benchmarks/aadhaar_storage.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from _common import print_table, setup_django
+
+
+def on_disk_size(values, column_type):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'fixture.sqlite3')
+        db = sqlite3.connect(path)
+        db.execute(f'CREATE TABLE fixture (id INTEGER PRIMARY KEY, value {column_type})')
+        db.executemany('INSERT INTO fixture (value) VALUES (?)', ((v,) for v in values))
+        db.commit()
+        db.execute('VACUUM')
+        db.close()
+        return os.path.getsize(path)
+
+
+def measure(label, encrypt, decrypt, plaintexts, column_type):
+    start = time.perf_counter()
+    values = [encrypt(p) for p in plaintexts]
+    encrypt_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in values:
+        decrypt(value)
+    decrypt_s = time.perf_counter() - start
+
+    value_bytes = sum(len(v) for v in values)
+    return [
+        label,
+        f"{value_bytes / len(values):.1f}",
+        f"{value_bytes / 2**20:.1f}",
+        f"{on_disk_size(values, column_type) / 2**20:.1f}",
+        f"{len(values) / encrypt_s:,.0f}",
+        f"{len(values) / decrypt_s:,.0f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    from users.utils import EncryptionHelper
+
+    rng = random.Random(args.seed)
+    plaintexts = [f'{rng.randrange(10**11, 10**12)}' for _ in range(args.rows)]
+    helper = EncryptionHelper()
+
+    rows = [
+        measure('cbc base64 text', helper.encrypt, helper.decrypt, plaintexts, 'TEXT'),
+        measure('gcm binary', helper.encrypt_bytes, helper.decrypt_bytes, plaintexts, 'BLOB'),
+    ]
+    print(f'{args.rows:,} rows')
+    print_table(
+        ['format', 'bytes/value', 'values MiB', 'sqlite MiB', 'encrypt/s', 'decrypt/s'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
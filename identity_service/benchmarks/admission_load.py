@@ -0,0 +1,141 @@
+"""
+Profile latency while login is saturated, with and without admission control.
+
+Login threads hammer POST /api/auth/login/ (real password hashing) while
+profile threads measure GET /api/profile/. Without admission control every
+login hashes at once and profile reads wait for CPU; with it, logins over
+the limit get a quick 503 and profile p99 stays close to the idle value.
+
+    python benchmarks/admission_load.py --login-threads 16 --seconds 5
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from _common import print_table, setup_django, summarize
+
+
+def run(users, login_threads, profile_threads, seconds):
+    from django.db import connections
+    from django.test import Client
+
+    from users.tokens import FamilyRefreshToken
+
+    tokens = [str(FamilyRefreshToken.for_user(user).access_token) for user in users]
+    stop = threading.Event()
+    lock = threading.Lock()
+    profile_timings = []
+    logins = {200: 0, 503: 0}
+
+    def login_worker(index):
+        client = Client()
+        user = users[index % len(users)]
+        counts = {}
+        while not stop.is_set():
+            status = client.post('/api/auth/login/', {
+                'email': user.email, 'password': 'bench-pass-123',
+            }, content_type='application/json').status_code
+            counts[status] = counts.get(status, 0) + 1
+            if status == 503:
+                # Well-behaved clients back off instead of spinning
+                time.sleep(0.02)
+        connections.close_all()
+        with lock:
+            for status, count in counts.items():
+                logins[status] = logins.get(status, 0) + count
+
+    def profile_worker(index):
+        client = Client()
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {tokens[index % len(tokens)]}'}
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get('/api/profile/', **auth)
+            local.append((time.perf_counter() - start) * 1e6)
+            # A steady trickle of reads rather than another busy loop
+            time.sleep(0.005)
+        connections.close_all()
+        with lock:
+            profile_timings.extend(local)
+
+    pool = [threading.Thread(target=login_worker, args=(i,)) for i in range(login_threads)]
+    pool += [threading.Thread(target=profile_worker, args=(i,)) for i in range(profile_threads)]
+    for thread in pool:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in pool:
+        thread.join()
+
+    stats = summarize(profile_timings)
+    return {
+        'p50': stats['p50'],
+        'p99': stats['p99'],
+        'logins': logins.get(200, 0) / seconds,
+        'shed': logins.get(503, 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--login-threads', type=int, default=4 * (os.cpu_count() or 1))
+    parser.add_argument('--profile-threads', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='password hashing slots (default: settings)')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='admission-bench-'))
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    # Every shed login would otherwise log a "Service Unavailable" line
+    logging.getLogger('django.request').disabled = True
+    connections['default'].settings_dict['NAME'] = str(workdir / 'db.sqlite3')
+    hashing = settings.ADMISSION_CONTROL['CLASSES']['password_hashing']
+    if args.concurrency:
+        hashing['CONCURRENCY'] = args.concurrency
+
+    try:
+        call_command('migrate', verbosity=0)
+        from users.models import User
+        users = [
+            User.objects.create_user(
+                username=f'bench{i}', email=f'bench{i}@example.com', password='bench-pass-123'
+            )
+            for i in range(4)
+        ]
+        connections.close_all()
+
+        rows = []
+        for label, enabled in (('off', False), ('on', True)):
+            settings.ADMISSION_CONTROL = {**settings.ADMISSION_CONTROL, 'ENABLED': enabled}
+            result = run(users, args.login_threads, args.profile_threads, args.seconds)
+            rows.append([
+                label,
+                f"{result['p50'] / 1000:.1f}",
+                f"{result['p99'] / 1000:.1f}",
+                f"{result['logins']:.1f}",
+                result['shed'],
+            ])
+    finally:
+        connections.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.login_threads} login threads, {args.profile_threads} profile threads, "
+          f"{hashing['CONCURRENCY']} hashing slots")
+    print_table(['admission', 'profile p50 ms', 'profile p99 ms', 'logins/s', 'logins shed'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Cost of an incremental change-feed sync as the users table grows.
+
+For each table size, 100 users are changed after the consumer's cursor and
+the feed is read from that cursor to the end, next to a full sync of the
+same table. With the (updated_at, id) index the incremental sync stays flat;
+the full sync grows with the table.
+
+    python benchmarks/change_feed.py --sizes 1000 10000 100000 --changes 100
+"""
+import argparse
+import io
+import random
+from datetime import timedelta
+
+from _common import print_table, setup_django, summarize, test_database, timed
+
+
+def sync(fetch_changes, cursor=None):
+    has_more = True
+    count = 0
+    while has_more:
+        changes, cursor, has_more = fetch_changes(cursor)
+        count += sum(1 for _ in changes)
+    return count, cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--changes', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    settings.CHANGE_FEED = {**settings.CHANGE_FEED, 'SAFETY_LAG': 0}
+
+    with test_database():
+        from django.core.management import call_command
+        from django.utils import timezone
+        from users.changes import encode_cursor, fetch_changes
+        from users.models import User
+
+        rng = random.Random(args.seed)
+        rows = []
+        created = 0
+        for size in sorted(args.sizes):
+            call_command(
+                'generate_users', size - created, start=created, seed=args.seed,
+                password_hashes=1, stdout=io.StringIO(),
+            )
+            created = size
+
+            # The consumer is up to date...
+            last = User.objects.order_by('-updated_at', '-pk').only('updated_at').first()
+            cursor = encode_cursor(last.updated_at, last.pk)
+
+            # ...and then some users change
+            changed = rng.sample(list(User.objects.values_list('pk', flat=True)), args.changes)
+            now = timezone.now()
+            for offset, pk in enumerate(changed):
+                User.objects.filter(pk=pk).update(updated_at=now + timedelta(microseconds=offset))
+
+            count, _ = sync(fetch_changes, cursor)
+            assert count == args.changes, count
+            incremental = summarize(timed(lambda: sync(fetch_changes, cursor), args.rounds))
+            full = summarize(timed(lambda: sync(fetch_changes), max(1, args.rounds // 2)))
+            rows.append([
+                f'{size:,}',
+                args.changes,
+                f"{incremental['mean'] / 1000:.2f}",
+                f"{full['mean'] / 1000:.1f}",
+            ])
+
+    print_table(['users', 'changed', 'incremental ms', 'full sync ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+First-request latency of a fresh worker, with and without warm-up.
+
+Every trial starts a new interpreter, sets Django up the way a worker does
+and times its first requests against a prepared SQLite database:
+
+* warm-up      - users.warmup.warm_up(), run before the first request
+* first GET    - GET /api/profile/ with a bearer token
+* second GET   - the same request again (steady state)
+* first login  - POST /api/auth/login/ (includes one password hash check)
+
+    python benchmarks/first_request.py --trials 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'bench-pass-123'
+
+
+def prepare(database):
+    from _common import setup_django
+    setup_django()
+
+    from django.core.management import call_command
+    from django.db import connections
+
+    connections['default'].settings_dict['NAME'] = database
+    call_command('migrate', verbosity=0)
+
+    from users.models import User
+    from users.tokens import FamilyRefreshToken
+    user = User.objects.create_user(username='bench', email=EMAIL, password=PASSWORD)
+    print(json.dumps({'access': str(FamilyRefreshToken.for_user(user).access_token)}))
+
+
+def child(database, access, warm):
+    from _common import setup_django
+    setup_django()
+
+    from django.db import connections
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    connections['default'].settings_dict['NAME'] = database
+    setup_test_environment()
+
+    result = {'warmup_ms': 0.0}
+    if warm:
+        from users.warmup import warm_up
+        start = time.perf_counter()
+        warm_up()
+        result['warmup_ms'] = (time.perf_counter() - start) * 1000
+
+    client = Client()
+    for key in ('first_get_ms', 'second_get_ms'):
+        start = time.perf_counter()
+        response = client.get('/api/profile/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        result[key] = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    response = client.post(
+        '/api/auth/login/', {'email': EMAIL, 'password': PASSWORD}, content_type='application/json'
+    )
+    result['first_login_ms'] = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.content
+
+    print(json.dumps(result))
+
+
+def run_child(*args):
+    output = subprocess.run(
+        [sys.executable, __file__, *args],
+        check=True, capture_output=True, text=True,
+        env={k: v for k, v in os.environ.items() if k != 'IDENTITY_WARMUP'},
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--prepare', help=argparse.SUPPRESS)
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        prepare(args.prepare)
+        return
+    if args.child:
+        database, access, warm = args.child
+        child(database, access, warm == 'warm')
+        return
+
+    from _common import print_table
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database = os.path.join(workdir, 'bench.sqlite3')
+        access = run_child('--prepare', database)['access']
+
+        rows = []
+        for mode in ('cold', 'warm'):
+            trials = [run_child('--child', database, access, mode) for _ in range(args.trials)]
+            rows.append([mode] + [
+                f"{statistics.median(t[key] for t in trials):.1f}"
+                for key in ('warmup_ms', 'first_get_ms', 'second_get_ms', 'first_login_ms')
+            ])
+
+    print_table(['worker', 'warm-up ms', 'first GET ms', 'second GET ms', 'first login ms'], rows)
+    print(f"(median of {args.trials} fresh processes per row)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Throughput of POST /api/auth/introspect/ for batch sizes 1 to 1000.
+
+Each batch mixes access and refresh tokens from distinct login families,
+so revocation is resolved over as many families as there are tokens.
+
+    python benchmarks/introspection.py --rounds 20
+"""
+import argparse
+
+from _common import print_table, setup_django, summarize, test_database, timed
+
+BATCH_SIZES = [1, 10, 100, 500, 1000]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    settings.INTERNAL_SERVICE_TOKENS = {'bench': 'bench-token'}
+
+    with test_database():
+        from rest_framework.test import APIClient
+        from users.models import User
+        from users.tokens import FamilyRefreshToken
+
+        user = User.objects.create_user(
+            username='bench', email='bench@example.com', password='bench-pass-123'
+        )
+        tokens = []
+        for i in range(max(BATCH_SIZES) // 2):
+            refresh = FamilyRefreshToken.for_user(user)
+            tokens.extend([str(refresh.access_token), str(refresh)])
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Service bench-token')
+
+        rows = []
+        for size in BATCH_SIZES:
+            batch = {'tokens': tokens[:size]}
+
+            def call():
+                response = client.post('/api/auth/introspect/', batch, format='json')
+                assert response.status_code == 200, response.content
+
+            call()
+            stats = summarize(timed(call, args.rounds))
+            rows.append([
+                size,
+                f"{stats['mean'] / 1000:.2f}",
+                f"{stats['p99'] / 1000:.2f}",
+                f"{size / (stats['mean'] / 1e6):,.0f}",
+                f"{stats['mean'] / size:.1f}",
+            ])
+
+    print_table(['batch', 'mean ms', 'p99 ms', 'tokens/s', 'us/token'], rows)
+
+
+if __name__ == '__main__':
+    main()
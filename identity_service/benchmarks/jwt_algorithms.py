@@ -0,0 +1,75 @@
+"""
+Sign and verify cost per JWT algorithm through KeyRingTokenBackend.
+
+    python benchmarks/jwt_algorithms.py --iterations 2000
+"""
+import argparse
+
+from _common import print_table, setup_django, summarize, timed
+
+ALGORITHMS = ['HS256', 'RS256', 'ES256', 'EdDSA']
+
+
+def private_pem(algorithm):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if algorithm == 'RS256':
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == 'ES256':
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        key = ed25519.Ed25519PrivateKey.generate()
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def backend_for(algorithm):
+    from rest_framework_simplejwt.settings import api_settings
+    from users.signing import KeyRingTokenBackend, SigningKey
+
+    keys = []
+    if algorithm != 'HS256':
+        keys = [SigningKey('bench', algorithm, private_key=private_pem(algorithm))]
+    return KeyRingTokenBackend(
+        keys, algorithm='HS256', signing_key=api_settings.SIGNING_KEY,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework_simplejwt.utils import aware_utcnow, datetime_to_epoch
+
+    now = datetime_to_epoch(aware_utcnow())
+    payload = {
+        'token_type': 'access', 'exp': now + 3600, 'iat': now,
+        'jti': 'f' * 32, 'user_id': 42, 'fam': '0' * 36,
+    }
+
+    rows = []
+    for algorithm in ALGORITHMS:
+        backend = backend_for(algorithm)
+        token = backend.encode(payload)
+        sign = summarize(timed(lambda: backend.encode(payload), args.iterations))
+        verify = summarize(timed(lambda: backend.decode(token), args.iterations))
+        rows.append([
+            algorithm, len(token),
+            f"{sign['mean']:.1f}", f"{sign['p99']:.1f}",
+            f"{verify['mean']:.1f}", f"{verify['p99']:.1f}",
+        ])
+
+    print_table(
+        ['algorithm', 'token bytes', 'sign mean us', 'sign p99 us', 'verify mean us', 'verify p99 us'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Write amplification of token refresh: blacklist rotation vs token families.
+
+Logs a user in once, then performs N refreshes through each strategy and
+counts the statements and rows written per refresh.
+
+    python benchmarks/refresh_writes.py --refreshes 500
+"""
+import argparse
+import re
+import time
+
+from _common import print_table, setup_django, summarize, test_database
+
+WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+def run(strategy, user, refreshes):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+    from rest_framework_simplejwt.token_blacklist.models import (
+        BlacklistedToken, OutstandingToken,
+    )
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from users.models import TokenFamily
+    from users.serializers import FamilyTokenRefreshSerializer
+    from users.tokens import FamilyRefreshToken
+
+    if strategy == 'blacklist':
+        serializer_class, token = TokenRefreshSerializer, str(RefreshToken.for_user(user))
+    else:
+        serializer_class, token = FamilyTokenRefreshSerializer, str(FamilyRefreshToken.for_user(user))
+
+    def row_count():
+        return (
+            OutstandingToken.objects.count()
+            + BlacklistedToken.objects.count()
+            + TokenFamily.objects.count()
+        )
+
+    rows_before = row_count()
+    statements = writes = 0
+    timings = []
+    for _ in range(refreshes):
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as ctx:
+            serializer = serializer_class(data={'refresh': token})
+            serializer.is_valid(raise_exception=True)
+        timings.append((time.perf_counter() - start) * 1e6)
+        token = serializer.validated_data['refresh']
+        statements += len(ctx.captured_queries)
+        writes += sum(1 for q in ctx.captured_queries if WRITE_RE.match(q['sql']))
+
+    return {
+        'statements': statements / refreshes,
+        'writes': writes / refreshes,
+        'rows': (row_count() - rows_before) / refreshes,
+        'us': summarize(timings)['mean'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--refreshes', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    settings.DEBUG = True
+
+    with test_database():
+        from users.models import User
+        user = User.objects.create_user(
+            username='bench', email='bench@example.com', password='bench-pass-123'
+        )
+        rows = []
+        for strategy in ('blacklist', 'family'):
+            result = run(strategy, user, args.refreshes)
+            rows.append([
+                strategy,
+                f"{result['statements']:.2f}",
+                f"{result['writes']:.2f}",
+                f"{result['rows']:.2f}",
+                f"{result['us']:.1f}",
+            ])
+
+    print_table(['strategy', 'queries/refresh', 'writes/refresh', 'new rows/refresh', 'us/refresh'], rows)
+
+
+if __name__ == '__main__':
+    main()
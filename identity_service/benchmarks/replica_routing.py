@@ -0,0 +1,131 @@
+"""
+Profile throughput with and without read replica routing.
+
+Runs a mixed workload (mostly profile reads, some profile updates) from
+several threads against two SQLite files standing in for a primary and a
+replica, first with every query on the primary and then with reads routed
+by PrimaryReplicaRouter. SQLite takes a file lock per write, which is a
+crude but visible stand-in for primary contention.
+
+    python benchmarks/replica_routing.py --threads 8 --requests 200 --write-ratio 0.1
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from _common import print_table, setup_django, summarize
+
+
+def run(users, threads, requests, write_ratio, seed):
+    from django.db import connections
+    from django.test import Client
+
+    from identity_service.db_routers import has_recent_write
+    from users.tokens import FamilyRefreshToken
+
+    tokens = [(user.pk, str(FamilyRefreshToken.for_user(user).access_token)) for user in users]
+    timings = []
+    pinned_reads = []
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = Client()
+        local, pinned = [], 0
+        for _ in range(requests):
+            user_id, token = rng.choice(tokens)
+            auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+            start = time.perf_counter()
+            if rng.random() < write_ratio:
+                client.patch(
+                    '/api/profile/', {'address': f'street {rng.randrange(1000)}'},
+                    content_type='application/json', **auth,
+                )
+            else:
+                pinned += has_recent_write(user_id)
+                client.get('/api/profile/', **auth)
+            local.append((time.perf_counter() - start) * 1e6)
+        connections.close_all()
+        with lock:
+            timings.extend(local)
+            pinned_reads.append(pinned)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(timings)
+    return {
+        'rps': len(timings) / elapsed,
+        'p50': stats['p50'],
+        'p99': stats['p99'],
+        'pinned': sum(pinned_reads),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per thread')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='replica-bench-'))
+    primary, replica = workdir / 'primary.sqlite3', workdir / 'replica.sqlite3'
+    os.environ['DATABASE_REPLICA_NAME'] = str(replica)
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connections['default'].settings_dict['NAME'] = str(primary)
+    # Cheap hashing keeps user creation out of the measurement
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+    try:
+        call_command('migrate', database='default', verbosity=0)
+        from users.models import User
+        users = [
+            User.objects.create_user(
+                username=f'bench{i}', email=f'bench{i}@example.com', password='bench-pass-123'
+            )
+            for i in range(args.users)
+        ]
+        # The replica gets its schema and data through "replication"
+        connections.close_all()
+        shutil.copyfile(primary, replica)
+
+        rows = []
+        for label, replicas in (('primary only', []), ('with replica', ['replica'])):
+            settings.DATABASE_REPLICAS = replicas
+            result = run(users, args.threads, args.requests, args.write_ratio, args.seed)
+            rows.append([
+                label,
+                f"{result['rps']:.0f}",
+                f"{result['p50']:.0f}",
+                f"{result['p99']:.0f}",
+                result['pinned'],
+            ])
+    finally:
+        connections.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(['routing', 'req/s', 'p50 us', 'p99 us', 'reads pinned to primary'], rows)
+
+
+if __name__ == '__main__':
+    main()
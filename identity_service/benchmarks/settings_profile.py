@@ -0,0 +1,100 @@
+"""
+Compare the default settings with the API-only profile.
+
+Each profile is measured in a fresh interpreter:
+
+* import time   - django.setup() plus loading the URLconf and WSGI handler
+* resident set  - RSS of the worker once it is ready to serve
+* middleware    - per-request cost of GET / through the full handler
+
+    python benchmarks/settings_profile.py --requests 5000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+PROFILES = [
+    'identity_service.settings',
+    'identity_service.settings_api',
+]
+
+
+def resident_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(settings_module, requests):
+    start = time.perf_counter()
+
+    from _common import setup_django, summarize, timed
+    setup_django(settings_module)
+
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    get_wsgi_application()
+    import_ms = (time.perf_counter() - start) * 1000
+    rss_kb = resident_kb()
+
+    setup_test_environment()
+    client = Client()
+    client.get('/')
+    stats = summarize(timed(lambda: client.get('/'), requests))
+
+    print(json.dumps({
+        'import_ms': import_ms,
+        'rss_kb': rss_kb,
+        'apps': len(settings.INSTALLED_APPS),
+        'middleware': len(settings.MIDDLEWARE),
+        'request_us': stats,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.requests)
+        return
+
+    from _common import print_table
+
+    rows = []
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', profile, '--requests', str(args.requests)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        rows.append([
+            profile,
+            result['apps'],
+            result['middleware'],
+            f"{result['import_ms']:.1f}",
+            f"{result['rss_kb'] / 1024:.1f}",
+            f"{result['request_us']['mean']:.1f}",
+            f"{result['request_us']['p99']:.1f}",
+        ])
+
+    print_table(
+        ['profile', 'apps', 'middleware', 'import ms', 'rss MiB', 'req mean us', 'req p99 us'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Resolving N users through POST /api/users/batch/: one request per user
+versus one request for the whole batch.
+
+    python benchmarks/user_batch.py --rounds 5 --aadhaar
+"""
+import argparse
+import io
+
+from _common import print_table, setup_django, summarize, test_database, timed
+
+BATCH_SIZES = [10, 100, 500]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--aadhaar', action='store_true', help="Also decrypt Aadhaar numbers")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    settings.INTERNAL_SERVICE_TOKENS = {'bench': 'bench-token'}
+    settings.USER_BATCH_LOOKUP = {'MAX_BATCH': max(BATCH_SIZES), 'AADHAAR_SERVICES': ['bench']}
+    settings.AADHAAR_AUDIT_LOG = {**settings.AADHAAR_AUDIT_LOG, 'ASYNC': False}
+
+    with test_database():
+        from django.core.management import call_command
+        from rest_framework.test import APIClient
+        from users.models import User
+
+        call_command('generate_users', max(BATCH_SIZES), password_hashes=1, stdout=io.StringIO())
+        ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Service bench-token')
+
+        def lookup(batch):
+            response = client.post('/api/users/batch/', {
+                'ids': batch, 'include_aadhaar': args.aadhaar,
+            }, format='json')
+            assert response.status_code == 200, response.content
+            b''.join(response.streaming_content)
+
+        rows = []
+        for size in BATCH_SIZES:
+            batch = ids[:size]
+            one_by_one = summarize(timed(lambda: [lookup([pk]) for pk in batch], args.rounds))
+            batched = summarize(timed(lambda: lookup(batch), args.rounds))
+            rows.append([
+                size,
+                f"{one_by_one['mean'] / 1000:.1f}",
+                f"{batched['mean'] / 1000:.1f}",
+                f"{one_by_one['mean'] / batched['mean']:.1f}x",
+            ])
+
+    print_table(['users', 'one by one ms', 'batched ms', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
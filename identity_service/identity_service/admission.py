@@ -0,0 +1,248 @@
+"""
+Admission control for CPU-heavy endpoints.
+
+Login and registration spend most of their time hashing passwords. Under a
+spike, every worker thread ends up hashing and cheap requests (profile
+reads, token refreshes) queue behind them. AdmissionControlMiddleware caps
+how many requests of each route class run at once in a process:
+
+  - up to CONCURRENCY requests run,
+  - up to QUEUE more wait, for at most TIMEOUT seconds,
+  - anything else is rejected straight away with 503 and Retry-After.
+
+Route classes are configured in ``settings.ADMISSION_CONTROL['CLASSES']``
+by URL name; routes in no class are never limited. Limits are per process,
+so the effective cluster-wide limit is CONCURRENCY times the number of
+worker processes. Counters are exposed at /metrics (see metrics_text()).
+
+A view handler can carry an ``admission_exempt(request)`` callable. When it
+returns true the request skips the limiter; if the handler later finds it
+has real work to do after all, it calls admit_deferred() to take the slot.
+Idempotent retries use this so that replays, and duplicates waiting for
+their original, do not hold hashing slots (see users/idempotency.py).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+
+SHED_QUEUE_FULL = 'queue_full'
+SHED_TIMEOUT = 'timeout'
+
+
+class ConcurrencyLimiter:
+    """
+    A semaphore with a bounded, deadline-limited wait queue and counters.
+    """
+
+    def __init__(self, name, concurrency, queue_size=0, timeout=0.0):
+        if concurrency < 1:
+            raise ValueError(f"Admission class '{name}' needs a concurrency of at least 1")
+
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = {SHED_QUEUE_FULL: 0, SHED_TIMEOUT: 0}
+        self.wait_seconds = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Take a slot, waiting in the queue if needed.
+
+        Returns:
+            str: None when admitted, otherwise why the request was shed
+        """
+        with self._condition:
+            if self.active < self.concurrency:
+                self.active += 1
+                self.admitted += 1
+                return None
+            if self.waiting >= self.queue_size:
+                self.shed[SHED_QUEUE_FULL] += 1
+                return SHED_QUEUE_FULL
+
+            self.waiting += 1
+            start = time.monotonic()
+            deadline = start + self.timeout
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed[SHED_TIMEOUT] += 1
+                        return SHED_TIMEOUT
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+                self.wait_seconds += time.monotonic() - start
+
+            self.active += 1
+            self.admitted += 1
+            return None
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def snapshot(self):
+        """
+        Return a consistent copy of the counters.
+        """
+        with self._condition:
+            return {
+                'concurrency': self.concurrency,
+                'queue_size': self.queue_size,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'wait_seconds': self.wait_seconds,
+            }
+
+
+_limiters = None
+_limiters_lock = threading.Lock()
+
+
+def get_limiters():
+    """
+    Return the process-wide limiters, keyed by route class, built from settings.
+    """
+    global _limiters
+    if _limiters is None:
+        with _limiters_lock:
+            if _limiters is None:
+                _limiters = {
+                    name: ConcurrencyLimiter(
+                        name,
+                        concurrency=config['CONCURRENCY'],
+                        queue_size=config['QUEUE'],
+                        timeout=config['TIMEOUT'],
+                    )
+                    for name, config in settings.ADMISSION_CONTROL['CLASSES'].items()
+                }
+    return _limiters
+
+
+def _route_classes():
+    return {
+        url_name: name
+        for name, config in settings.ADMISSION_CONTROL['CLASSES'].items()
+        for url_name in config['URL_NAMES']
+    }
+
+
+@receiver(setting_changed)
+def reset_limiters(*, setting, **kwargs):
+    global _limiters
+    if setting == 'ADMISSION_CONTROL':
+        _limiters = None
+
+
+class AdmissionControlMiddleware:
+    """
+    Holds a slot of the request's route class for the duration of the view.
+
+    The slot is taken in process_view, once the URL has been resolved, and
+    given back when the response leaves this middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            limiter = getattr(request, '_admission_limiter', None)
+            if limiter is not None:
+                limiter.release()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        config = settings.ADMISSION_CONTROL
+        if not config['ENABLED'] or request.resolver_match is None:
+            return None
+
+        route_class = _route_classes().get(request.resolver_match.view_name)
+        if route_class is None:
+            return None
+
+        limiter = get_limiters()[route_class]
+        handler = getattr(getattr(view_func, 'view_class', None), request.method.lower(), None)
+        exempt = getattr(handler, 'admission_exempt', None)
+        if exempt is not None and exempt(request):
+            request._admission_deferred = limiter
+            return None
+        return _admit(request, limiter)
+
+
+def _admit(request, limiter):
+    if limiter.acquire() is not None:
+        response = JsonResponse(
+            {'error': 'The server is busy, please retry shortly'}, status=503
+        )
+        response['Retry-After'] = str(settings.ADMISSION_CONTROL['RETRY_AFTER'])
+        return response
+
+    request._admission_limiter = limiter
+    return None
+
+
+def admit_deferred(request):
+    """
+    Take the slot an exempted request skipped, now that it has to do the work.
+
+    Args:
+        request: The Django HttpRequest seen by AdmissionControlMiddleware
+
+    Returns:
+        HttpResponse: The 503 to send if the request was shed, otherwise None
+    """
+    limiter = getattr(request, '_admission_deferred', None)
+    if limiter is None:
+        return None
+    request._admission_deferred = None
+    return _admit(request, limiter)
+
+
+def metrics_text():
+    """
+    Render the admission counters in the Prometheus text format.
+
+    Returns:
+        str: One sample per line
+    """
+    lines = []
+    samples = [
+        ('admission_concurrency_limit', 'gauge', 'Requests allowed to run at once'),
+        ('admission_active', 'gauge', 'Requests running now'),
+        ('admission_queue_depth', 'gauge', 'Requests waiting for a slot now'),
+        ('admission_admitted_total', 'counter', 'Requests admitted'),
+        ('admission_wait_seconds_total', 'counter', 'Time spent waiting for a slot'),
+    ]
+    snapshots = {name: limiter.snapshot() for name, limiter in get_limiters().items()}
+    keys = ['concurrency', 'active', 'waiting', 'admitted', 'wait_seconds']
+
+    for (metric, kind, help_text), key in zip(samples, keys):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, snapshot in snapshots.items():
+            lines.append(f'{metric}{{route_class="{name}"}} {snapshot[key]}')
+
+    lines.append('# HELP admission_shed_total Requests rejected with 503')
+    lines.append('# TYPE admission_shed_total counter')
+    for name, snapshot in snapshots.items():
+        for reason, count in snapshot['shed'].items():
+            lines.append(f'admission_shed_total{{route_class="{name}",reason="{reason}"}} {count}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,124 @@
+"""
+Database routing between the primary and read replicas.
+
+Writes always go to ``default``. Reads go to a random alias from
+``settings.DATABASE_REPLICAS`` unless the current request is pinned to the
+primary, which happens when:
+
+  - the request is a write (POST, PUT, PATCH, DELETE),
+  - the query runs inside a transaction on the primary, or
+  - the caller wrote to their own account in the last
+    REPLICA_STICKY_SECONDS (read-your-writes), see mark_recent_write().
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+import jwt
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_pinned = contextvars.ContextVar('replica_pinned', default=False)
+
+STICKY_KEY = 'replica-sticky:{}'
+
+
+def is_pinned():
+    return _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextmanager
+def pin_to_primary():
+    """
+    Route every read inside the block to the primary.
+    """
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def _sticky_cache():
+    return caches[settings.REPLICA_STICKY_CACHE]
+
+
+def mark_recent_write(user_id):
+    """
+    Send ``user_id``'s reads to the primary until replicas have caught up.
+    """
+    if settings.DATABASE_REPLICAS and user_id is not None:
+        _sticky_cache().set(STICKY_KEY.format(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def has_recent_write(user_id):
+    return user_id is not None and bool(_sticky_cache().get(STICKY_KEY.format(user_id)))
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends safe reads to replicas and everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication
+        return db not in settings.DATABASE_REPLICAS
+
+
+def _bearer_user_id(request):
+    """
+    Read the user id claim from the bearer token *without* verifying it.
+
+    Only used to pick a database; authentication still verifies the token.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme != 'Bearer' or not token:
+        return None
+    try:
+        claims = jwt.decode(token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return None
+    return claims.get(settings.SIMPLE_JWT['USER_ID_CLAIM'])
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Pins writes, and reads by users with a recent write, to the primary.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        if request.method not in self.SAFE_METHODS:
+            with pin_to_primary():
+                response = self.get_response(request)
+            user = getattr(request, 'user', None)
+            if response.status_code < 400 and getattr(user, 'is_authenticated', False):
+                mark_recent_write(getattr(user, 'pk', None))
+            return response
+
+        if has_recent_write(_bearer_user_id(request)):
+            with pin_to_primary():
+                return self.get_response(request)
+        return self.get_response(request)
@@ -1,6 +1,9 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 # ---------------------------------------------------
 # Base directory
 # ---------------------------------------------------
@@ -41,11 +44,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+
+    # Sheds password-hashing requests before they pile up in the workers
+    'identity_service.admission.AdmissionControlMiddleware',
+
     'django.contrib.sessions.middleware.SessionMiddleware',
 
     # CORS must be before CommonMiddleware
     'corsheaders.middleware.CorsMiddleware',
 
+    # Must run before anything reads from the database
+    'identity_service.db_routers.ReplicaRoutingMiddleware',
+
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -89,19 +99,112 @@ DATABASES = {
     }
 }
 
+# Read replicas (identity_service/db_routers.py). Safe reads go to a replica
+# unless the caller wrote to their account in the last REPLICA_STICKY_SECONDS.
+# For local testing, point DATABASE_REPLICA_NAME at a copy of db.sqlite3.
+DATABASE_REPLICAS = []
+
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DATABASE_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+
+# User sharding (users/sharding.py). With ALIASES empty every user lives on
+# ``default``. Enable it before the first user is created: ids issued before
+# sharding stay on ``default``. Never remove a shard from ALIASES without
+# pinning its buckets in BUCKET_MAP and running rebalance_shards.
+# For local testing, USER_SHARD_COUNT=N adds N-1 SQLite shards next to
+# db.sqlite3.
+USER_SHARDS = {
+    'ALIASES': [],
+    # bucket (0-1023) -> alias, overriding the default range split
+    'BUCKET_MAP': {},
+}
+
+if int(os.environ.get('USER_SHARD_COUNT', '0')) > 1:
+    USER_SHARDS['ALIASES'].append('default')
+    for index in range(1, int(os.environ['USER_SHARD_COUNT'])):
+        DATABASES[f'shard_{index}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'db_shard_{index}.sqlite3',
+        }
+        USER_SHARDS['ALIASES'].append(f'shard_{index}')
+
+DATABASE_ROUTERS = [
+    'users.sharding.UserShardRouter',
+    'identity_service.db_routers.PrimaryReplicaRouter',
+]
+
+REPLICA_STICKY_SECONDS = 5
+# Must be shared between workers (e.g. Redis) when running more than one
+REPLICA_STICKY_CACHE = 'default'
+
 
 # ---------------------------------------------------
 # Custom User Model
 # ---------------------------------------------------
 AUTH_USER_MODEL = 'users.User'
 
+AUTHENTICATION_BACKENDS = ['users.backends.ShardedModelBackend']
+
+
+# ---------------------------------------------------
+# Aadhaar storage
+# ---------------------------------------------------
+# 'gcm': compact binary AES-256-GCM in User.aadhaar_ciphertext
+# 'cbc': legacy base64 AES-256-CBC text in User.encrypted_aadhaar
+# Both formats are always readable; convert old rows with
+# python manage.py migrate_aadhaar_storage
+AADHAAR_STORAGE_FORMAT = 'gcm'
+
+# What GET /api/profile/ returns for Aadhaar:
+# 'masked':    only aadhaar_masked (XXXX-XXXX-1234), no decryption
+# 'plaintext': also the decrypted number (audited), for older clients
+# The full number is always available from GET /api/profile/aadhaar/
+PROFILE_AADHAAR_MODE = 'masked'
+
+# Key for the Aadhaar blind index (base64, 32 bytes). Derived from
+# SECRET_KEY when unset; changing it requires python manage.py backfill_aadhaar
+# after clearing users_user.aadhaar_index.
+AADHAAR_INDEX_KEY = os.environ.get('AADHAAR_INDEX_KEY')
+
+
+# ---------------------------------------------------
+# User admin (users/admin.py)
+# ---------------------------------------------------
+USER_ADMIN = {
+    # Changelist totals are cached this long
+    'COUNT_CACHE_SECONDS': 60,
+    # Unfiltered lists use PostgreSQL's row estimate above this size
+    'ESTIMATE_THRESHOLD': 100000,
+    # Rows per UPDATE in admin actions
+    'ACTION_BATCH_SIZE': 1000,
+}
+
+
+# Every plaintext reveal is audited through a buffered writer (users/audit.py)
+AADHAAR_AUDIT_LOG = {
+    'ASYNC': True,
+    'QUEUE_SIZE': 10000,
+    'FLUSH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+    # 'sync' (write on the request), 'block' (wait BLOCK_TIMEOUT) or 'drop'
+    'OVERFLOW': 'sync',
+    'BLOCK_TIMEOUT': 0.05,
+    # Failed batches are requeued; events failing this often are counted as lost
+    'WRITE_ATTEMPTS': 3,
+}
+
 
 # ---------------------------------------------------
 # Django REST Framework
 # ---------------------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ShardedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -135,12 +238,72 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
 
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('users.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
 }
 
 
+# ---------------------------------------------------
+# JWT Signing Keys (see users/signing.py)
+# ---------------------------------------------------
+# The first key signs new tokens, all keys verify and are published at
+# /.well-known/jwks.json. Leave empty to keep signing with HS256 above.
+# Generate a key with: python manage.py generate_signing_key --algorithm RS256
+#
+# JWT_SIGNING_KEYS = [
+#     {'kid': '2026-10', 'algorithm': 'RS256', 'private_key_path': '/etc/identity/jwt-2026-10.pem'},
+#     {'kid': '2026-04', 'algorithm': 'RS256', 'public_key_path': '/etc/identity/jwt-2026-04.pub'},
+# ]
+JWT_SIGNING_KEYS = []
+
+# Tokens without a kid (HS256 with SIGNING_KEY, issued before the key ring)
+# keep verifying while this is on. Turn it off once REFRESH_TOKEN_LIFETIME
+# has passed since the first key in JWT_SIGNING_KEYS started signing.
+# Ignored while JWT_SIGNING_KEYS is empty.
+JWT_ACCEPT_LEGACY_TOKENS = os.environ.get('JWT_ACCEPT_LEGACY_TOKENS', '1').lower() in ('1', 'true', 'yes')
+
+JWKS_CACHE_MAX_AGE = 300
+
+
+# ---------------------------------------------------
+# Internal services
+# ---------------------------------------------------
+# Shared tokens for service-to-service endpoints, sent as
+# "Authorization: Service <token>". Keyed by service name, e.g.
+# INTERNAL_SERVICE_TOKENS="gateway=<token>,placements=<token>"
+INTERNAL_SERVICE_TOKENS = dict(
+    entry.split('=', 1)
+    for entry in os.environ.get('INTERNAL_SERVICE_TOKENS', '').split(',')
+    if '=' in entry
+)
+
+TOKEN_INTROSPECTION = {
+    'MAX_BATCH': 1000,
+    # Upper bound for the cache_ttl hint returned per token (seconds)
+    'CACHE_TTL': 30,
+}
+
+# POST /api/users/batch/
+USER_BATCH_LOOKUP = {
+    'MAX_BATCH': 500,
+    # Service names (keys of INTERNAL_SERVICE_TOKENS) allowed to ask for
+    # decrypted Aadhaar numbers, e.g. USER_LOOKUP_AADHAAR_SERVICES="placements"
+    'AADHAAR_SERVICES': [
+        name for name in os.environ.get('USER_LOOKUP_AADHAAR_SERVICES', '').split(',') if name
+    ],
+}
+
+# GET /api/users/changes/ and `manage.py user_changes`
+CHANGE_FEED = {
+    'PAGE_SIZE': 500,
+    'MAX_PAGE_SIZE': 5000,
+    # Rows changed more recently than this (seconds) wait for the next
+    # poll, so a transaction committing late is not skipped by the cursor
+    'SAFETY_LAG': 2,
+}
+
+
 # ---------------------------------------------------
 # CORS Configuration (React / Vite)
 # ---------------------------------------------------
@@ -152,6 +315,8 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 
 # ---------------------------------------------------
 # Password validation
@@ -173,6 +338,105 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# ---------------------------------------------------
+# Refresh grace window (users/refresh_grace.py)
+# ---------------------------------------------------
+# Presenting the same refresh token again within SECONDS of its rotation
+# returns the same rotated pair instead of revoking the family, so
+# concurrent refreshes from one client do not log the user out. 0 disables.
+REFRESH_GRACE = {
+    'SECONDS': 10,
+    'MAX_ENTRIES': 10000,
+}
+
+# ---------------------------------------------------
+# Idempotency keys (users/idempotency.py)
+# ---------------------------------------------------
+# Responses to register/login requests carrying an Idempotency-Key header
+# are kept so client retries are replayed instead of re-run.
+IDEMPOTENCY = {
+    # Must be shared between workers (e.g. Redis) when running more than one
+    'CACHE': 'default',
+    # Entries each worker also keeps in process
+    'MAX_ENTRIES': 10000,
+    'TTL': 24 * 60 * 60,
+    # Per-scope overrides. Register and login responses carry tokens, which
+    # must not be handed out again long after a logout, password change or
+    # refresh rotation: keep them for the client's retry window only.
+    'SCOPE_TTL': {
+        'register': 5 * 60,
+        'login': 5 * 60,
+    },
+    # How long a duplicate waits for the in-flight original (seconds)
+    'WAIT_TIMEOUT': 10,
+    # How often a duplicate checks on an original running in another worker
+    'POLL_INTERVAL': 0.05,
+    # Lifetime of the in-flight marker, so a key whose worker died frees up
+    'PENDING_TTL': 60,
+}
+
+
+# ---------------------------------------------------
+# Background jobs (users/jobs.py)
+# ---------------------------------------------------
+# Run workers with: python manage.py run_jobs
+JOB_RUNNER = {
+    'WORKERS': 4,
+    'BATCH_SIZE': 20,
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 5,
+    # Retry n waits RETRY_BACKOFF * 2**(n-1) seconds, capped at RETRY_BACKOFF_MAX
+    'RETRY_BACKOFF': 10,
+    'RETRY_BACKOFF_MAX': 3600,
+    # Running jobs older than this are assumed orphaned and re-queued
+    'LOCK_TIMEOUT': 300,
+}
+
+
+# ---------------------------------------------------
+# Worker warm-up (users/warmup.py)
+# ---------------------------------------------------
+# Pre-load imports, crypto, JWT and DB connections in a background thread
+# when a worker starts; /readyz returns 503 until it is done. wsgi.py and
+# asgi.py set IDENTITY_WARMUP=1, management commands leave it off.
+WARMUP_ON_STARTUP = os.environ.get('IDENTITY_WARMUP', '').lower() in ('1', 'true', 'yes')
+
+
+# ---------------------------------------------------
+# Admission control (identity_service/admission.py)
+# ---------------------------------------------------
+# Per-process concurrency limits by route class. Requests over CONCURRENCY
+# wait in a queue of QUEUE for up to TIMEOUT seconds, then get a 503 with
+# Retry-After. Routes in no class are not limited. Counters are at /metrics.
+_HASHING_CONCURRENCY = int(os.environ.get('PASSWORD_HASHING_CONCURRENCY', os.cpu_count() or 1))
+
+ADMISSION_CONTROL = {
+    'ENABLED': os.environ.get('ADMISSION_CONTROL', '1').lower() in ('1', 'true', 'yes'),
+    'RETRY_AFTER': 1,
+    'CLASSES': {
+        'password_hashing': {
+            'URL_NAMES': ['users:login', 'users:register'],
+            'CONCURRENCY': _HASHING_CONCURRENCY,
+            'QUEUE': 2 * _HASHING_CONCURRENCY,
+            'TIMEOUT': 1.0,
+        },
+    },
+}
+
+
+# ---------------------------------------------------
+# Email
+# ---------------------------------------------------
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'Identity Service <no-reply@localhost>'
+
+
+# ---------------------------------------------------
+# Testing
+# ---------------------------------------------------
+TEST_RUNNER = 'identity_service.test_runner.TestRunner'
+
+
 # ---------------------------------------------------
 # Internationalization
 # ---------------------------------------------------
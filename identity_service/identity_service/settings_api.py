@@ -0,0 +1,48 @@
+"""
+API-only deployment profile.
+
+Serves the stateless JWT API under /api/ without the admin, sessions,
+messages or static files apps and without the middleware that only those
+need. Run the admin, if required, on a separate worker with the default
+``identity_service.settings`` module.
+
+    DJANGO_SETTINGS_MODULE=identity_service.settings_api gunicorn identity_service.wsgi
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE
+
+
+# ---------------------------------------------------
+# Application definition
+# ---------------------------------------------------
+API_EXCLUDED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS]
+
+
+# JWT requests carry no cookies, so session, CSRF, message and clickjacking
+# handling is pure overhead. DRF authenticates the user itself.
+API_EXCLUDED_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+MIDDLEWARE = [m for m in MIDDLEWARE if m not in API_EXCLUDED_MIDDLEWARE]
+
+
+ROOT_URLCONF = 'identity_service.urls_api'
+
+
+# ---------------------------------------------------
+# Templates
+# ---------------------------------------------------
+# Only JSON is rendered; no template engine is needed.
+TEMPLATES = []
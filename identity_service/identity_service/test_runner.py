@@ -0,0 +1,43 @@
+"""
+Test runner for the identity service.
+"""
+import sys
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from users.audit import shutdown_audit_log
+
+from .testing.query_budget import recorder, report_mode
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner that keeps background writer threads out of test runs.
+
+    Test databases live inside per-test transactions that another thread
+    cannot see, so the Aadhaar audit buffer runs synchronously: events stay
+    queued until a test flushes them explicitly, and whatever is left is
+    written before the test databases are destroyed (not at exit, when the
+    connections point at the real databases again).
+
+    User sharding is switched off for the suite even when USER_SHARD_COUNT
+    adds shard databases; the sharding tests enable it themselves.
+
+    With QUERY_BUDGET_REPORT set, the query budget report is printed after
+    the tests (see testing/query_budget.py).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.AADHAAR_AUDIT_LOG = {**settings.AADHAAR_AUDIT_LOG, 'ASYNC': False}
+        settings.USER_SHARDS = {**settings.USER_SHARDS, 'ALIASES': [], 'BUCKET_MAP': {}}
+
+    def teardown_databases(self, old_config, **kwargs):
+        shutdown_audit_log()
+        super().teardown_databases(old_config, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        if report_mode() and recorder.counts:
+            sys.stderr.write('\nQuery budget report\n' + recorder.render() + '\n')
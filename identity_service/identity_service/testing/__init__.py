@@ -0,0 +1,3 @@
+"""
+Test-only helpers, imported by the test suites and the test runner.
+"""
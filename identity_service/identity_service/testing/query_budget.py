@@ -0,0 +1,139 @@
+"""
+Query budgets for the users API.
+
+Every endpoint declares the maximum number of SQL queries it may run per
+HTTP method. API tests wrap their requests in ``assertQueryBudget`` so an
+N+1 or an extra lookup fails the suite with the captured SQL instead of
+slipping into production unnoticed.
+
+Set ``QUERY_BUDGET_REPORT=1`` in the environment to switch to report mode:
+budgets are not enforced and the test runner prints the current count for
+every URL in ``users/urls.py`` at the end of the run.
+"""
+import os
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+
+
+# Maximum queries per endpoint, keyed by URL name and HTTP method.
+# Savepoints count towards the budget like any other statement.
+QUERY_BUDGETS = {
+    # Two of these are the SAVEPOINT/RELEASE around the user and job inserts
+    'users:register': {'POST': 7},
+    'users:login': {'POST': 2},
+    'users:logout': {'POST': 2},
+    'users:token_refresh': {'POST': 1},
+    'users:introspect': {'POST': 1},
+    'users:profile': {'GET': 1, 'PUT': 2, 'PATCH': 2},
+    'users:aadhaar_reveal': {'GET': 1},
+    'users:user_batch': {'POST': 1},
+    'users:user_changes': {'GET': 1},
+}
+
+
+def report_mode():
+    """
+    Return True when budgets should be reported instead of enforced.
+    """
+    return os.environ.get('QUERY_BUDGET_REPORT', '').lower() in ('1', 'true', 'yes')
+
+
+def iter_url_names(urlconf='users.urls', namespace='users'):
+    """
+    Yield the namespaced name of every named pattern in ``urlconf``.
+    """
+    for pattern in get_resolver(urlconf).url_patterns:
+        if getattr(pattern, 'name', None):
+            yield f'{namespace}:{pattern.name}'
+
+
+def format_query_diff(queries, budget):
+    """
+    Render captured queries as a diff against the budget.
+
+    Queries that fit inside the budget are prefixed with a space, the
+    ones that exceed it with ``+`` so the offenders stand out.
+
+    Args:
+        queries (list): ``captured_queries`` from a CaptureQueriesContext
+        budget (int): Allowed number of queries
+
+    Returns:
+        str: One line per query
+    """
+    lines = [f'--- budget ({budget} queries)', f'+++ actual ({len(queries)} queries)']
+    for index, query in enumerate(queries, start=1):
+        marker = '+' if index > budget else ' '
+        lines.append(f'{marker} {index}. {query["sql"]}')
+    return '\n'.join(lines)
+
+
+class QueryBudgetRecorder:
+    """
+    Collects the query counts observed during a test run for report mode.
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def record(self, url_name, method, count):
+        current = self.counts.get((url_name, method), 0)
+        self.counts[(url_name, method)] = max(current, count)
+
+    def render(self):
+        """
+        Build a table of budget vs observed count for every users URL.
+
+        Returns:
+            str: Printable report
+        """
+        rows = [f'{"endpoint":<24} {"method":<7} {"budget":>6} {"actual":>6}']
+        for url_name in iter_url_names():
+            methods = set(QUERY_BUDGETS.get(url_name, {}))
+            methods.update(m for name, m in self.counts if name == url_name)
+            if not methods:
+                rows.append(f'{url_name:<24} {"-":<7} {"-":>6} {"-":>6}')
+                continue
+            for method in sorted(methods):
+                budget = QUERY_BUDGETS.get(url_name, {}).get(method, '-')
+                actual = self.counts.get((url_name, method), '-')
+                rows.append(f'{url_name:<24} {method:<7} {budget:>6} {actual:>6}')
+        return '\n'.join(rows)
+
+
+recorder = QueryBudgetRecorder()
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that enforces QUERY_BUDGETS around API calls.
+
+    Usage:
+        with self.assertQueryBudget('users:profile', 'GET'):
+            self.client.get('/api/profile/')
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, url_name, method, using=DEFAULT_DB_ALIAS):
+        method = method.upper()
+        try:
+            budget = QUERY_BUDGETS[url_name][method]
+        except KeyError:
+            self.fail(f'No query budget declared for {method} {url_name}')
+
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        count = len(context.captured_queries)
+        recorder.record(url_name, method, count)
+        if report_mode():
+            return
+
+        if count > budget:
+            self.fail(
+                f'{method} {url_name} ran {count} queries, budget is {budget}\n'
+                + format_query_diff(context.captured_queries, budget)
+            )
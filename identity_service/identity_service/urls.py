@@ -1,24 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
-from django.http import JsonResponse
+from django.urls import path
 
-# Simple view for the root URL
-def home(request):
-    return JsonResponse({
-        "message": "Identity Service API is running",
-        "endpoints": {
-            "register": "/api/auth/register/",
-            "login": "/api/auth/login/",
-            "profile": "/api/profile/"
-        }
-    })
+from . import urls_api
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    
-    # This handles the root URL "http://127.0.0.1:8000/"
-    path('', home), 
-    
-    # This connects your app URLs
-    path('api/', include('users.urls')),
-]
\ No newline at end of file
+] + urls_api.urlpatterns
@@ -0,0 +1,27 @@
+"""
+URL configuration for the API-only profile (``identity_service.settings_api``).
+``identity_service.urls`` adds the admin site on top of these routes.
+"""
+from django.urls import path, include
+
+from users.views import jwks_view
+
+from .views import healthz, home, metrics, readyz
+
+urlpatterns = [
+    # This handles the root URL "http://127.0.0.1:8000/"
+    path('', home),
+
+    # This connects your app URLs
+    path('api/', include('users.urls')),
+
+    # Public keys for downstream token verification
+    path('.well-known/jwks.json', jwks_view, name='jwks'),
+
+    # Load balancer / orchestrator probes
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
+
+    # Prometheus scrape target (internal service token required)
+    path('metrics', metrics, name='metrics'),
+]
@@ -0,0 +1,71 @@
+"""
+Project-level views that do not belong to any app.
+"""
+from django.db import DatabaseError, connections
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+
+from users.authentication import IsInternalService, ServiceTokenAuthentication
+from users.warmup import is_warm, timings
+
+from .admission import metrics_text
+
+
+# Simple view for the root URL
+def home(request):
+    return JsonResponse({
+        "message": "Identity Service API is running",
+        "endpoints": {
+            "register": "/api/auth/register/",
+            "login": "/api/auth/login/",
+            "profile": "/api/profile/"
+        }
+    })
+
+
+@never_cache
+@require_GET
+def healthz(request):
+    """
+    Liveness probe: the process is up and serving. Touches nothing else.
+    """
+    return JsonResponse({"status": "ok"})
+
+
+@never_cache
+@require_GET
+def readyz(request):
+    """
+    Readiness probe: warm-up has finished and every database answers.
+    """
+    checks = {"warm": is_warm()}
+    for alias in connections:
+        try:
+            # A query, not ensure_connection(): an open connection may be dead
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            checks[f"db:{alias}"] = True
+        except DatabaseError:
+            checks[f"db:{alias}"] = False
+
+    ready = all(checks.values())
+    return JsonResponse(
+        {"status": "ready" if ready else "unavailable", "checks": checks, "warmup_ms": timings},
+        status=200 if ready else 503,
+    )
+
+
+@never_cache
+@api_view(['GET'])
+@authentication_classes([ServiceTokenAuthentication])
+@permission_classes([IsInternalService])
+def metrics(request):
+    """
+    Admission control counters (queue depth, shed requests) for Prometheus.
+
+    Only for internal services: configure the scraper to send
+    ``Authorization: Service <token>``.
+    """
+    return HttpResponse(metrics_text(), content_type='text/plain; version=0.0.4')
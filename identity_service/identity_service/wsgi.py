@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'identity_service.settings')
+# Pre-load everything the first request needs (users/warmup.py)
+os.environ.setdefault('IDENTITY_WARMUP', '1')
 
 application = get_wsgi_application()
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # Register background jobs
+        from . import tasks  # noqa: F401
+
+        if settings.WARMUP_ON_STARTUP:
+            from .warmup import start_warm_up
+            start_warm_up()
@@ -0,0 +1,246 @@
+"""
+Buffered audit logging for Aadhaar plaintext access.
+
+Recording an access only puts an unsaved AadhaarAccessLog on a bounded
+in-process queue. A background writer drains the queue with bulk_create
+whenever FLUSH_SIZE events are waiting or FLUSH_INTERVAL seconds have
+passed. The process-wide buffer is flushed once more when the process
+exits, in either mode.
+
+When the queue is full, OVERFLOW decides what happens to a new event:
+  - 'sync':  the caller writes it directly (nothing is lost, the request
+             pays for one INSERT)
+  - 'block': wait up to BLOCK_TIMEOUT seconds for room, then drop
+  - 'drop':  discard it and count it in ``dropped``
+
+A batch whose INSERT fails goes back on the queue for the next flush;
+after WRITE_ATTEMPTS failures, or when the queue has no room for it, its
+events are counted in ``lost``.
+
+With ASYNC disabled no thread is started; events are written by the
+caller that fills a batch, or by an explicit flush().
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import InternalService
+from .models import AadhaarAccessLog
+
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogBuffer:
+    """
+    Bounded queue of audit events with a batching background writer.
+    """
+
+    def __init__(self, queue_size=10000, flush_size=500, flush_interval=2.0,
+                 overflow='sync', block_timeout=0.05, write_attempts=3, use_thread=True):
+        if overflow not in ('sync', 'block', 'drop'):
+            raise ValueError(f"Unknown audit overflow policy '{overflow}'")
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.write_attempts = write_attempts
+        self.use_thread = use_thread
+
+        self.dropped = 0
+        self.lost = 0
+        self.written = 0
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = settings.AADHAAR_AUDIT_LOG
+        return cls(
+            queue_size=config['QUEUE_SIZE'],
+            flush_size=config['FLUSH_SIZE'],
+            flush_interval=config['FLUSH_INTERVAL'],
+            overflow=config['OVERFLOW'],
+            block_timeout=config['BLOCK_TIMEOUT'],
+            write_attempts=config['WRITE_ATTEMPTS'],
+            use_thread=config['ASYNC'],
+        )
+
+    def record(self, event):
+        """
+        Queue an unsaved AadhaarAccessLog for writing.
+        """
+        if self.use_thread:
+            self._ensure_writer()
+
+        try:
+            if self.overflow == 'block':
+                self.queue.put(event, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(event)
+        except queue.Full:
+            self._overflow(event)
+            return
+
+        if not self.use_thread and self.queue.qsize() >= self.flush_size:
+            self.flush()
+
+    def _overflow(self, event):
+        if self.overflow == 'sync':
+            self._write([event])
+            return
+        self.dropped += 1
+        if self.dropped % 1000 == 1:
+            logger.warning("Audit queue full, %d events dropped so far", self.dropped)
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            AadhaarAccessLog.objects.bulk_create(batch)
+        except Exception:
+            logger.exception("Failed to write %d audit events", len(batch))
+            self._retry(batch)
+            return
+        self.written += len(batch)
+
+    def _retry(self, batch):
+        lost = 0
+        for event in batch:
+            # Failed writes so far, kept on the unsaved instance itself
+            event._audit_failures = getattr(event, '_audit_failures', 0) + 1
+            if event._audit_failures < self.write_attempts:
+                try:
+                    self.queue.put_nowait(event)
+                    continue
+                except queue.Full:
+                    pass
+            lost += 1
+        if lost:
+            self.lost += lost
+            logger.error("Gave up on %d audit events, %d lost so far", lost, self.lost)
+
+    def flush(self):
+        """
+        Write every event queued so far. Events put back by a failed write
+        wait for the next flush.
+
+        Returns:
+            int: Number of events taken off the queue
+        """
+        flushed = 0
+        with self._flush_lock:
+            pending = self.queue.qsize()
+            while flushed < pending:
+                batch = self._drain(min(self.flush_size, pending - flushed))
+                if not batch:
+                    break
+                self._write(batch)
+                flushed += len(batch)
+        return flushed
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='aadhaar-audit-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.is_set():
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if due or self.queue.qsize() >= self.flush_size:
+                close_old_connections()
+                self.flush()
+                last_flush = time.monotonic()
+            self._stop.wait(min(0.1, self.flush_interval))
+
+    def shutdown(self, timeout=5.0):
+        """
+        Stop the writer and flush whatever is still queued.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_audit_log():
+    """
+    Return the process-wide audit buffer, creating it from settings.
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AuditLogBuffer.from_settings()
+                # Without a writer thread, events below FLUSH_SIZE would
+                # otherwise stay queued forever
+                atexit.register(_buffer.shutdown)
+    return _buffer
+
+
+def shutdown_audit_log():
+    """
+    Flush and discard the process-wide audit buffer, if there is one.
+    """
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        atexit.unregister(buffer.shutdown)
+        buffer.shutdown()
+
+
+def record_aadhaar_access(user, request=None, event=AadhaarAccessLog.EVENT_REVEAL):
+    """
+    Record that ``user``'s Aadhaar was revealed, without touching the database.
+
+    When an internal service made the request, its name is recorded too.
+    """
+    ip_address = service = None
+    if request is not None:
+        ip_address = request.META.get('REMOTE_ADDR')
+        caller = getattr(request, 'user', None)
+        if isinstance(caller, InternalService):
+            service = caller.name
+    get_audit_log().record(AadhaarAccessLog(
+        user_id=user.pk,
+        event=event,
+        service=service or '',
+        accessed_at=timezone.now(),
+        ip_address=ip_address or None,
+    ))
+
+
+@receiver(setting_changed)
+def reset_audit_log(*, setting, **kwargs):
+    if setting == 'AADHAAR_AUDIT_LOG':
+        shutdown_audit_log()
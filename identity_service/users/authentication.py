@@ -0,0 +1,96 @@
+"""
+DRF authentication classes.
+
+Users authenticate with JWT bearer tokens (ShardedJWTAuthentication).
+Internal services send ``Authorization: Service <token>`` where the token
+is one of the values of ``settings.INTERNAL_SERVICE_TOKENS``.
+"""
+import hmac
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions, permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .sharding import shard_for_user_id
+
+
+class ShardedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the user from the shard encoded in its id.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        manager = self.user_model._default_manager.db_manager(shard_for_user_id(user_id))
+        try:
+            user = manager.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise exceptions.AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class InternalService:
+    """
+    Stand-in for request.user when an internal service is calling.
+    """
+    is_authenticated = True
+    is_active = True
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return f"service:{self.name}"
+
+
+class ServiceTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticates internal services by a shared token.
+    """
+    keyword = 'Service'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid service token header')
+
+        presented = auth[1]
+        for name, token in getattr(settings, 'INTERNAL_SERVICE_TOKENS', {}).items():
+            if token and hmac.compare_digest(presented, token.encode()):
+                return InternalService(name), None
+
+        raise exceptions.AuthenticationFailed('Invalid service token')
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class IsInternalService(permissions.BasePermission):
+    """
+    Allows access only to callers authenticated by ServiceTokenAuthentication.
+    """
+
+    def has_permission(self, request, view):
+        return isinstance(request.user, InternalService)
@@ -0,0 +1,42 @@
+"""
+Django authentication backend for sharded users.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .sharding import shard_for_email, shard_for_user_id
+
+
+UserModel = get_user_model()
+
+
+class ShardedModelBackend(ModelBackend):
+    """
+    ModelBackend that looks users up on their shard.
+
+    Behaves exactly like ModelBackend when sharding is off.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        manager = UserModel._default_manager.db_manager(shard_for_email(username))
+        try:
+            user = manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            UserModel().set_password(password)
+        else:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+
+    def get_user(self, user_id):
+        manager = UserModel._default_manager.db_manager(shard_for_user_id(user_id))
+        try:
+            user = manager.get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
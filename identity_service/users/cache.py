@@ -0,0 +1,74 @@
+"""
+Bounded in-process cache with per-entry expiry.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class BoundedTTLCache:
+    """
+    Thread-safe LRU mapping whose entries also expire after ``ttl`` seconds.
+
+    Memory is bounded by ``max_entries``: inserting into a full cache evicts
+    the least recently used entry.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_locked(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _set_locked(self, key, value, ttl, now):
+        self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get_locked(key, time.monotonic())
+        return default if value is None else value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._set_locked(key, value, ttl, time.monotonic())
+
+    def get_or_set(self, key, factory, ttl=None):
+        """
+        Return (value, created). ``factory`` is only called on a miss, and
+        the check-and-insert is atomic.
+        """
+        with self._lock:
+            now = time.monotonic()
+            value = self._get_locked(key, now)
+            if value is not None:
+                return value, False
+            value = factory()
+            self._set_locked(key, value, ttl, now)
+            return value, True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,113 @@
+"""
+Incremental change feed of users for downstream caches.
+
+Users are read in ``(updated_at, id)`` order, which the
+``user_updated_at_id_idx`` index serves directly, so a page costs the
+same whatever the table size: the query seeks to the cursor and reads
+``limit`` rows. The cursor is the position of the last row returned,
+encoded so clients treat it as opaque.
+
+Every row in a page is either an ``upsert`` with the profile fields, or a
+``delete`` tombstone for a deactivated user. Hard-deleted rows leave no
+trace, so accounts should be deactivated rather than deleted.
+
+Rows changed in the last ``CHANGE_FEED['SAFETY_LAG']`` seconds are held
+back: ``updated_at`` is set before the transaction commits, so a slow
+transaction could otherwise commit behind a cursor that already passed it.
+Bulk ``update()`` calls on users must set ``updated_at`` themselves.
+"""
+import base64
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .lookup import LOOKUP_FIELDS
+from .models import User
+from .sharding import shard_aliases
+
+
+CURSOR_VERSION = 'v1'
+
+OP_UPSERT = 'upsert'
+OP_DELETE = 'delete'
+
+FEED_FIELDS = LOOKUP_FIELDS
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(updated_at, user_id):
+    raw = f'{CURSOR_VERSION}|{updated_at.isoformat()}|{user_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the ``(updated_at, id)`` position encoded in ``cursor``.
+
+    Raises:
+        InvalidCursor: If the cursor was not produced by encode_cursor()
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        version, updated_at, user_id = raw.split('|')
+        position = (parse_datetime(updated_at), int(user_id))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+    if version != CURSOR_VERSION or position[0] is None:
+        raise InvalidCursor('Invalid cursor')
+    return position
+
+
+def _page_queryset(alias, after, until, limit):
+    queryset = User.objects.using(alias).filter(updated_at__lte=until)
+    if after is not None:
+        updated_at, user_id = after
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=user_id)
+        )
+    return queryset.only(*FEED_FIELDS).order_by('updated_at', 'pk')[:limit]
+
+
+def fetch_changes(cursor=None, limit=None):
+    """
+    Read one page of the change feed.
+
+    Args:
+        cursor (str, optional): ``next_cursor`` of the previous page; None
+            starts from the beginning (a full sync)
+        limit (int, optional): Page size, defaults to CHANGE_FEED['PAGE_SIZE']
+
+    Returns:
+        tuple: (changes, next_cursor, has_more). ``changes`` is an iterator
+        of dicts in feed order; ``next_cursor`` is the cursor to pass next
+        time (unchanged when the page is empty).
+
+    Raises:
+        InvalidCursor: If ``cursor`` cannot be decoded
+    """
+    config = settings.CHANGE_FEED
+    limit = limit or config['PAGE_SIZE']
+    after = decode_cursor(cursor) if cursor else None
+    until = timezone.now() - timedelta(seconds=config['SAFETY_LAG'])
+
+    # One extra row tells whether another page follows
+    per_shard = [list(_page_queryset(alias, after, until, limit + 1)) for alias in shard_aliases()]
+    rows = list(heapq.merge(*per_shard, key=lambda user: (user.updated_at, user.pk)))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].pk) if rows else cursor
+    return (_change(user) for user in rows), next_cursor, has_more
+
+
+def _change(user):
+    if not user.is_active:
+        return {'op': OP_DELETE, 'id': user.pk, 'updated_at': user.updated_at}
+    return {'op': OP_UPSERT, 'id': user.pk, 'user': {field: getattr(user, field) for field in FEED_FIELDS}}
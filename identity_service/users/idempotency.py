@@ -0,0 +1,235 @@
+"""
+Idempotency-Key support for non-idempotent POST endpoints.
+
+The first request with a given key runs normally and its response is kept
+for a while. Retries with the same key and body get the stored response
+back without running the view again (no second password hash, no second
+token family). A duplicate that arrives while the first request is still
+running waits for it instead of running in parallel.
+
+Entries live in the cache named by IDEMPOTENCY['CACHE'], so retries are
+absorbed whichever worker they reach:
+
+  - the first request claims the key with cache.add(); the in-flight marker
+    expires after PENDING_TTL in case its worker dies mid-request,
+  - its response then replaces the marker for SCOPE_TTL (or TTL),
+  - a duplicate polls the key every POLL_INTERVAL, for at most
+    WAIT_TIMEOUT, until the response is there.
+
+Each worker also keeps the entries it has seen in a bounded in-process
+store. Duplicates within one worker wait on an event instead of polling,
+and replays skip the cache round trip. Responses carrying tokens are only
+kept for a few minutes (SCOPE_TTL).
+
+Replays and waiting duplicates do no hashing, so they skip admission control
+(identity_service/admission.py) instead of holding a slot while they wait.
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.response import Response
+
+from identity_service.admission import admit_deferred
+
+from .cache import BoundedTTLCache
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotentRequest:
+    """
+    Store entry for one key: in flight until ``done`` is set.
+    """
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.status_code = None
+        self.data = None
+        self.headers = {}
+
+    def complete(self, response):
+        self.status_code = response.status_code
+        self.data = response.data
+        self.headers = {
+            name: response[name] for name in ('Location', 'WWW-Authenticate') if response.has_header(name)
+        }
+        self.done.set()
+
+    def as_cached(self, expires):
+        return {
+            'fingerprint': self.fingerprint,
+            'status_code': self.status_code,
+            'data': self.data,
+            'headers': self.headers,
+            'expires': expires,
+        }
+
+    def complete_from(self, cached):
+        self.status_code = cached['status_code']
+        self.data = cached['data']
+        self.headers = cached['headers']
+        self.done.set()
+
+    def replay(self):
+        headers = dict(self.headers, **{'Idempotent-Replayed': 'true'})
+        return Response(self.data, status=self.status_code, headers=headers)
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        config = settings.IDEMPOTENCY
+        _store = BoundedTTLCache(max_entries=config['MAX_ENTRIES'], ttl=config['TTL'])
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(*, setting, **kwargs):
+    global _store
+    if setting == 'IDEMPOTENCY':
+        _store = None
+
+
+def _shared_cache():
+    return caches[settings.IDEMPOTENCY['CACHE']]
+
+
+def _cache_key(scope, key):
+    # Client keys may hold characters some cache backends reject
+    return 'idempotency:{}:{}'.format(scope, hashlib.sha256(key.encode()).hexdigest())
+
+
+def _wait_for_other_worker(cache_key, fingerprint):
+    """
+    Poll the shared cache until the request holding ``cache_key`` finishes.
+
+    Returns:
+        dict: The cached entry, still without ``status_code`` if the wait
+            timed out; None if the original request failed
+    """
+    config = settings.IDEMPOTENCY
+    deadline = time.monotonic() + config['WAIT_TIMEOUT']
+    cache = _shared_cache()
+    while True:
+        cached = cache.get(cache_key)
+        if cached is None or 'status_code' in cached or cached['fingerprint'] != fingerprint:
+            return cached
+        if time.monotonic() >= deadline:
+            return cached
+        time.sleep(config['POLL_INTERVAL'])
+
+
+def _error(message, status_code):
+    return Response({'error': message}, status=status_code)
+
+
+def _has_entry(scope, request):
+    key = request.headers.get(HEADER)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return False
+    if get_store().get((scope, key)) is not None:
+        return True
+    return _shared_cache().get(_cache_key(scope, key)) is not None
+
+
+def idempotent(scope):
+    """
+    Decorate a view's POST handler so Idempotency-Key retries are replayed.
+
+    Args:
+        scope (str): Namespace for keys, so endpoints never share entries;
+            also selects the retention in IDEMPOTENCY['SCOPE_TTL']
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return handler(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return _error(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters',
+                              status.HTTP_400_BAD_REQUEST)
+
+            fingerprint = hashlib.sha256(request.body).hexdigest()
+            store = get_store()
+            store_key = (scope, key)
+            config = settings.IDEMPOTENCY
+            ttl = config['SCOPE_TTL'].get(scope, config['TTL'])
+            entry, created = store.get_or_set(store_key, lambda: IdempotentRequest(fingerprint), ttl=ttl)
+
+            if not created:
+                if entry.fingerprint != fingerprint:
+                    return _error(f'{HEADER} was already used with a different request body',
+                                  status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if not entry.done.wait(config['WAIT_TIMEOUT']):
+                    return _error('A request with this Idempotency-Key is still in progress',
+                                  status.HTTP_409_CONFLICT)
+                if entry.status_code is None:
+                    # The original request failed; let this retry run it
+                    return wrapper(self, request, *args, **kwargs)
+                return entry.replay()
+
+            def abandon():
+                # Duplicates waiting on this entry will run the request themselves
+                store.pop(store_key)
+                entry.done.set()
+
+            cache = _shared_cache()
+            cache_key = _cache_key(scope, key)
+            if not cache.add(cache_key, {'fingerprint': fingerprint}, config['PENDING_TTL']):
+                # First in this worker, but another worker has the key
+                cached = _wait_for_other_worker(cache_key, fingerprint)
+                if cached is None:
+                    abandon()
+                    return wrapper(self, request, *args, **kwargs)
+                if cached['fingerprint'] != fingerprint:
+                    abandon()
+                    return _error(f'{HEADER} was already used with a different request body',
+                                  status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if 'status_code' not in cached:
+                    abandon()
+                    return _error('A request with this Idempotency-Key is still in progress',
+                                  status.HTTP_409_CONFLICT)
+                entry.complete_from(cached)
+                store.set(store_key, entry, ttl=max(cached['expires'] - time.time(), 0))
+                return entry.replay()
+
+            # Skipped admission expecting a replay, but runs the view after all
+            shed = admit_deferred(request._request)
+            if shed is not None:
+                cache.delete(cache_key)
+                abandon()
+                return shed
+
+            try:
+                response = handler(self, request, *args, **kwargs)
+            except BaseException:
+                cache.delete(cache_key)
+                abandon()
+                raise
+
+            if response.status_code >= 500:
+                # Server errors are not stored; the client may retry for real
+                cache.delete(cache_key)
+                abandon()
+            else:
+                entry.complete(response)
+                cache.set(cache_key, entry.as_cached(time.time() + ttl), ttl)
+            return response
+
+        wrapper.admission_exempt = lambda request: _has_entry(scope, request)
+        return wrapper
+    return decorator
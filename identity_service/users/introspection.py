@@ -0,0 +1,115 @@
+"""
+Batch token introspection for internal services.
+
+Signatures are verified locally; revocation for the whole batch is resolved
+with one query over the token families the tokens belong to (one per shard
+when users are sharded). Refresh tokens issued before families existed fall
+back to a single blacklist query.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_to_epoch
+
+from .models import TokenFamily
+from .sharding import shard_for_user_id
+from .signing import get_token_backend
+from .tokens import FAMILY_CLAIM, GENERATION_CLAIM
+
+
+INTROSPECTABLE_TYPES = ('access', 'refresh')
+
+
+def _inactive(ttl):
+    return {'active': False, 'cache_ttl': ttl}
+
+
+def introspect_tokens(raw_tokens):
+    """
+    Introspect a batch of encoded tokens.
+
+    Args:
+        raw_tokens (list): Encoded JWTs
+
+    Returns:
+        list: One dict per token, in input order, with ``active``, the
+        token claims when active (the user id as stored, whatever type the
+        token encodes it as), and ``cache_ttl`` - how many seconds the
+        caller may cache the answer.
+    """
+    config = settings.TOKEN_INTROSPECTION
+    max_ttl = config['CACHE_TTL']
+    backend = get_token_backend()
+    type_claim = api_settings.TOKEN_TYPE_CLAIM
+    user_id_claim = api_settings.USER_ID_CLAIM
+    user_id_field = get_user_model()._meta.get_field(api_settings.USER_ID_FIELD)
+
+    payloads = []
+    for raw in raw_tokens:
+        try:
+            payload = backend.decode(raw)
+        except TokenBackendError:
+            payload = None
+        if payload is not None and payload.get(type_claim) not in INTROSPECTABLE_TYPES:
+            payload = None
+        payloads.append(payload)
+
+    family_ids_by_shard = {}
+    for payload in payloads:
+        if payload and FAMILY_CLAIM in payload:
+            alias = shard_for_user_id(payload.get(user_id_claim))
+            family_ids_by_shard.setdefault(alias, set()).add(payload[FAMILY_CLAIM])
+
+    families = {}
+    for alias, family_ids in family_ids_by_shard.items():
+        rows = TokenFamily.objects.using(alias).filter(pk__in=family_ids).values_list(
+            'pk', 'generation', 'revoked_at', 'user__is_active'
+        )
+        families.update({str(pk): (generation, revoked_at, is_active)
+                         for pk, generation, revoked_at, is_active in rows})
+
+    legacy_jtis = {
+        p[api_settings.JTI_CLAIM] for p in payloads
+        if p and FAMILY_CLAIM not in p and p[type_claim] == 'refresh'
+    }
+    blacklisted = set()
+    if legacy_jtis:
+        blacklisted = set(BlacklistedToken.objects.filter(
+            token__jti__in=legacy_jtis
+        ).values_list('token__jti', flat=True))
+
+    now = datetime_to_epoch(aware_utcnow())
+    results = []
+    for payload in payloads:
+        if payload is None:
+            # Bad signature, expired or malformed: that never changes
+            results.append(_inactive(max_ttl))
+            continue
+
+        if FAMILY_CLAIM in payload:
+            family = families.get(payload[FAMILY_CLAIM])
+            if family is None:
+                results.append(_inactive(max_ttl))
+                continue
+            generation, revoked_at, is_active = family
+            stale = (
+                payload[type_claim] == 'refresh'
+                and payload.get(GENERATION_CLAIM) != generation
+            )
+            if revoked_at is not None or stale or not is_active:
+                results.append(_inactive(max_ttl))
+                continue
+        elif payload[api_settings.JTI_CLAIM] in blacklisted:
+            results.append(_inactive(max_ttl))
+            continue
+
+        result = {'active': True, 'cache_ttl': max(0, min(max_ttl, payload['exp'] - now))}
+        result.update(payload)
+        if user_id_claim in result:
+            # SimpleJWT 5.4+ writes the claim as a string; answer with the id's own type
+            result[user_id_claim] = user_id_field.to_python(result[user_id_claim])
+        results.append(result)
+
+    return results
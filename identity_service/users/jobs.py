@@ -0,0 +1,254 @@
+"""
+Small persistent background job runner.
+
+Register a function as a job and enqueue it with keyword arguments that
+are JSON serializable:
+
+    @job('users.send_welcome_email')
+    def send_welcome_email(user_id):
+        ...
+
+    enqueue('users.send_welcome_email', user_id=user.pk)
+
+``python manage.py run_jobs`` runs a Worker. Workers claim due jobs with a
+conditional UPDATE, so several worker processes can poll the same table.
+Failed jobs are retried with exponential backoff until max_attempts;
+a run whose worker died (no outcome after LOCK_TIMEOUT) counts as a
+failed attempt.
+
+Workers run outside any request, so the replica router would send their
+reads to a replica that may not have the job (or the user it is about)
+yet. The claim and every job function therefore run pinned to the primary.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from identity_service.db_routers import pin_to_primary
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def job(name):
+    """
+    Decorator registering a function under ``name``.
+    """
+    def decorator(func):
+        if name in _registry and _registry[name] is not func:
+            raise ValueError(f"Job '{name}' is already registered")
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_job_function(name):
+    return _registry[name]
+
+
+def _new_job(name, payload, run_at=None, max_attempts=None):
+    if name not in _registry:
+        raise KeyError(f"Unknown job '{name}'")
+    return Job(
+        name=name,
+        payload=payload,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_RUNNER['MAX_ATTEMPTS'],
+    )
+
+
+def enqueue(name, run_at=None, max_attempts=None, **payload):
+    """
+    Persist a single job.
+
+    Returns:
+        Job: The saved job
+    """
+    new_job = _new_job(name, payload, run_at, max_attempts)
+    new_job.save()
+    return new_job
+
+
+def enqueue_many(jobs):
+    """
+    Persist several jobs with a single INSERT.
+
+    Args:
+        jobs (list): (name, payload dict) tuples
+
+    Returns:
+        list: The saved jobs
+    """
+    return Job.objects.bulk_create([_new_job(name, payload) for name, payload in jobs])
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff with jitter for the given number of failed attempts.
+    """
+    config = settings.JOB_RUNNER
+    delay = min(config['RETRY_BACKOFF'] * 2 ** (attempts - 1), config['RETRY_BACKOFF_MAX'])
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+class Worker:
+    """
+    Claims due jobs in batches and runs them on a thread pool.
+    """
+
+    def __init__(self, workers=None, batch_size=None, poll_interval=None):
+        config = settings.JOB_RUNNER
+        self.workers = workers or config['WORKERS']
+        self.batch_size = batch_size or config['BATCH_SIZE']
+        self.poll_interval = poll_interval or config['POLL_INTERVAL']
+        self.lock_timeout = timedelta(seconds=config['LOCK_TIMEOUT'])
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"[:48]
+        self._executor = None
+
+    def release_stale(self):
+        """
+        Put jobs whose worker died mid-run back in the queue.
+
+        The lost run counts as an attempt, so a job that keeps killing its
+        worker ends up FAILED instead of being retried forever.
+
+        Returns:
+            int: Number of jobs released (requeued or failed)
+        """
+        now = timezone.now()
+        stale = Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=now - self.lock_timeout)
+        last_error = f"Worker stopped responding for more than {self.lock_timeout}"
+
+        failed = stale.filter(attempts__gte=F('max_attempts') - 1).update(
+            status=Job.STATUS_FAILED, attempts=F('attempts') + 1, last_error=last_error,
+            finished_at=now, locked_by='', locked_at=None,
+        )
+        if failed:
+            logger.error("%d stale jobs failed permanently", failed)
+        requeued = stale.update(
+            status=Job.STATUS_PENDING, attempts=F('attempts') + 1, last_error=last_error,
+            locked_by='', locked_at=None,
+        )
+        return failed + requeued
+
+    def claim(self):
+        """
+        Atomically take up to batch_size due jobs.
+
+        Returns:
+            list: Jobs now owned by this worker
+        """
+        now = timezone.now()
+        candidates = list(
+            Job.objects.filter(status=Job.STATUS_PENDING, run_at__lte=now)
+            .order_by('run_at')
+            .values_list('pk', flat=True)[:self.batch_size]
+        )
+        if not candidates:
+            return []
+
+        # The status condition makes the UPDATE a compare-and-swap: when two
+        # workers race for the same rows, each row goes to exactly one.
+        claim_id = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        Job.objects.filter(pk__in=candidates, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING, locked_by=claim_id, locked_at=now,
+        )
+        return list(Job.objects.filter(locked_by=claim_id, status=Job.STATUS_RUNNING))
+
+    def execute(self, claimed):
+        """
+        Run one claimed job and record the outcome.
+
+        The outcome is only saved while this worker still holds the claim.
+        A run that outlived LOCK_TIMEOUT was released and may have been
+        claimed again; that run's state wins.
+        """
+        claim_id = claimed.locked_by
+        try:
+            with pin_to_primary():
+                get_job_function(claimed.name)(**claimed.payload)
+        except Exception:
+            claimed.attempts += 1
+            claimed.last_error = traceback.format_exc(limit=5)[-4000:]
+            if claimed.attempts >= claimed.max_attempts:
+                claimed.status = Job.STATUS_FAILED
+                claimed.finished_at = timezone.now()
+                logger.error("Job %s failed permanently", claimed)
+            else:
+                claimed.status = Job.STATUS_PENDING
+                claimed.run_at = timezone.now() + retry_delay(claimed.attempts)
+                logger.warning("Job %s failed, retrying at %s", claimed, claimed.run_at)
+        else:
+            claimed.attempts += 1
+            claimed.status = Job.STATUS_DONE
+            claimed.finished_at = timezone.now()
+
+        claimed.locked_by = ''
+        claimed.locked_at = None
+        saved = Job.objects.filter(pk=claimed.pk, locked_by=claim_id).update(**{
+            field: getattr(claimed, field) for field in (
+                'status', 'attempts', 'last_error', 'run_at',
+                'finished_at', 'locked_by', 'locked_at',
+            )
+        })
+        if not saved:
+            logger.warning("Job %s ran past its lock timeout; outcome not recorded", claimed)
+
+    def _execute_in_thread(self, claimed):
+        try:
+            self.execute(claimed)
+        finally:
+            close_old_connections()
+
+    def run_once(self):
+        """
+        Claim and run one batch.
+
+        Returns:
+            int: Number of jobs run
+        """
+        with pin_to_primary():
+            self.release_stale()
+            claimed = self.claim()
+        if self.workers == 1:
+            for item in claimed:
+                self.execute(item)
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='job-worker'
+                )
+            list(self._executor.map(self._execute_in_thread, claimed))
+        return len(claimed)
+
+    def run(self, stop_when_empty=False):
+        """
+        Poll for jobs until interrupted (or until the queue is empty).
+        """
+        try:
+            while True:
+                close_old_connections()
+                ran = self.run_once()
+                if not ran:
+                    if stop_when_empty:
+                        return
+                    time.sleep(self.poll_interval)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -0,0 +1,105 @@
+"""
+Batch user lookup for internal services.
+
+A batch is resolved with one ``in_bulk`` query per shard, loading only the
+requested columns. Results are produced lazily, in input order, so the
+view can stream them while Aadhaar numbers (when asked for) are decrypted
+one row at a time with a single EncryptionHelper.
+"""
+from django.conf import settings
+
+from .audit import record_aadhaar_access
+from .models import AadhaarAccessLog, User
+from .sharding import shard_for_email, shard_for_user_id
+from .utils import EncryptionHelper
+
+
+# Columns a service may ask for; the stored ciphertext is never one of them
+LOOKUP_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'phone_number',
+    'date_of_birth', 'address', 'aadhaar_masked', 'is_active', 'created_at', 'updated_at',
+)
+DEFAULT_LOOKUP_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+
+AADHAAR_COLUMNS = ('aadhaar_ciphertext', 'encrypted_aadhaar')
+
+
+def _fetch(keys, key_field, fields, include_aadhaar):
+    """
+    Load the users matching ``keys`` with one query per shard.
+
+    Returns:
+        dict: key -> User with only ``fields`` (and the Aadhaar columns) loaded
+    """
+    shard_for = shard_for_user_id if key_field == 'id' else shard_for_email
+    keys_by_shard = {}
+    for key in dict.fromkeys(keys):
+        keys_by_shard.setdefault(shard_for(key), []).append(key)
+
+    columns = set(fields) | {key_field}
+    if include_aadhaar:
+        columns.update(AADHAAR_COLUMNS)
+
+    found = {}
+    for alias, shard_keys in keys_by_shard.items():
+        found.update(
+            User.objects.using(alias).only(*columns).in_bulk(shard_keys, field_name=key_field)
+        )
+    return found
+
+
+def lookup_users(keys, key_field='id', fields=DEFAULT_LOOKUP_FIELDS, include_aadhaar=False,
+                 request=None):
+    """
+    Resolve a batch of users by id or email.
+
+    The query runs immediately; the returned iterator only formats rows.
+
+    Args:
+        keys (list): User ids or emails
+        key_field (str): 'id' or 'email'
+        fields (iterable): Columns to return, from LOOKUP_FIELDS
+        include_aadhaar (bool): Also decrypt and return ``aadhaar``; every
+            decrypted number is written to the Aadhaar access log
+        request (Request, optional): Used for the audit log's client address
+            and calling service
+
+    Returns:
+        iterator: One dict per key, in input order. Misses are
+        ``{key_field: key, 'found': False}``.
+    """
+    found = _fetch(keys, key_field, fields, include_aadhaar)
+    return _results(keys, key_field, found, fields, include_aadhaar, request)
+
+
+def _results(keys, key_field, found, fields, include_aadhaar, request):
+    encryptor = EncryptionHelper() if include_aadhaar else None
+    for key in keys:
+        user = found.get(key)
+        if user is None:
+            yield {key_field: key, 'found': False}
+            continue
+
+        result = {key_field: key, 'found': True}
+        result.update((field, getattr(user, field)) for field in fields)
+        if include_aadhaar:
+            result['aadhaar'] = _decrypt(user, encryptor, request)
+        yield result
+
+
+def _decrypt(user, encryptor, request):
+    if not (user.aadhaar_ciphertext or user.encrypted_aadhaar):
+        return None
+    try:
+        aadhaar = user._decrypt_stored_aadhaar(encryptor)
+    except ValueError:
+        return None
+    record_aadhaar_access(user, request, event=AadhaarAccessLog.EVENT_SERVICE_LOOKUP)
+    return aadhaar
+
+
+def may_decrypt_aadhaar(service):
+    """
+    Return True if ``service`` (an InternalService) may ask for plaintext Aadhaar.
+    """
+    return service.name in settings.USER_BATCH_LOOKUP['AADHAAR_SERVICES']
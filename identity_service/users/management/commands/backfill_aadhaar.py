@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from users.models import User
+from users.sharding import shard_aliases
+from users.utils import EncryptionHelper
+
+
+# Columns derived from the Aadhaar number, filled by User.backfill_aadhaar_columns
+DERIVED_FIELDS = ['aadhaar_masked', 'aadhaar_index']
+
+
+class Command(BaseCommand):
+    help = "Fills derived Aadhaar columns (masked value, blind index) for rows that predate them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Count rows without writing")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        encryptor = EncryptionHelper()
+        has_aadhaar = Q(aadhaar_ciphertext__isnull=False) | Q(encrypted_aadhaar__gt='')
+        pending = (
+            User.objects
+            .filter(has_aadhaar)
+            .filter(Q(aadhaar_masked__isnull=True) | Q(aadhaar_index__isnull=True))
+            .order_by('pk')
+            .only('pk', 'aadhaar_ciphertext', 'encrypted_aadhaar', *DERIVED_FIELDS)
+        )
+
+        filled = failed = 0
+        for alias in shard_aliases():
+            # Keyset pagination, as in migrate_aadhaar_storage
+            last_pk = 0
+            while True:
+                batch = list(pending.using(alias).filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                changed = []
+                for user in batch:
+                    try:
+                        if user.backfill_aadhaar_columns(encryptor):
+                            changed.append(user)
+                    except ValueError as e:
+                        failed += 1
+                        self.stderr.write(f"User {user.pk}: {e}")
+
+                if not options['dry_run']:
+                    with transaction.atomic(using=alias):
+                        User.objects.using(alias).bulk_update(changed, DERIVED_FIELDS)
+                filled += len(changed)
+                self.stdout.write(f"Filled {filled} rows (last id {last_pk})")
+
+        verb = "Would fill" if options['dry_run'] else "Filled"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {filled} rows, {failed} failed"))
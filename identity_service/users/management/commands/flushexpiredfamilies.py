@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import TokenFamily
+from users.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Deletes refresh-token families whose newest token has expired"
+
+    def handle(self, *args, **options):
+        deleted = 0
+        for alias in shard_aliases():
+            count, _ = TokenFamily.objects.using(alias).filter(
+                expires_at__lte=timezone.now()
+            ).delete()
+            deleted += count
+        self.stdout.write(f"Deleted {deleted} expired token families")
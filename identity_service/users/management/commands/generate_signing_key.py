@@ -0,0 +1,51 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+CURVES = {
+    'ES256': ec.SECP256R1,
+    'ES384': ec.SECP384R1,
+    'ES512': ec.SECP521R1,
+}
+
+
+class Command(BaseCommand):
+    help = "Generates a private key for an entry of JWT_SIGNING_KEYS"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm', default='RS256',
+            choices=['RS256', 'RS384', 'RS512', 'ES256', 'ES384', 'ES512', 'EdDSA'],
+        )
+        parser.add_argument('--kid', help="Key ID (defaults to the current year and month)")
+        parser.add_argument('--output', help="Write the PEM here instead of stdout")
+
+    def handle(self, *args, **options):
+        algorithm = options['algorithm']
+        if algorithm.startswith('RS'):
+            key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        elif algorithm == 'EdDSA':
+            key = ed25519.Ed25519PrivateKey.generate()
+        else:
+            key = ec.generate_private_key(CURVES[algorithm]())
+
+        pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode('ascii')
+
+        kid = options['kid'] or timezone.now().strftime('%Y-%m')
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(pem)
+            location = f"'private_key_path': '{options['output']}'"
+        else:
+            self.stdout.write(pem)
+            location = "'private_key': <the PEM above>"
+
+        self.stderr.write(
+            f"Add to JWT_SIGNING_KEYS: {{'kid': '{kid}', 'algorithm': '{algorithm}', {location}}}"
+        )
@@ -0,0 +1,144 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from users.models import User, UsernameClaim
+from users.sharding import bucket_for_email, make_user_id, shard_for_email, sharding_enabled
+from users.utils import EncryptionHelper
+
+
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Aditya', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Krishna', 'Meera',
+    'Neha', 'Nikhil', 'Pooja', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Sai', 'Sanjana', 'Shreya',
+    'Siddharth', 'Sneha', 'Tanvi', 'Varun', 'Vihaan', 'Vikram', 'Yash', 'Zoya', 'Harsh', 'Isha',
+]
+LAST_NAMES = [
+    'Agarwal', 'Bansal', 'Bhat', 'Chatterjee', 'Das', 'Desai', 'Gupta', 'Iyer', 'Jain', 'Joshi',
+    'Kapoor', 'Khan', 'Kulkarni', 'Kumar', 'Menon', 'Mishra', 'Nair', 'Patel', 'Pillai', 'Rao',
+    'Reddy', 'Shah', 'Sharma', 'Singh', 'Sinha', 'Verma', 'Yadav', 'Ghosh', 'Mehta', 'Naidu',
+]
+CITIES = [
+    'Bengaluru', 'Mumbai', 'Delhi', 'Hyderabad', 'Chennai', 'Pune', 'Kolkata', 'Ahmedabad',
+    'Jaipur', 'Lucknow', 'Indore', 'Kochi', 'Chandigarh', 'Bhopal', 'Nagpur', 'Coimbatore',
+]
+# Dates are relative to a fixed day, not today, so reruns give identical data
+AS_OF = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# Heavily skewed towards a few providers, like real sign-ups
+EMAIL_DOMAINS = [('gmail.com', 60), ('yahoo.co.in', 12), ('outlook.com', 10),
+                 ('hotmail.com', 5), ('rediffmail.com', 3), ('example.edu', 10)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates N synthetic users for benchmarks and load tests. The same "
+        "--seed and --start always produce the same users, and every user can "
+        "log in with --password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--start', type=int, default=0,
+                            help="Index of the first user, to append to an earlier run")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='Str0ng-pass!9')
+        parser.add_argument('--password-hashes', type=int, default=8,
+                            help="Distinct precomputed hashes (salts) shared by all users")
+        parser.add_argument('--aadhaar-ratio', type=float, default=0.8,
+                            help="Share of users with an Aadhaar number")
+        parser.add_argument('--inactive-ratio', type=float, default=0.03)
+
+    def handle(self, *args, **options):
+        if options['count'] < 1 or options['password_hashes'] < 1:
+            raise CommandError("count and --password-hashes must be positive")
+
+        seed = options['seed']
+        # Hashing is what makes real registration slow: do it a few times, up front
+        hashes = [
+            make_password(options['password'], salt=f'generated{seed}x{index}')
+            for index in range(options['password_hashes'])
+        ]
+        encryptor = EncryptionHelper()
+
+        started = time.perf_counter()
+        created = 0
+        first, end = options['start'], options['start'] + options['count']
+        for batch_start in range(first, end, options['batch_size']):
+            batch_end = min(batch_start + options['batch_size'], end)
+            users = [
+                self.build_user(index, seed, hashes, encryptor, options)
+                for index in range(batch_start, batch_end)
+            ]
+            created += self.insert(users)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{created} users ({created / elapsed * 60:,.0f} per minute)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {created} users in {time.perf_counter() - started:.1f}s "
+            f"(seed {seed}, password '{options['password']}')"
+        ))
+
+    def build_user(self, index, seed, hashes, encryptor, options):
+        """
+        Return an unsaved User whose fields depend only on ``seed`` and ``index``.
+        """
+        # One generator per user: batch size and --start do not change the data
+        rng = random.Random(f'{seed}:{index}')
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        username = f'{first_name}.{last_name}.{index}'.lower()
+        domain = rng.choices(
+            [name for name, _ in EMAIL_DOMAINS], weights=[weight for _, weight in EMAIL_DOMAINS]
+        )[0]
+
+        user = User(
+            username=username,
+            email=f'{username}@{domain}',
+            password=hashes[index % len(hashes)],
+            first_name=first_name,
+            last_name=last_name,
+            is_active=rng.random() >= options['inactive_ratio'],
+            # Sign-ups spread over the two years before AS_OF
+            date_joined=AS_OF - timedelta(seconds=rng.randrange(2 * 365 * 24 * 3600)),
+        )
+        if rng.random() < 0.9:
+            user.phone_number = f'+91{rng.choice("6789")}{rng.randrange(10 ** 9):09d}'
+        if rng.random() < 0.85:
+            # Mostly students and recent graduates
+            age_days = int(rng.triangular(18, 35, 22) * 365.25)
+            user.date_of_birth = AS_OF.date() - timedelta(days=age_days)
+        if rng.random() < 0.7:
+            user.address = f'{rng.randrange(1, 500)}, Sector {rng.randrange(1, 80)}, {rng.choice(CITIES)}'
+        if rng.random() < options['aadhaar_ratio']:
+            # Aadhaar numbers never start with 0 or 1
+            user.set_aadhaar(f'{rng.randrange(2, 10)}{rng.randrange(10 ** 11):011d}', encryptor)
+        return user
+
+    def insert(self, users):
+        """
+        bulk_create ``users`` on their shards, after their username claims;
+        returns the number inserted.
+        """
+        by_alias = {}
+        for user in users:
+            if sharding_enabled():
+                # bulk_create skips User.save(), which assigns sharded ids
+                user.pk = make_user_id(bucket_for_email(user.email))
+            by_alias.setdefault(shard_for_email(user.email), []).append(user)
+
+        if sharding_enabled():
+            # Same guarantee as User.save(): usernames stay unique across shards
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                UsernameClaim.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+                    UsernameClaim(username=user.username, user_id=user.pk) for user in users
+                ])
+
+        for alias, shard_users in by_alias.items():
+            with transaction.atomic(using=alias):
+                User.objects.using(alias).bulk_create(shard_users)
+        return len(users)
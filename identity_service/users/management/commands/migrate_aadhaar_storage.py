@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import User
+from users.sharding import shard_aliases
+from users.utils import EncryptionHelper
+
+
+class Command(BaseCommand):
+    help = "Converts legacy base64/CBC Aadhaar values to the binary AES-GCM format in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Count rows without writing")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        encryptor = EncryptionHelper()
+        pending = (
+            User.objects
+            .filter(encrypted_aadhaar__isnull=False)
+            .exclude(encrypted_aadhaar='')
+            .order_by('pk')
+            .only('pk', 'encrypted_aadhaar', 'aadhaar_masked', 'aadhaar_index')
+        )
+
+        converted = failed = 0
+        for alias in shard_aliases():
+            # Keyset pagination keeps every batch an index range scan and
+            # never holds more than one batch in memory.
+            last_pk = 0
+            while True:
+                batch = list(pending.using(alias).filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                upgraded = []
+                for user in batch:
+                    try:
+                        if user.upgrade_aadhaar_storage(encryptor):
+                            upgraded.append(user)
+                    except ValueError as e:
+                        failed += 1
+                        self.stderr.write(f"User {user.pk}: {e}")
+
+                if not options['dry_run']:
+                    with transaction.atomic(using=alias):
+                        User.objects.using(alias).bulk_update(
+                            upgraded,
+                            ['aadhaar_ciphertext', 'encrypted_aadhaar', 'aadhaar_masked', 'aadhaar_index'],
+                        )
+                converted += len(upgraded)
+                self.stdout.write(f"Converted {converted} rows (last id {last_pk})")
+
+        verb = "Would convert" if options['dry_run'] else "Converted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {converted} rows, {failed} failed"))
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import TokenFamily, User
+from users.sharding import shard_aliases, shard_for_user_id, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves users (with their token families, groups and permissions) to the "
+        "shard USER_SHARDS now maps them to. Run after changing ALIASES or BUCKET_MAP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Count rows without moving them")
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            self.stdout.write("User sharding is not enabled, nothing to do")
+            return
+
+        batch_size = options['batch_size']
+        moved = 0
+        for source in shard_aliases():
+            last_pk = 0
+            while True:
+                batch = list(
+                    User.objects.using(source).filter(pk__gt=last_pk).order_by('pk')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                moves = {}
+                for user in batch:
+                    target = shard_for_user_id(user.pk)
+                    if target != source:
+                        moves.setdefault(target, []).append(user)
+
+                for target, users in moves.items():
+                    moved += len(users)
+                    self.stdout.write(f"{source} -> {target}: {len(users)} users")
+                    if not options['dry_run']:
+                        self.move(users, source, target)
+
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} users"))
+
+    def move(self, users, source, target):
+        """
+        Copy ``users`` with their token families, group and permission
+        assignments to ``target``, then delete them from ``source``.
+
+        Copies ignore rows that already exist, so a run interrupted between
+        the two steps can simply be repeated. Assignments are copied by
+        group and permission id, which must mean the same on every shard.
+        """
+        ids = [user.pk for user in users]
+        families = list(TokenFamily.objects.using(source).filter(user_id__in=ids))
+        memberships = {
+            through: [
+                # Fresh primary keys: the target numbers its own rows
+                through(**{field: getattr(row, field) for field in fields})
+                for row in through.objects.using(source).filter(user_id__in=ids)
+            ]
+            for through, fields in self.user_m2m_rows()
+        }
+
+        with transaction.atomic(using=target):
+            User.objects.using(target).bulk_create(users, ignore_conflicts=True)
+            TokenFamily.objects.using(target).bulk_create(families, ignore_conflicts=True)
+            for through, rows in memberships.items():
+                through.objects.using(target).bulk_create(rows, ignore_conflicts=True)
+
+        with transaction.atomic(using=source):
+            # Cascades to the source's token families and assignments
+            User.objects.using(source).filter(pk__in=ids).delete()
+
+    def user_m2m_rows(self):
+        """
+        Yield (through model, columns to copy) for User's groups and permissions.
+        """
+        for field in (User._meta.get_field('groups'), User._meta.get_field('user_permissions')):
+            through = field.remote_field.through
+            yield through, ['user_id', field.m2m_reverse_field_name() + '_id']
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from users.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs from the job table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Thread pool size (default: JOB_RUNNER['WORKERS'])")
+        parser.add_argument('--batch-size', type=int, help="Jobs claimed per poll")
+        parser.add_argument('--poll-interval', type=float, help="Seconds to sleep when idle")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due")
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+        )
+        self.stdout.write(f"Worker {worker.worker_id} running with {worker.workers} threads")
+        try:
+            worker.run(stop_when_empty=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping")
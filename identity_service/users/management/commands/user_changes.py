@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.utils.encoders import JSONEncoder
+
+from users.changes import InvalidCursor, fetch_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints users changed since --cursor as JSON lines (upserts and "
+        "tombstones), page by page, then the cursor to resume from on stderr."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cursor', help="next_cursor of a previous run; omit for a full dump")
+        parser.add_argument('--page-size', type=int, default=None)
+        parser.add_argument('--max-pages', type=int, default=None, help="Stop after this many pages")
+
+    def handle(self, *args, **options):
+        cursor = options['cursor']
+        pages = changed = 0
+        while options['max_pages'] is None or pages < options['max_pages']:
+            try:
+                changes, cursor, has_more = fetch_changes(cursor, options['page_size'])
+            except InvalidCursor as e:
+                raise CommandError(str(e))
+            for change in changes:
+                self.stdout.write(json.dumps(change, cls=JSONEncoder))
+                changed += 1
+            pages += 1
+            if not has_more:
+                break
+
+        self.stderr.write(f"{changed} changes, next cursor: {cursor or ''}")
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_tokenfamily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='aadhaar_ciphertext',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_aadhaar_ciphertext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AadhaarAccessLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('reveal', 'Reveal')], default='reveal', max_length=16)),
+                ('accessed_at', models.DateTimeField()),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'accessed_at'], name='aadhaar_log_user_time_idx'), models.Index(fields=['accessed_at'], name='aadhaar_log_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='aadhaar_masked',
+            field=models.CharField(blank=True, max_length=14, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_aadhaar_masked'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='aadhaar_index',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_aadhaar_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aadhaaraccesslog',
+            name='event',
+            field=models.CharField(choices=[('reveal', 'Reveal'), ('service_lookup', 'Service lookup')], default='reveal', max_length=16),
+        ),
+    ]
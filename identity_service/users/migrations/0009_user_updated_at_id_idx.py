@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_aadhaaraccesslog_service_lookup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['updated_at', 'id'], name='user_updated_at_id_idx'),
+        ),
+    ]
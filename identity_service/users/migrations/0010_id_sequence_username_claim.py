@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:21
+
+import time
+
+from django.db import migrations, models
+
+
+def seed_user_id_sequence(apps, schema_editor):
+    # Start above every id the earlier time-based layout could have issued:
+    # (ms since 2024-01-01 + one day) << 2 sequence bits. Constants are copied
+    # from users.sharding so later changes there cannot alter this migration.
+    now_ms = int(time.time() * 1000)
+    IdSequence = apps.get_model('users', 'IdSequence')
+    IdSequence.objects.using(schema_editor.connection.alias).get_or_create(
+        name='user_id',
+        defaults={'next_value': (now_ms - 1704067200000 + 24 * 3600 * 1000) << 2},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_user_updated_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UsernameClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150, unique=True)),
+                ('user_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(seed_user_id_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_id_sequence_username_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aadhaaraccesslog',
+            name='service',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -1,20 +1,33 @@
 """
 User models with encrypted Aadhaar/ID storage
 """
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from .utils import EncryptionHelper
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, router, transaction
+from django.db.models.base import DEFERRED
+from django.utils import timezone
+from .sharding import bucket_for_email, make_user_id, sharding_enabled
+from .utils import EncryptionHelper, aadhaar_blind_index, mask_aadhaar
 
 
-from django.contrib.auth.models import AbstractUser
-from django.db import models
-from .utils import EncryptionHelper
+class UsernameTaken(IntegrityError):
+    """
+    Raised by User.save() when another shard's user holds the username.
+    """
 
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
 
+    # Legacy base64 AES-CBC text; new values go to aadhaar_ciphertext
     encrypted_aadhaar = models.TextField(blank=True, null=True)
+    aadhaar_ciphertext = models.BinaryField(blank=True, null=True)
+    # Display form (XXXX-XXXX-1234), so showing it needs no decryption
+    aadhaar_masked = models.CharField(max_length=14, blank=True, null=True)
+    # HMAC of the number (see utils.aadhaar_blind_index) for exact-match search
+    aadhaar_index = models.CharField(max_length=64, blank=True, null=True, db_index=True)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
     address = models.TextField(blank=True, null=True)
@@ -25,22 +38,110 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Change feed order (users/changes.py)
+            models.Index(fields=['updated_at', 'id'], name='user_updated_at_id_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
+    # Username of this user's UsernameClaim as last loaded or saved
+    _claimed_username = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'username' in field_names:
+            username = values[field_names.index('username')]
+            if username is not DEFERRED:
+                instance._claimed_username = username
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not sharding_enabled():
+            super().save(*args, **kwargs)
+            return
+
+        adding = self.pk is None
+        if adding:
+            # Sharded ids are assigned here, not by the database, because they
+            # encode the shard the row is inserted into (see users/sharding.py)
+            self.pk = make_user_id(bucket_for_email(self.email))
+            kwargs.setdefault('force_insert', True)
 
+        update_fields = kwargs.get('update_fields')
+        if self.username == self._claimed_username or (
+            update_fields is not None and 'username' not in update_fields
+        ):
+            super().save(*args, **kwargs)
+            return
 
+        # Every create path and every rename goes through the claim, so no
+        # two shards can hold the same username
+        previous = self._claim_username(adding)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        try:
+            # A savepoint, so a failed insert can still release the claim
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+        except Exception:
+            self._release_username(previous)
+            if adding:
+                self.pk = None
+            raise
+        self._claimed_username = self.username
 
-    def set_aadhaar(self, plaintext_aadhaar):
+    def _claim_username(self, adding):
+        """
+        Point this user's UsernameClaim at the current username.
+
+        Returns:
+            str: The username claimed before, or None if there was no claim
+
+        Raises:
+            UsernameTaken: If another user holds the username
+        """
+        claims = UsernameClaim.objects.using(DEFAULT_DB_ALIAS)
+        previous = None
+        if not adding:
+            previous = claims.filter(user_id=self.pk).values_list('username', flat=True).first()
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                if previous is None:
+                    claims.create(username=self.username, user_id=self.pk)
+                else:
+                    claims.filter(user_id=self.pk).update(username=self.username)
+        except IntegrityError as e:
+            raise UsernameTaken(f"Username {self.username!r} is taken") from e
+        return previous
+
+    def _release_username(self, previous):
+        claims = UsernameClaim.objects.using(DEFAULT_DB_ALIAS).filter(user_id=self.pk)
+        if previous is None:
+            claims.delete()
+        else:
+            claims.update(username=previous)
+
+    def set_aadhaar(self, plaintext_aadhaar, encryptor=None):
         """
         Encrypt and store the Aadhaar number.
         
         Args:
             plaintext_aadhaar (str): The plaintext Aadhaar number
+            encryptor (EncryptionHelper, optional): Reused across rows in batches
         """
         if plaintext_aadhaar:
-            encryptor = EncryptionHelper()
-            self.encrypted_aadhaar = encryptor.encrypt(plaintext_aadhaar)
+            encryptor = encryptor or EncryptionHelper()
+            if settings.AADHAAR_STORAGE_FORMAT == 'gcm':
+                self.aadhaar_ciphertext = encryptor.encrypt_bytes(plaintext_aadhaar)
+                self.encrypted_aadhaar = None
+            else:
+                self.encrypted_aadhaar = encryptor.encrypt(plaintext_aadhaar)
+                self.aadhaar_ciphertext = None
+            self.aadhaar_masked = mask_aadhaar(plaintext_aadhaar)
+            self.aadhaar_index = aadhaar_blind_index(plaintext_aadhaar)
     
     def get_aadhaar(self):
         """
@@ -49,9 +150,11 @@ class User(AbstractUser):
         Returns:
             str: Decrypted Aadhaar number or None
         """
-        if self.encrypted_aadhaar:
+        if self.aadhaar_ciphertext or self.encrypted_aadhaar:
             try:
                 decryptor = EncryptionHelper()
+                if self.aadhaar_ciphertext:
+                    return decryptor.decrypt_bytes(self.aadhaar_ciphertext)
                 return decryptor.decrypt(self.encrypted_aadhaar)
             except Exception as e:
                 # Log the error in production
@@ -59,8 +162,234 @@ class User(AbstractUser):
                 return None
         return None
     
+    def get_aadhaar_masked(self):
+        """
+        Return the masked Aadhaar number for display.
+
+        Rows written before the masked column existed are decrypted once
+        here until ``python manage.py backfill_aadhaar`` has run.
+
+        Returns:
+            str: Masked Aadhaar number or None
+        """
+        if self.aadhaar_masked:
+            return self.aadhaar_masked
+        return mask_aadhaar(self.get_aadhaar())
+
+    def _decrypt_stored_aadhaar(self, encryptor):
+        if self.aadhaar_ciphertext:
+            return encryptor.decrypt_bytes(self.aadhaar_ciphertext)
+        return encryptor.decrypt(self.encrypted_aadhaar)
+
+    def backfill_aadhaar_columns(self, encryptor=None):
+        """
+        Fill the columns derived from the Aadhaar number (masked value and
+        blind index) for a row written before they existed.
+
+        Args:
+            encryptor (EncryptionHelper, optional): Reused across rows in batches
+
+        Returns:
+            bool: True if the instance was changed (not saved)
+
+        Raises:
+            ValueError: If the stored value cannot be decrypted
+        """
+        if self.aadhaar_masked and self.aadhaar_index:
+            return False
+        if not (self.aadhaar_ciphertext or self.encrypted_aadhaar):
+            return False
+
+        plaintext = self._decrypt_stored_aadhaar(encryptor or EncryptionHelper())
+        self.aadhaar_masked = mask_aadhaar(plaintext)
+        self.aadhaar_index = aadhaar_blind_index(plaintext)
+        return True
+
+    def reencrypt_aadhaar(self, encryptor=None):
+        """
+        Decrypt the stored Aadhaar number and encrypt it again, in the
+        current AADHAAR_STORAGE_FORMAT with a fresh IV/nonce.
+
+        Args:
+            encryptor (EncryptionHelper, optional): Reused across rows in batches
+
+        Returns:
+            bool: True if the instance was changed (not saved)
+
+        Raises:
+            ValueError: If the stored value cannot be decrypted
+        """
+        if not (self.aadhaar_ciphertext or self.encrypted_aadhaar):
+            return False
+
+        encryptor = encryptor or EncryptionHelper()
+        self.set_aadhaar(self._decrypt_stored_aadhaar(encryptor), encryptor)
+        return True
+
+    def upgrade_aadhaar_storage(self, encryptor=None):
+        """
+        Re-encrypt a legacy CBC value into the binary GCM format.
+
+        Args:
+            encryptor (EncryptionHelper, optional): Reused across rows in batches
+
+        Returns:
+            bool: True if the instance was changed (not saved)
+        """
+        if not self.encrypted_aadhaar:
+            return False
+
+        encryptor = encryptor or EncryptionHelper()
+        plaintext = encryptor.decrypt(self.encrypted_aadhaar)
+        self.aadhaar_ciphertext = encryptor.encrypt_bytes(plaintext)
+        self.encrypted_aadhaar = None
+        self.aadhaar_masked = mask_aadhaar(plaintext)
+        self.aadhaar_index = aadhaar_blind_index(plaintext)
+        return True
+
     def get_full_name(self):
         """
         Return the user's full name.
         """
-        return f"{self.first_name} {self.last_name}".strip() or self.username
\ No newline at end of file
+        return f"{self.first_name} {self.last_name}".strip() or self.username
+
+
+class TokenFamily(models.Model):
+    """
+    One row per login session.
+
+    Every refresh token minted from a login carries the family id and a
+    generation number. Rotating a refresh token bumps ``generation`` with a
+    single conditional UPDATE, so no per-rotation rows are written. A
+    refresh token whose generation is behind the stored one has already
+    been used, which revokes the whole family.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='token_families')
+    generation = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_refreshed_at = models.DateTimeField(blank=True, null=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name_plural = 'token families'
+
+    def __str__(self):
+        return f"{self.user_id}:{self.id} (generation {self.generation})"
+
+    @property
+    def is_revoked(self):
+        return self.revoked_at is not None
+
+
+class IdSequence(models.Model):
+    """
+    A named counter handed out in blocks, see users.sharding.reserve_user_ids().
+
+    Lives on ``default`` only, so every shard draws from the same counter.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class UsernameClaim(models.Model):
+    """
+    Makes usernames unique across user shards.
+
+    Each shard only enforces uniqueness of its own rows; User.save()
+    inserts or renames the user's claim on ``default`` first, so two users
+    on different shards cannot end up with the same username. Only written
+    while sharding is enabled, and not released when a user is deleted
+    (accounts are deactivated instead).
+    """
+    username = models.CharField(max_length=150, unique=True)
+    user_id = models.BigIntegerField()
+
+    def __str__(self):
+        return self.username
+
+
+class AadhaarAccessLog(models.Model):
+    """
+    Audit record of every time a user's Aadhaar was revealed in plaintext,
+    to the user or to an internal service.
+
+    Rows are written in batches by users.audit, so ``accessed_at`` is the
+    time of access, not of the insert. The user link has no database
+    constraint: audit history must outlive the account and inserts should
+    not pay for FK checks.
+    """
+    EVENT_REVEAL = 'reveal'
+    EVENT_SERVICE_LOOKUP = 'service_lookup'
+    EVENT_CHOICES = [
+        (EVENT_REVEAL, 'Reveal'),
+        (EVENT_SERVICE_LOOKUP, 'Service lookup'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    event = models.CharField(max_length=16, choices=EVENT_CHOICES, default=EVENT_REVEAL)
+    # Internal service that read the number; blank when users reveal their own
+    service = models.CharField(max_length=64, blank=True, default='')
+    accessed_at = models.DateTimeField()
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'accessed_at'], name='aadhaar_log_user_time_idx'),
+            models.Index(fields=['accessed_at'], name='aadhaar_log_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.user_id} at {self.accessed_at:%Y-%m-%d %H:%M:%S}"
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work, persisted so it survives restarts.
+
+    Jobs are executed by ``python manage.py run_jobs`` (see users/jobs.py).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for due pending jobs and stale running ones
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
@@ -0,0 +1,94 @@
+"""
+Refresh grace window: single-flight rotation of family refresh tokens.
+
+A browser that sends several requests with an expired access token used
+to refresh once per request. The first refresh rotated the family; every
+other one presented the now-previous generation, which looks like a replay
+and revoked the family, logging the user out.
+
+Within ``REFRESH_GRACE['SECONDS']`` of a rotation, presenting the same
+refresh token again returns the same rotated pair:
+
+  - in the same worker, refreshes of one family are serialized by a lock
+    and the pair is kept in a bounded in-process cache keyed by
+    (family, generation), so a duplicate costs one SELECT checking that
+    the family has not been revoked since;
+  - in another worker, FamilyRefreshToken.rotate() sees that the family
+    moved to the next generation moments ago and mints an equivalent token
+    for that generation instead of revoking (one SELECT, no write).
+
+Replays after the window still revoke the family.
+"""
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+
+from .cache import BoundedTTLCache
+from .tokens import FAMILY_CLAIM, GENERATION_CLAIM
+
+
+# Families share a fixed set of locks, so memory does not grow with them
+LOCK_STRIPES = 64
+_family_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        config = settings.REFRESH_GRACE
+        _store = BoundedTTLCache(max_entries=config['MAX_ENTRIES'], ttl=config['SECONDS'])
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(*, setting, **kwargs):
+    global _store
+    if setting == 'REFRESH_GRACE':
+        _store = None
+
+
+def _token_pair(token):
+    return {
+        'access': str(token.access_token),
+        'refresh': str(token),
+    }
+
+
+def rotate_with_grace(refresh):
+    """
+    Rotate a family refresh token, absorbing duplicates within the grace window.
+
+    Args:
+        refresh (FamilyRefreshToken): Verified token from the client
+
+    Returns:
+        dict: ``access`` and ``refresh`` of the rotated pair
+
+    Raises:
+        TokenError: If the family is revoked or the token was replayed
+            after the grace window
+    """
+    if not settings.REFRESH_GRACE['SECONDS']:
+        return _token_pair(refresh.rotate())
+
+    family_id = refresh.payload[FAMILY_CLAIM]
+    key = (family_id, refresh.payload[GENERATION_CLAIM])
+    store = get_store()
+
+    with _family_locks[hash(family_id) % LOCK_STRIPES]:
+        pair = store.get(key)
+        if pair is None:
+            pair = _token_pair(refresh.rotate())
+            store.set(key, pair)
+        elif not refresh.family_is_active():
+            # Logged out, deactivated or revoked for a replay since the
+            # pair was cached (possibly by another worker)
+            store.pop(key)
+            raise TokenError(_('Token is blacklisted'))
+    return pair
@@ -1,8 +1,41 @@
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db import IntegrityError
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueValidator, qs_exists
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 
-from .models import User
+from .audit import record_aadhaar_access
+from .lookup import DEFAULT_LOOKUP_FIELDS, LOOKUP_FIELDS
+from .models import User, UsernameTaken
+from .refresh_grace import rotate_with_grace
+from .sharding import shard_aliases, shard_for_email
+from .tokens import FamilyRefreshToken
+
+
+class ShardedUniqueValidator(UniqueValidator):
+    """
+    UniqueValidator for sharded users.
+
+    Emails are checked on the shard they hash to; other values (usernames)
+    can live on any shard, so ``across_shards`` checks every shard.
+    """
+
+    def __init__(self, queryset, across_shards=False, **kwargs):
+        super().__init__(queryset, **kwargs)
+        self.across_shards = across_shards
+
+    def __call__(self, value, serializer_field):
+        field_name = serializer_field.source_attrs[-1]
+        instance = getattr(serializer_field.parent, "instance", None)
+        aliases = shard_aliases() if self.across_shards else [shard_for_email(value)]
+
+        for alias in aliases:
+            queryset = self.filter_queryset(value, self.queryset.using(alias), field_name)
+            queryset = self.exclude_current_instance(queryset, instance)
+            if qs_exists(queryset):
+                raise serializers.ValidationError(self.message, code="unique")
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -55,6 +88,20 @@ class RegisterSerializer(serializers.ModelSerializer):
             "date_of_birth",
             "address",
         ]
+        extra_kwargs = {
+            "email": {"validators": [ShardedUniqueValidator(
+                User.objects.all(),
+                message="user with this email already exists.",
+            )]},
+            "username": {"validators": [
+                User.username_validator,
+                ShardedUniqueValidator(
+                    User.objects.all(),
+                    across_shards=True,
+                    message=User._meta.get_field("username").error_messages["unique"],
+                ),
+            ]},
+        }
 
     def create(self, validated_data):
         aadhaar = validated_data.pop("aadhaar", None)
@@ -66,7 +113,20 @@ class RegisterSerializer(serializers.ModelSerializer):
         if aadhaar:
             user.set_aadhaar(aadhaar)
 
-        user.save()
+        # The unique validators only check before the insert; a concurrent
+        # sign-up can still win the race, which must be a 400, not a 500
+        try:
+            user.save()
+        except UsernameTaken:
+            raise serializers.ValidationError(
+                {"username": [User._meta.get_field("username").error_messages["unique"]]},
+                code="unique",
+            )
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["A user with this email or username already exists."]},
+                code="unique",
+            )
         return user
 
 
@@ -95,29 +155,134 @@ class LoginSerializer(serializers.Serializer):
         if not user.is_active:
             raise serializers.ValidationError("User account is disabled")
 
-        refresh = RefreshToken.for_user(user)
+        refresh = FamilyRefreshToken.for_user(user)
 
         return {
             "user": UserSerializer(user).data,
             "access": str(refresh.access_token),
             "refresh": str(refresh),
         }
+
+
+class FamilyTokenRefreshSerializer(serializers.Serializer):
+    """
+    Rotates a refresh token within its family.
+    Returns a new access + refresh pair; duplicates within the refresh
+    grace window get the same pair.
+    """
+
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = FamilyRefreshToken(attrs["refresh"])
+
+        if not refresh.is_family_token:
+            # Issued before refresh families: rotate and blacklist as before
+            return TokenRefreshSerializer(context=self.context).validate(attrs)
+
+        return rotate_with_grace(refresh)
+
+
+class TokenIntrospectionSerializer(serializers.Serializer):
+    """
+    Batch of encoded tokens to introspect.
+    """
+
+    tokens = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+
+    def validate_tokens(self, tokens):
+        max_batch = settings.TOKEN_INTROSPECTION["MAX_BATCH"]
+        if len(tokens) > max_batch:
+            raise serializers.ValidationError(
+                f"At most {max_batch} tokens can be introspected per request"
+            )
+        return tokens
+
+
+class UserBatchLookupSerializer(serializers.Serializer):
+    """
+    Batch of user ids or emails to resolve, and what to return for each.
+    """
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    emails = serializers.ListField(child=serializers.EmailField(), required=False, allow_empty=False)
+    fields = serializers.ListField(
+        child=serializers.ChoiceField(choices=LOOKUP_FIELDS),
+        required=False,
+        allow_empty=False,
+        default=list(DEFAULT_LOOKUP_FIELDS),
+    )
+    include_aadhaar = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('emails' in attrs):
+            raise serializers.ValidationError("Provide exactly one of 'ids' or 'emails'")
+
+        key_field = 'id' if 'ids' in attrs else 'email'
+        keys = attrs.pop('ids', None) or attrs.pop('emails')
+        max_batch = settings.USER_BATCH_LOOKUP["MAX_BATCH"]
+        if len(keys) > max_batch:
+            raise serializers.ValidationError(
+                f"At most {max_batch} users can be looked up per request"
+            )
+
+        attrs['key_field'] = key_field
+        attrs['keys'] = keys
+        attrs['fields'] = list(dict.fromkeys(attrs['fields']))
+        return attrs
+
+
+class UserChangeFeedSerializer(serializers.Serializer):
+    """
+    Query parameters of the user change feed.
+    """
+
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_limit(self, limit):
+        max_page_size = settings.CHANGE_FEED["MAX_PAGE_SIZE"]
+        if limit > max_page_size:
+            raise serializers.ValidationError(
+                f"At most {max_page_size} changes can be read per page"
+            )
+        return limit
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for Profile View.
-    Explicitly handles the decryption of Aadhaar for the response.
+
+    Aadhaar is shown masked, from a precomputed column, so rendering a
+    profile does no crypto work. The full number is only returned by the
+    reveal endpoint, or here when PROFILE_AADHAAR_MODE is 'plaintext'.
     """
     aadhaar = serializers.SerializerMethodField()
+    aadhaar_masked = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = [
             "id", "email", "username", "first_name", "last_name",
             "phone_number", "date_of_birth", "address", 
-            "aadhaar" # <--- Including our custom field
+            "aadhaar", "aadhaar_masked",
         ]
         read_only_fields = ["email", "username"]
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if settings.PROFILE_AADHAAR_MODE != "plaintext":
+            del fields["aadhaar"]
+        return fields
+
     def get_aadhaar(self, obj):
         # This calls the decryption method from your User model
-        return obj.get_aadhaar()
\ No newline at end of file
+        aadhaar = obj.get_aadhaar()
+        if aadhaar is not None:
+            # Queued for a batched write, never an INSERT on this request
+            record_aadhaar_access(obj, self.context.get("request"))
+        return aadhaar
+
+    def get_aadhaar_masked(self, obj):
+        return obj.get_aadhaar_masked()
@@ -0,0 +1,221 @@
+"""
+Horizontal sharding of users by email hash.
+
+Every user belongs to one of ``BUCKET_COUNT`` buckets, derived from a hash
+of the normalized email. ``settings.USER_SHARDS`` maps buckets to database
+aliases: by default the buckets are split into contiguous ranges over
+``ALIASES``, and ``BUCKET_MAP`` overrides single buckets (see the
+rebalance_shards command).
+
+User ids encode their bucket, so a lookup by id (JWT authentication,
+jobs, sessions) finds the shard without a directory query:
+
+    bit 52       set for sharded ids
+    bits 10-51   sequence number
+    bits 0-9     bucket
+
+Sequence numbers come from one IdSequence row on ``default``. Each process
+reserves a block of ID_BLOCK_SIZE numbers with a single UPDATE and hands
+them out locally, so ids are unique across workers and hosts without a
+query per registration. (The first sharded ids used milliseconds since
+SHARD_EPOCH_MS for bits 12-51; the sequence starts above every value that
+layout could have produced, see initial_sequence_value().)
+
+Ids stay below 2**53 so JavaScript clients can hold them as numbers. Ids
+without bit 52 were issued before sharding and live on ``default``.
+
+A user's token families and group memberships live on the user's shard.
+Usernames are unique across shards through UsernameClaim rows on
+``default``. Queries that cannot be attributed to a user go through the
+other routers.
+With ``ALIASES`` empty, sharding is off and nothing here changes routing.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+
+
+BUCKET_BITS = 10
+BUCKET_COUNT = 1 << BUCKET_BITS
+SHARDED_ID_FLAG = 1 << 52
+# 2024-01-01T00:00:00Z, epoch of the original time-based ids
+SHARD_EPOCH_MS = 1704067200000
+# Per-millisecond counter bits of the time-based ids
+LEGACY_SEQUENCE_BITS = 2
+
+USER_ID_SEQUENCE = 'user_id'
+ID_BLOCK_SIZE = 100
+
+_id_lock = threading.Lock()
+_id_block = iter(())
+
+
+def sharding_enabled():
+    return bool(settings.USER_SHARDS['ALIASES'])
+
+
+def shard_aliases():
+    """
+    Return the distinct shard aliases, or ``[None]`` when sharding is off.
+
+    ``None`` means "let the routers decide", so callers can loop over the
+    result and pass each entry to ``using()`` either way.
+    """
+    aliases = list(dict.fromkeys(settings.USER_SHARDS['ALIASES']))
+    aliases.extend(
+        alias for alias in dict.fromkeys(settings.USER_SHARDS['BUCKET_MAP'].values())
+        if alias not in aliases
+    )
+    return aliases or [None]
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def bucket_for_email(email):
+    digest = hashlib.sha256(normalize_email(email).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % BUCKET_COUNT
+
+
+def bucket_for_user_id(user_id):
+    """
+    Return the bucket encoded in ``user_id``, or None for pre-sharding ids.
+    """
+    user_id = int(user_id)
+    if not user_id & SHARDED_ID_FLAG:
+        return None
+    return user_id & (BUCKET_COUNT - 1)
+
+
+def initial_sequence_value(now_ms=None):
+    """
+    First sequence number to hand out: above anything the time-based layout
+    issued until a day after ``now_ms`` (clock skew and borrowed milliseconds).
+    """
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    return (now_ms - SHARD_EPOCH_MS + 24 * 3600 * 1000) << LEGACY_SEQUENCE_BITS
+
+
+def reserve_user_ids(count):
+    """
+    Reserve ``count`` consecutive sequence numbers for this caller.
+
+    Returns:
+        range: Sequence numbers nobody else will receive; turn them into
+        ids with user_id_for()
+    """
+    from .models import IdSequence
+
+    sequences = IdSequence.objects.using(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        # The UPDATE locks the row until commit, so the read below is ours
+        if not sequences.filter(name=USER_ID_SEQUENCE).update(next_value=F('next_value') + count):
+            sequences.create(name=USER_ID_SEQUENCE, next_value=initial_sequence_value() + count)
+        end = sequences.get(name=USER_ID_SEQUENCE).next_value
+    return range(end - count, end)
+
+
+def user_id_for(sequence, bucket):
+    return SHARDED_ID_FLAG | sequence << BUCKET_BITS | bucket
+
+
+def make_user_id(bucket):
+    """
+    Generate a new user id in ``bucket``.
+    """
+    global _id_block
+    with _id_lock:
+        sequence = next(_id_block, None)
+        if sequence is None:
+            block = iter(reserve_user_ids(ID_BLOCK_SIZE))
+            sequence = next(block)
+            if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+                # A rollback would give the block back to the sequence, and
+                # to another process: only keep it once the reservation commits
+                transaction.on_commit(lambda: _keep_id_block(block), using=DEFAULT_DB_ALIAS)
+            else:
+                _id_block = block
+    return user_id_for(sequence, bucket)
+
+
+def _keep_id_block(block):
+    global _id_block
+    with _id_lock:
+        _id_block = block
+
+
+def _discard_id_block():
+    # A forked worker must not hand out the numbers its parent reserved
+    global _id_block
+    _id_block = iter(())
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_discard_id_block)
+
+
+def alias_for_bucket(bucket):
+    config = settings.USER_SHARDS
+    if bucket in config['BUCKET_MAP']:
+        return config['BUCKET_MAP'][bucket]
+    aliases = config['ALIASES']
+    return aliases[bucket * len(aliases) // BUCKET_COUNT]
+
+
+def shard_for_email(email):
+    """
+    Return the alias holding the user with ``email``, or None when sharding is off.
+    """
+    if not sharding_enabled():
+        return None
+    return alias_for_bucket(bucket_for_email(email))
+
+
+def shard_for_user_id(user_id):
+    """
+    Return the alias holding the user with ``user_id``, or None when sharding is off.
+    """
+    if not sharding_enabled() or user_id is None:
+        return None
+    bucket = bucket_for_user_id(user_id)
+    if bucket is None:
+        return DEFAULT_DB_ALIAS
+    return alias_for_bucket(bucket)
+
+
+class UserShardRouter:
+    """
+    Routes users, and rows owned by a user, to the user's shard.
+
+    Goes first in DATABASE_ROUTERS; returns None for anything it cannot
+    attribute so the next router decides.
+    """
+    user_owned_models = {'users.tokenfamily', 'users.user_groups', 'users.user_user_permissions'}
+
+    def _shard(self, model, hints):
+        if not sharding_enabled():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+
+        if instance._meta.label_lower == settings.AUTH_USER_MODEL.lower():
+            if instance.pk is not None:
+                return shard_for_user_id(instance.pk)
+            return shard_for_email(instance.email)
+        if instance._meta.label_lower in self.user_owned_models:
+            return shard_for_user_id(instance.user_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
@@ -0,0 +1,199 @@
+"""
+Asymmetric JWT signing with key IDs and a published JWKS.
+
+Keys are configured in ``settings.JWT_SIGNING_KEYS``. The first entry signs
+new tokens; every entry verifies, which is what makes rollover possible:
+
+1. Add the new key as the *second* entry. It is published in the JWKS
+   but signs nothing yet.
+2. Once downstream JWKS caches have expired, move it to the front.
+3. Drop the old key after the longest token lifetime has passed.
+
+With no keys configured, tokens are signed with SIMPLE_JWT's HS256
+``SIGNING_KEY`` as before. Tokens without a ``kid`` header are verified
+that way, so tokens issued before the switch stay valid, until
+``JWT_ACCEPT_LEGACY_TOKENS`` is turned off. Do that once the longest
+refresh lifetime has passed since the first key started signing: from
+then on, a leaked SECRET_KEY can no longer mint accepted tokens.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import get_default_algorithms
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+
+ASYMMETRIC_ALGORITHMS = {
+    'RS256', 'RS384', 'RS512',
+    'ES256', 'ES384', 'ES512',
+    'EdDSA',
+}
+
+
+class SigningKey:
+    """
+    One entry of JWT_SIGNING_KEYS, with its key material parsed once.
+    """
+
+    def __init__(self, kid, algorithm, private_key=None, public_key=None):
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ImproperlyConfigured(
+                f"JWT signing key '{kid}' uses unsupported algorithm '{algorithm}'"
+            )
+        if not (private_key or public_key):
+            raise ImproperlyConfigured(f"JWT signing key '{kid}' has no key material")
+
+        self.kid = kid
+        self.algorithm = algorithm
+        self._algorithm = get_default_algorithms()[algorithm]
+
+        self.private_key = self._algorithm.prepare_key(private_key) if private_key else None
+        if public_key:
+            self.public_key = self._algorithm.prepare_key(public_key)
+        else:
+            self.public_key = self.private_key.public_key()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a key from a settings dict, reading ``*_path`` entries from disk.
+        """
+        material = {}
+        for name in ('private_key', 'public_key'):
+            if config.get(name):
+                material[name] = config[name]
+            elif config.get(f'{name}_path'):
+                with open(config[f'{name}_path'], 'rb') as handle:
+                    material[name] = handle.read()
+        return cls(config['kid'], config['algorithm'], **material)
+
+    def to_jwk(self):
+        """
+        Return the public half of this key as a JWK dict.
+        """
+        jwk = self._algorithm.to_jwk(self.public_key, as_dict=True)
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """
+    SimpleJWT backend that signs with the active key ring entry and
+    verifies by the token's ``kid`` header.
+
+    Tokens without a ``kid`` go through the regular SIMPLE_JWT
+    configuration (HS256 with SIGNING_KEY by default), unless
+    ``accept_legacy`` is off and a key ring is configured.
+    """
+
+    def __init__(self, keys, accept_legacy=True, **kwargs):
+        super().__init__(**kwargs)
+        self.keys = {key.kid: key for key in keys}
+        self.active_key = keys[0] if keys else None
+        # Without a key ring, HS256 is the only way tokens are signed
+        self.accept_legacy = accept_legacy or self.active_key is None
+
+        if self.active_key is not None and self.active_key.private_key is None:
+            raise ImproperlyConfigured(
+                f"Active JWT signing key '{self.active_key.kid}' has no private key"
+            )
+
+    def encode(self, payload):
+        if self.active_key is None:
+            return super().encode(payload)
+
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+
+        return jwt.encode(
+            jwt_payload,
+            self.active_key.private_key,
+            algorithm=self.active_key.algorithm,
+            headers={'kid': self.active_key.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+
+        if kid is None:
+            if not self.accept_legacy:
+                raise TokenBackendError(_('Token is invalid or expired'))
+            return super().decode(token, verify=verify)
+
+        key = self.keys.get(kid)
+        if key is None:
+            raise TokenBackendError(_('Token is invalid or expired'))
+
+        try:
+            return jwt.decode(
+                token,
+                key.public_key,
+                algorithms=[key.algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    'verify_aud': self.audience is not None,
+                    'verify_signature': verify,
+                },
+            )
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+
+
+@lru_cache(maxsize=None)
+def get_token_backend():
+    """
+    Return the process-wide KeyRingTokenBackend built from settings.
+    """
+    keys = [SigningKey.from_config(config) for config in getattr(settings, 'JWT_SIGNING_KEYS', [])]
+    return KeyRingTokenBackend(
+        keys,
+        accept_legacy=getattr(settings, 'JWT_ACCEPT_LEGACY_TOKENS', True),
+        algorithm=api_settings.ALGORITHM,
+        signing_key=api_settings.SIGNING_KEY,
+        verifying_key=api_settings.VERIFYING_KEY,
+        audience=api_settings.AUDIENCE,
+        issuer=api_settings.ISSUER,
+        leeway=api_settings.LEEWAY,
+        json_encoder=api_settings.JSON_ENCODER,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_jwks_document():
+    """
+    Return the serialized JWKS and its ETag, computed once per key ring.
+
+    Returns:
+        tuple: (bytes body, str etag)
+    """
+    backend = get_token_backend()
+    body = json.dumps(
+        {'keys': [key.to_jwk() for key in backend.keys.values()]},
+        separators=(',', ':'),
+    ).encode('utf-8')
+    return body, '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+@receiver(setting_changed)
+def reset_key_ring(*, setting, **kwargs):
+    if setting in ('JWT_SIGNING_KEYS', 'JWT_ACCEPT_LEGACY_TOKENS', 'SIMPLE_JWT'):
+        get_token_backend.cache_clear()
+        get_jwks_document.cache_clear()
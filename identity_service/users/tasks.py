@@ -0,0 +1,44 @@
+"""
+Background jobs for the users app.
+
+Imported by UsersConfig.ready() so that every worker knows these names.
+"""
+import logging
+
+from django.core.mail import send_mail
+
+from .jobs import job
+from .models import User
+from .sharding import shard_for_user_id
+
+
+logger = logging.getLogger(__name__)
+
+
+@job('users.send_welcome_email')
+def send_welcome_email(user_id):
+    """
+    Send the welcome email to a newly registered user.
+    """
+    user = (
+        User.objects.using(shard_for_user_id(user_id))
+        .only('email', 'first_name', 'last_name', 'username')
+        .get(pk=user_id)
+    )
+    send_mail(
+        subject='Welcome to Identity Service',
+        message=f"Hi {user.get_full_name()},\n\nYour account has been created.",
+        from_email=None,
+        recipient_list=[user.email],
+    )
+
+
+@job('users.track_registration')
+def track_registration(user_id, has_aadhaar):
+    """
+    Emit the registration analytics event.
+    """
+    logger.info(
+        "user_registered",
+        extra={'user_id': user_id, 'has_aadhaar': has_aadhaar},
+    )
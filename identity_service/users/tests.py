@@ -2,10 +2,78 @@
 Comprehensive unit tests for encryption/decryption logic
 Tests AES-256 encryption functionality and edge cases
 """
+import hashlib
+import io
+import json
+import threading
+import time
 import unittest
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .utils import EncryptionHelper
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from identity_service.admission import (
+    SHED_QUEUE_FULL,
+    SHED_TIMEOUT,
+    ConcurrencyLimiter,
+    get_limiters,
+    reset_limiters,
+)
+from identity_service.db_routers import (
+    PrimaryReplicaRouter,
+    ReplicaRoutingMiddleware,
+    has_recent_write,
+    mark_recent_write,
+)
+from identity_service.testing.query_budget import (
+    QUERY_BUDGETS,
+    QueryBudgetMixin,
+    iter_url_names,
+    report_mode,
+)
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import refresh_grace, warmup
+from .audit import AuditLogBuffer, get_audit_log
+from .cache import BoundedTTLCache
+from .changes import fetch_changes
+from .idempotency import get_store, idempotent
+from .jobs import Worker, enqueue, enqueue_many, job
+from .models import AadhaarAccessLog, Job, TokenFamily, UsernameClaim, UsernameTaken
+from .sharding import (
+    BUCKET_BITS,
+    BUCKET_COUNT,
+    ID_BLOCK_SIZE,
+    LEGACY_SEQUENCE_BITS,
+    SHARD_EPOCH_MS,
+    alias_for_bucket,
+    bucket_for_email,
+    bucket_for_user_id,
+    make_user_id,
+    reserve_user_ids,
+    shard_aliases,
+    shard_for_email,
+    shard_for_user_id,
+)
+from .tokens import FamilyRefreshToken
+from .utils import EncryptionHelper, aadhaar_blind_index
 import base64
 
 
@@ -207,9 +275,10 @@ class EncryptionHelperTestCase(TestCase):
         self.assertFalse(is_valid)
 
 
+@override_settings(AADHAAR_STORAGE_FORMAT='cbc')
 class UserModelEncryptionTestCase(TestCase):
     """
-    Test suite for User model encryption methods.
+    Test suite for User model encryption methods (legacy CBC storage).
     """
     
     def setUp(self):
@@ -281,4 +350,1876 @@ class UserModelEncryptionTestCase(TestCase):
             is_base64 = True
         except Exception:
             is_base64 = False
-        self.assertTrue(is_base64)
\ No newline at end of file
+        self.assertTrue(is_base64)
+
+class AeadStorageTestCase(TestCase):
+    """
+    Test suite for the binary AES-GCM storage format.
+    """
+
+    def setUp(self):
+        self.encryptor = EncryptionHelper()
+        self.test_aadhaar = "123456789012"
+        self.user = User.objects.create_user(
+            username='aead',
+            email='aead@example.com',
+            password='testpass123'
+        )
+
+    def test_binary_roundtrip_with_format_header(self):
+        encrypted = self.encryptor.encrypt_bytes(self.test_aadhaar)
+        self.assertIsInstance(encrypted, bytes)
+        self.assertEqual(encrypted[0], 0x01)
+        self.assertEqual(self.encryptor.decrypt_bytes(encrypted), self.test_aadhaar)
+
+    def test_binary_format_is_smaller_than_legacy_text(self):
+        binary = self.encryptor.encrypt_bytes(self.test_aadhaar)
+        legacy = self.encryptor.encrypt(self.test_aadhaar)
+        self.assertLess(len(binary), len(legacy))
+
+    def test_tampering_is_detected(self):
+        encrypted = bytearray(self.encryptor.encrypt_bytes(self.test_aadhaar))
+        encrypted[-1] ^= 0x01
+        with self.assertRaises(ValueError):
+            self.encryptor.decrypt_bytes(bytes(encrypted))
+
+    def test_unknown_format_header_is_rejected(self):
+        encrypted = bytearray(self.encryptor.encrypt_bytes(self.test_aadhaar))
+        encrypted[0] = 0x7f
+        with self.assertRaises(ValueError):
+            self.encryptor.decrypt_bytes(bytes(encrypted))
+
+    def test_set_aadhaar_stores_binary_and_reads_back(self):
+        self.user.set_aadhaar(self.test_aadhaar)
+        self.user.save()
+
+        user_from_db = User.objects.get(id=self.user.id)
+        self.assertIsNone(user_from_db.encrypted_aadhaar)
+        self.assertNotIn(self.test_aadhaar.encode(), bytes(user_from_db.aadhaar_ciphertext))
+        self.assertEqual(user_from_db.get_aadhaar(), self.test_aadhaar)
+
+    def test_legacy_rows_stay_readable_and_migrate(self):
+        User.objects.filter(pk=self.user.pk).update(
+            encrypted_aadhaar=self.encryptor.encrypt(self.test_aadhaar)
+        )
+        self.assertEqual(User.objects.get(pk=self.user.pk).get_aadhaar(), self.test_aadhaar)
+
+        call_command('migrate_aadhaar_storage', batch_size=1, stdout=io.StringIO())
+
+        migrated = User.objects.get(pk=self.user.pk)
+        self.assertIsNone(migrated.encrypted_aadhaar)
+        self.assertEqual(bytes(migrated.aadhaar_ciphertext)[0], 0x01)
+        self.assertEqual(migrated.get_aadhaar(), self.test_aadhaar)
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """
+    Test suite that keeps every users API endpoint within its query budget.
+    """
+
+    def setUp(self):
+        """
+        Set up an API client and a registered user.
+        """
+        self.client = APIClient()
+        self.password = 'Str0ng-pass!9'
+        self.user = User.objects.create_user(
+            username='budget',
+            email='budget@example.com',
+            password=self.password,
+            first_name='Budget',
+            last_name='User'
+        )
+
+    def login(self):
+        """
+        Log in through the API and authenticate the client.
+        """
+        response = self.client.post(reverse('users:login'), {
+            'email': self.user.email,
+            'password': self.password,
+        }, format='json')
+        tokens = response.data['tokens']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        return tokens
+
+    def test_every_url_has_a_budget(self):
+        """
+        Test that no users endpoint is left without a declared budget.
+        """
+        for url_name in iter_url_names():
+            self.assertIn(url_name, QUERY_BUDGETS)
+
+    def test_register_budget(self):
+        with self.assertQueryBudget('users:register', 'POST'):
+            response = self.client.post(reverse('users:register'), {
+                'email': 'new@example.com',
+                'username': 'newuser',
+                'first_name': 'New',
+                'last_name': 'User',
+                'password': self.password,
+                'aadhaar': '123456789012',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_login_budget(self):
+        with self.assertQueryBudget('users:login', 'POST'):
+            tokens = self.login()
+        self.assertIn('access', tokens)
+
+    def test_profile_budgets(self):
+        self.login()
+        with self.assertQueryBudget('users:profile', 'GET'):
+            response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertQueryBudget('users:profile', 'PATCH'):
+            response = self.client.patch(reverse('users:profile'), {
+                'address': 'Pune'
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertQueryBudget('users:profile', 'PUT'):
+            response = self.client.put(reverse('users:profile'), {
+                'first_name': 'Budget',
+                'last_name': 'Updated'
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_and_logout_budgets(self):
+        tokens = self.login()
+        with self.assertQueryBudget('users:token_refresh', 'POST'):
+            response = self.client.post(reverse('users:token_refresh'), {
+                'refresh': tokens['refresh']
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertQueryBudget('users:logout', 'POST'):
+            response = self.client.post(reverse('users:logout'), {
+                'refresh_token': response.data['refresh']
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    @unittest.skipIf(report_mode(), 'budgets are not enforced in report mode')
+    @mock.patch.dict(QUERY_BUDGETS, {'tests:over_budget': {'GET': 1}})
+    def test_exceeding_budget_reports_query_diff(self):
+        """
+        Test that an over-budget block fails with the offending SQL marked.
+        """
+        with self.assertRaises(AssertionError) as ctx:
+            with self.assertQueryBudget('tests:over_budget', 'GET'):
+                list(User.objects.all())
+                list(User.objects.filter(is_active=True))
+        message = str(ctx.exception)
+        self.assertIn('ran 2 queries, budget is 1', message)
+        self.assertIn('+ 2. SELECT', message)
+
+
+class ApiSettingsProfileTestCase(TestCase):
+    """
+    Test suite for the API-only settings profile.
+    """
+
+    def test_api_profile_drops_stateful_apps_and_middleware(self):
+        from identity_service import settings_api
+
+        for app in settings_api.API_EXCLUDED_APPS:
+            self.assertNotIn(app, settings_api.INSTALLED_APPS)
+        for middleware in settings_api.API_EXCLUDED_MIDDLEWARE:
+            self.assertNotIn(middleware, settings_api.MIDDLEWARE)
+        self.assertIn('users', settings_api.INSTALLED_APPS)
+        self.assertIn('corsheaders.middleware.CorsMiddleware', settings_api.MIDDLEWARE)
+
+
+class TokenFamilyTestCase(TestCase):
+    """
+    Test suite for refresh-token family rotation and revocation.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='family',
+            email='family@example.com',
+            password='Str0ng-pass!9'
+        )
+        self.refresh_url = reverse('users:token_refresh')
+
+    def refresh(self, token):
+        return self.client.post(self.refresh_url, {'refresh': token}, format='json')
+
+    def test_login_creates_one_family(self):
+        token = FamilyRefreshToken.for_user(self.user)
+        family = TokenFamily.objects.get(user=self.user)
+        self.assertEqual(token['fam'], str(family.pk))
+        self.assertEqual(token['gen'], 0)
+        self.assertEqual(token.access_token['fam'], str(family.pk))
+        self.assertNotIn('gen', token.access_token)
+
+    def test_rotation_advances_generation_without_new_rows(self):
+        token = str(FamilyRefreshToken.for_user(self.user))
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        response = self.refresh(response.data['refresh'])
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(TokenFamily.objects.count(), 1)
+        self.assertEqual(TokenFamily.objects.get().generation, 2)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_rotated_tokens_are_issued_now(self):
+        token = FamilyRefreshToken.for_user(self.user)
+        token.set_iat(at_time=token.current_time - timedelta(days=1))
+
+        # The winning rotation, then a duplicate served by the grace window
+        for rotated in (token.rotate(), token.rotate()):
+            self.assertGreater(rotated['iat'], token['iat'])
+            self.assertEqual(rotated.access_token['iat'], rotated['iat'])
+
+    def test_replayed_generation_revokes_family(self):
+        first = str(FamilyRefreshToken.for_user(self.user))
+        second = self.refresh(first).data['refresh']
+
+        # Replay once the grace window has passed
+        refresh_grace.get_store().clear()
+        TokenFamily.objects.update(last_refreshed_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.refresh(first).status_code, 401)
+        self.assertTrue(TokenFamily.objects.get().is_revoked)
+        # The legitimate holder is logged out as well
+        self.assertEqual(self.refresh(second).status_code, 401)
+
+    def test_logout_revokes_family(self):
+        refresh = FamilyRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        response = self.client.post(reverse('users:logout'), {
+            'refresh_token': str(refresh)
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(str(refresh)).status_code, 401)
+
+    def test_duplicate_within_grace_gets_the_same_pair(self):
+        token = str(FamilyRefreshToken.for_user(self.user))
+        first = self.refresh(token)
+        # Only the check that the family is still live
+        with self.assertNumQueries(1):
+            duplicate = self.refresh(token)
+
+        self.assertEqual(duplicate.status_code, 200)
+        self.assertEqual(duplicate.data, first.data)
+        family = TokenFamily.objects.get()
+        self.assertEqual((family.generation, family.is_revoked), (1, False))
+
+    def test_grace_window_does_not_outlive_logout(self):
+        token = str(FamilyRefreshToken.for_user(self.user))
+        rotated = self.refresh(token).data['refresh']
+
+        access = FamilyRefreshToken(rotated).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        logout = self.client.post(reverse('users:logout'), {'refresh_token': rotated}, format='json')
+        self.assertEqual(logout.status_code, 200)
+        self.client.credentials()
+
+        # Same worker, inside the grace window: the cached pair is not served
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('access', response.data)
+
+    def test_duplicate_on_another_worker_is_not_a_replay(self):
+        token = str(FamilyRefreshToken.for_user(self.user))
+        self.refresh(token)
+        # Another worker has no cached pair and loses the UPDATE
+        refresh_grace.get_store().clear()
+        response = self.refresh(token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FamilyRefreshToken(response.data['refresh'])['gen'], 1)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+        self.assertFalse(TokenFamily.objects.get().is_revoked)
+
+    @override_settings(REFRESH_GRACE={'SECONDS': 0, 'MAX_ENTRIES': 10})
+    def test_grace_window_can_be_disabled(self):
+        token = str(FamilyRefreshToken.for_user(self.user))
+        self.refresh(token)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertTrue(TokenFamily.objects.get().is_revoked)
+
+    def test_legacy_refresh_token_is_still_accepted(self):
+        legacy = str(RefreshToken.for_user(self.user))
+        response = self.refresh(legacy)
+        self.assertEqual(response.status_code, 200)
+        # Rotation blacklists the legacy token exactly as before
+        self.assertEqual(self.refresh(legacy).status_code, 401)
+
+
+def generate_private_pem(algorithm):
+    """
+    Return a fresh PEM private key for ``algorithm`` ('EdDSA' or 'ES256').
+    """
+    if algorithm == 'EdDSA':
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode('ascii')
+
+
+def public_pem(private_pem):
+    key = serialization.load_pem_private_key(private_pem.encode(), password=None)
+    return key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode('ascii')
+
+
+class AsymmetricSigningTestCase(TestCase):
+    """
+    Test suite for key-ring signing, rollover and the JWKS endpoint.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='signer',
+            email='signer@example.com',
+            password='Str0ng-pass!9'
+        )
+        self.old_pem = generate_private_pem('ES256')
+        self.new_pem = generate_private_pem('EdDSA')
+        self.old_key = {'kid': 'old', 'algorithm': 'ES256', 'private_key': self.old_pem}
+        self.new_key = {'kid': 'new', 'algorithm': 'EdDSA', 'private_key': self.new_pem}
+
+    def get_profile(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get(reverse('users:profile'))
+
+    def test_tokens_carry_kid_and_authenticate(self):
+        with self.settings(JWT_SIGNING_KEYS=[self.new_key]):
+            refresh = FamilyRefreshToken.for_user(self.user)
+            access = str(refresh.access_token)
+            header = jwt.get_unverified_header(access)
+            self.assertEqual(header, {'alg': 'EdDSA', 'kid': 'new', 'typ': 'JWT'})
+            self.assertEqual(self.get_profile(access).status_code, 200)
+
+    def test_rollover_keeps_old_tokens_valid(self):
+        with self.settings(JWT_SIGNING_KEYS=[self.old_key]):
+            old_access = str(FamilyRefreshToken.for_user(self.user).access_token)
+
+        retired = {'kid': 'old', 'algorithm': 'ES256', 'public_key': public_pem(self.old_pem)}
+        with self.settings(JWT_SIGNING_KEYS=[self.new_key, retired]):
+            self.assertEqual(self.get_profile(old_access).status_code, 200)
+            new_access = str(FamilyRefreshToken.for_user(self.user).access_token)
+            self.assertEqual(jwt.get_unverified_header(new_access)['kid'], 'new')
+
+        with self.settings(JWT_SIGNING_KEYS=[self.new_key]):
+            self.assertEqual(self.get_profile(old_access).status_code, 401)
+
+    def test_hs256_tokens_without_kid_still_verify(self):
+        legacy_access = str(FamilyRefreshToken.for_user(self.user).access_token)
+        self.assertNotIn('kid', jwt.get_unverified_header(legacy_access))
+        with self.settings(JWT_SIGNING_KEYS=[self.new_key]):
+            self.assertEqual(self.get_profile(legacy_access).status_code, 200)
+
+        # Once every pre-key-ring token has expired, HS256 is switched off
+        with self.settings(JWT_SIGNING_KEYS=[self.new_key], JWT_ACCEPT_LEGACY_TOKENS=False):
+            self.assertEqual(self.get_profile(legacy_access).status_code, 401)
+            forged = jwt.encode(
+                {'token_type': 'access', 'user_id': self.user.pk, 'jti': 'x',
+                 'exp': int(time.time()) + 60},
+                settings.SIMPLE_JWT['SIGNING_KEY'], algorithm='HS256',
+            )
+            self.assertEqual(self.get_profile(forged).status_code, 401)
+        # ...which cannot happen while there is no key ring to replace it
+        with self.settings(JWT_ACCEPT_LEGACY_TOKENS=False):
+            self.assertEqual(self.get_profile(legacy_access).status_code, 200)
+
+    def test_jwks_endpoint_publishes_public_keys_with_cache_headers(self):
+        retired = {'kid': 'old', 'algorithm': 'ES256', 'public_key': public_pem(self.old_pem)}
+        with self.settings(JWT_SIGNING_KEYS=[self.new_key, retired]):
+            response = self.client.get('/.well-known/jwks.json')
+            self.assertEqual(response.status_code, 200)
+            keys = response.json()['keys']
+            self.assertEqual([key['kid'] for key in keys], ['new', 'old'])
+            self.assertEqual(keys[0]['kty'], 'OKP')
+            self.assertNotIn('d', keys[0])
+            self.assertIn('max-age=', response['Cache-Control'])
+
+            etag = response['ETag']
+            for if_none_match in (etag, f'W/{etag}', f'"stale", {etag}', '*'):
+                revalidated = self.client.get('/.well-known/jwks.json', HTTP_IF_NONE_MATCH=if_none_match)
+                self.assertEqual(revalidated.status_code, 304, if_none_match)
+            changed = self.client.get('/.well-known/jwks.json', HTTP_IF_NONE_MATCH='"stale"')
+            self.assertEqual(changed.status_code, 200)
+
+
+@override_settings(INTERNAL_SERVICE_TOKENS={'gateway': 'gateway-secret'})
+class TokenIntrospectionTestCase(QueryBudgetMixin, TestCase):
+    """
+    Test suite for the batch introspection endpoint.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Service gateway-secret')
+        self.user = User.objects.create_user(
+            username='introspect',
+            email='introspect@example.com',
+            password='Str0ng-pass!9'
+        )
+        self.url = reverse('users:introspect')
+
+    def introspect(self, tokens):
+        return self.client.post(self.url, {'tokens': tokens}, format='json')
+
+    def test_requires_service_token(self):
+        self.client.credentials()
+        self.assertEqual(self.introspect(['x']).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Service wrong')
+        self.assertEqual(self.introspect(['x']).status_code, 401)
+
+    def test_user_tokens_are_not_service_credentials(self):
+        access = FamilyRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertIn(self.introspect(['x']).status_code, (401, 403))
+
+    def test_batch_reports_status_per_token_in_one_query(self):
+        live = FamilyRefreshToken.for_user(self.user)
+        revoked = FamilyRefreshToken.for_user(self.user)
+        revoked.revoke()
+        rotated_from = FamilyRefreshToken.for_user(self.user)
+        rotated_from.rotate()
+
+        tokens = [
+            str(live.access_token),
+            str(live),
+            str(revoked.access_token),
+            str(rotated_from),
+            'not-a-jwt',
+        ]
+        with self.assertQueryBudget('users:introspect', 'POST'):
+            response = self.introspect(tokens)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['active'] for r in results], [True, True, False, False, False])
+        self.assertEqual(results[0]['user_id'], self.user.id)
+        self.assertEqual(results[0]['token_type'], 'access')
+        self.assertLessEqual(results[0]['cache_ttl'], settings.TOKEN_INTROSPECTION['CACHE_TTL'])
+        self.assertNotIn('user_id', results[2])
+
+    def test_user_id_has_the_same_type_whatever_the_token_holds(self):
+        # SimpleJWT 5.4+ encodes the claim as a string
+        access = FamilyRefreshToken.for_user(self.user).access_token
+        access['user_id'] = str(self.user.id)
+        result = self.introspect([str(access)]).data['results'][0]
+        self.assertTrue(result['active'])
+        self.assertEqual(result['user_id'], self.user.id)
+
+    def test_deactivated_user_tokens_are_inactive(self):
+        access = str(FamilyRefreshToken.for_user(self.user).access_token)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(self.introspect([access]).data['results'][0]['active'])
+
+    def test_batch_size_is_capped(self):
+        with self.settings(TOKEN_INTROSPECTION={'MAX_BATCH': 2, 'CACHE_TTL': 30}):
+            self.assertEqual(self.introspect(['a', 'b', 'c']).status_code, 400)
+
+
+class AuditLogBufferTestCase(TestCase):
+    """
+    Test suite for the buffered Aadhaar access audit log.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='audited',
+            email='audited@example.com',
+            password='Str0ng-pass!9'
+        )
+
+    def event(self):
+        return AadhaarAccessLog(user_id=self.user.pk, accessed_at=timezone.now())
+
+    def test_events_are_written_in_one_batch_on_flush(self):
+        buffer = AuditLogBuffer(flush_size=10, use_thread=False)
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                buffer.record(self.event())
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(AadhaarAccessLog.objects.filter(user=self.user).count(), 3)
+
+    def test_reaching_flush_size_writes_the_batch(self):
+        buffer = AuditLogBuffer(flush_size=2, use_thread=False)
+        buffer.record(self.event())
+        with self.assertNumQueries(1):
+            buffer.record(self.event())
+        self.assertEqual(buffer.written, 2)
+
+    def test_drop_policy_counts_overflow(self):
+        buffer = AuditLogBuffer(queue_size=1, flush_size=10, overflow='drop', use_thread=False)
+        buffer.record(self.event())
+        with self.assertNumQueries(0), self.assertLogs('users.audit', 'WARNING'):
+            buffer.record(self.event())
+        self.assertEqual(buffer.dropped, 1)
+
+    def test_sync_policy_writes_overflow_directly(self):
+        buffer = AuditLogBuffer(queue_size=1, flush_size=10, overflow='sync', use_thread=False)
+        buffer.record(self.event())
+        with self.assertNumQueries(1):
+            buffer.record(self.event())
+        self.assertEqual(buffer.dropped, 0)
+        self.assertEqual(AadhaarAccessLog.objects.count(), 1)
+
+    def test_failed_batches_are_retried_then_counted_as_lost(self):
+        buffer = AuditLogBuffer(flush_size=10, write_attempts=2, use_thread=False)
+        buffer.record(self.event())
+        failing = mock.patch.object(
+            AadhaarAccessLog.objects, 'bulk_create', side_effect=OperationalError('locked')
+        )
+        with failing, self.assertLogs('users.audit', 'ERROR'):
+            self.assertEqual(buffer.flush(), 1)
+        # Back on the queue for the next flush, which succeeds
+        self.assertEqual(buffer.queue.qsize(), 1)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(AadhaarAccessLog.objects.count(), 1)
+
+        buffer.record(self.event())
+        with failing, self.assertLogs('users.audit', 'ERROR'):
+            buffer.flush()
+            buffer.flush()
+        self.assertEqual((buffer.lost, buffer.queue.qsize()), (1, 0))
+
+    def test_process_buffer_is_flushed_at_exit_without_a_thread(self):
+        with mock.patch('users.audit.atexit') as atexit:
+            with override_settings(AADHAAR_AUDIT_LOG={**settings.AADHAAR_AUDIT_LOG, 'ASYNC': False}):
+                audit_log = get_audit_log()
+                atexit.register.assert_called_once_with(audit_log.shutdown)
+                audit_log.record(self.event())
+            # Replacing the buffer flushes it and drops the exit hook
+            atexit.unregister.assert_called_with(audit_log.shutdown)
+        self.assertEqual(AadhaarAccessLog.objects.filter(user=self.user).count(), 1)
+
+    def test_profile_reveal_is_audited_without_a_write(self):
+        self.user.set_aadhaar('123456789012')
+        self.user.save()
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {FamilyRefreshToken.for_user(self.user).access_token}'
+        )
+        audit_log = get_audit_log()
+        audit_log.flush()
+
+        with self.assertNumQueries(1):
+            response = client.get(reverse('users:aadhaar_reveal'))
+        self.assertEqual(response.data['aadhaar'], '123456789012')
+
+        audit_log.flush()
+        entry = AadhaarAccessLog.objects.get(user=self.user)
+        self.assertEqual(entry.event, AadhaarAccessLog.EVENT_REVEAL)
+        self.assertEqual(entry.service, '')
+        self.assertEqual(entry.ip_address, '127.0.0.1')
+
+
+class AuditLogWriterThreadTestCase(TransactionTestCase):
+    """
+    Test suite for the background audit writer, the default (ASYNC) mode.
+
+    The test runner turns ASYNC off for the suite, so these buffers are
+    built with use_thread=True directly; TransactionTestCase commits, so the
+    writer thread's inserts are visible here.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='threaded',
+            email='threaded@example.com',
+            password='Str0ng-pass!9'
+        )
+
+    def event(self):
+        return AadhaarAccessLog(user_id=self.user.pk, accessed_at=timezone.now())
+
+    def start_buffer(self, **options):
+        buffer = AuditLogBuffer(use_thread=True, **options)
+        self.addCleanup(buffer.shutdown)
+        return buffer
+
+    def wait_for_rows(self, count):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if AadhaarAccessLog.objects.filter(user=self.user).count() >= count:
+                break
+            time.sleep(0.02)
+        return AadhaarAccessLog.objects.filter(user=self.user).count()
+
+    def test_writer_flushes_on_interval(self):
+        buffer = self.start_buffer(flush_size=100, flush_interval=0.05)
+        buffer.record(self.event())
+        self.assertTrue(buffer._thread.is_alive())
+
+        self.assertEqual(self.wait_for_rows(1), 1)
+        self.assertEqual(buffer.written, 1)
+
+    def test_writer_flushes_a_full_batch_before_the_interval(self):
+        buffer = self.start_buffer(flush_size=3, flush_interval=60)
+        for _ in range(3):
+            buffer.record(self.event())
+        self.assertEqual(self.wait_for_rows(3), 3)
+
+    def test_shutdown_stops_the_writer_and_flushes(self):
+        # The interval never passes: only shutdown() can write this event
+        buffer = self.start_buffer(flush_size=100, flush_interval=60)
+        buffer.record(self.event())
+        time.sleep(0.2)
+        self.assertEqual(AadhaarAccessLog.objects.count(), 0)
+
+        buffer.shutdown()
+        self.assertFalse(buffer._thread.is_alive())
+        self.assertEqual(AadhaarAccessLog.objects.filter(user=self.user).count(), 1)
+
+
+calls = []
+
+
+@job('tests.record_call')
+def record_call(value):
+    calls.append(value)
+
+
+@job('tests.always_fails')
+def always_fails():
+    raise RuntimeError('boom')
+
+
+class RefreshGraceConcurrencyTestCase(TransactionTestCase):
+    """
+    Concurrent refreshes of one token, as sent by a browser with several
+    requests in flight when its access token expires.
+    """
+
+    def test_concurrent_refreshes_share_one_rotation(self):
+        user = User.objects.create_user(
+            username='storm', email='storm@example.com', password='Str0ng-pass!9'
+        )
+        token = str(FamilyRefreshToken.for_user(user))
+        url = reverse('users:token_refresh')
+        start = threading.Barrier(8)
+        responses = []
+
+        def refresh():
+            client = APIClient()
+            start.wait()
+            responses.append(client.post(url, {'refresh': token}, format='json'))
+            connections.close_all()
+
+        threads = [threading.Thread(target=refresh) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual([r.status_code for r in responses], [200] * 8)
+        self.assertEqual(len({r.data['refresh'] for r in responses}), 1)
+        family = TokenFamily.objects.get()
+        self.assertEqual((family.generation, family.is_revoked), (1, False))
+
+class JobRunnerTestCase(TestCase):
+    """
+    Test suite for the persistent background job runner.
+    """
+
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker(workers=1, batch_size=10)
+
+    def test_enqueued_jobs_are_persisted_and_run(self):
+        enqueue('tests.record_call', value=1)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(self.worker.run_once(), 1)
+        self.assertEqual(calls, [1])
+        finished = Job.objects.get()
+        self.assertEqual(finished.status, Job.STATUS_DONE)
+        self.assertEqual(finished.attempts, 1)
+
+    def test_enqueue_many_is_one_insert(self):
+        with self.assertNumQueries(1):
+            enqueue_many([('tests.record_call', {'value': i}) for i in range(5)])
+        self.worker.run_once()
+        self.assertEqual(sorted(calls), [0, 1, 2, 3, 4])
+
+    def test_unknown_job_is_rejected(self):
+        with self.assertRaises(KeyError):
+            enqueue('tests.missing')
+
+    # 'replica' is not a configured database, so any read routed there fails
+    # the way a read from a replica that lags the primary would
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    @mock.patch('identity_service.db_routers.connections')
+    def test_worker_reads_from_primary_with_replicas_configured(self, connections):
+        connections.__getitem__.return_value.in_atomic_block = False
+        user = User.objects.create_user(
+            username='queued', email='queued@example.com', password='Str0ng-pass!9'
+        )
+        enqueue('users.send_welcome_email', user_id=user.pk)
+
+        self.assertEqual(self.worker.run_once(), 1)
+        self.assertEqual(Job.objects.using('default').get().status, Job.STATUS_DONE)
+        self.assertEqual(mail.outbox[-1].to, ['queued@example.com'])
+
+    def test_future_jobs_wait(self):
+        enqueue('tests.record_call', run_at=timezone.now() + timedelta(minutes=5), value=1)
+        self.assertEqual(self.worker.run_once(), 0)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        enqueue('tests.always_fails', max_attempts=2)
+
+        with self.assertLogs('users.jobs', 'WARNING'):
+            self.worker.run_once()
+        retried = Job.objects.get()
+        self.assertEqual(retried.status, Job.STATUS_PENDING)
+        self.assertGreater(retried.run_at, timezone.now())
+        self.assertIn('RuntimeError: boom', retried.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('users.jobs', 'ERROR'):
+            self.worker.run_once()
+        self.assertEqual(Job.objects.get().status, Job.STATUS_FAILED)
+
+    def test_jobs_claimed_by_another_worker_are_skipped(self):
+        queued = enqueue('tests.record_call', value=1)
+        Job.objects.filter(pk=queued.pk).update(
+            status=Job.STATUS_RUNNING, locked_by='other', locked_at=timezone.now()
+        )
+        self.assertEqual(self.worker.run_once(), 0)
+
+        # Until the other worker is presumed dead
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.worker.run_once(), 1)
+        # The lost run counted as an attempt
+        self.assertEqual(Job.objects.get().attempts, 2)
+
+    def test_jobs_that_keep_killing_their_worker_fail(self):
+        queued = enqueue('tests.record_call', max_attempts=2, value=1)
+
+        def crash():
+            Job.objects.filter(pk=queued.pk).update(
+                status=Job.STATUS_RUNNING, locked_by='crashed',
+                locked_at=timezone.now() - timedelta(hours=1),
+            )
+
+        crash()
+        self.worker.release_stale()
+        self.assertEqual(Job.objects.get().status, Job.STATUS_PENDING)
+
+        crash()
+        with self.assertLogs('users.jobs', 'ERROR'):
+            self.worker.release_stale()
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Job.STATUS_FAILED, 2))
+        self.assertEqual(self.worker.run_once(), 0)
+        self.assertEqual(calls, [])
+
+    def test_outcome_of_a_reclaimed_job_is_not_overwritten(self):
+        enqueue('tests.record_call', value=1)
+        claimed = self.worker.claim()[0]
+        # Released after the lock timeout and claimed by another worker
+        Job.objects.update(locked_by='other', locked_at=timezone.now())
+
+        with self.assertLogs('users.jobs', 'WARNING'):
+            self.worker.execute(claimed)
+        running = Job.objects.get()
+        self.assertEqual((running.status, running.locked_by), (Job.STATUS_RUNNING, 'other'))
+
+    def test_registration_defers_side_effects(self):
+        response = APIClient().post(reverse('users:register'), {
+            'email': 'jobs@example.com',
+            'username': 'jobs',
+            'first_name': 'Job',
+            'last_name': 'Runner',
+            'password': 'Str0ng-pass!9',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            set(Job.objects.values_list('name', flat=True)),
+            {'users.send_welcome_email', 'users.track_registration'},
+        )
+
+        self.worker.run_once()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['jobs@example.com'])
+
+
+class BoundedTTLCacheTestCase(unittest.TestCase):
+    """
+    Test suite for the bounded in-process TTL cache.
+    """
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = BoundedTTLCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = BoundedTTLCache(max_entries=10, ttl=60)
+        with mock.patch('users.cache.time.monotonic', return_value=1000.0):
+            cache.set('a', 1)
+        with mock.patch('users.cache.time.monotonic', return_value=1061.0):
+            self.assertIsNone(cache.get('a'))
+
+    def test_get_or_set_only_builds_on_miss(self):
+        cache = BoundedTTLCache()
+        self.assertEqual(cache.get_or_set('a', lambda: 1), (1, True))
+        self.assertEqual(cache.get_or_set('a', lambda: 2), (1, False))
+
+
+class IdempotencyKeyTestCase(TestCase):
+    """
+    Test suite for Idempotency-Key handling on register and login.
+    """
+
+    def setUp(self):
+        get_store().clear()
+        cache.clear()
+        self.client = APIClient()
+        self.registration = {
+            'email': 'retry@example.com',
+            'username': 'retry',
+            'first_name': 'Re',
+            'last_name': 'Try',
+            'password': 'Str0ng-pass!9',
+        }
+
+    def post(self, name, data, key):
+        return self.client.post(reverse(name), data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_registration_retry_is_replayed_without_running_again(self):
+        first = self.post('users:register', self.registration, 'key-1')
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(0):
+            retry = self.post('users:register', self.registration, 'key-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(User.objects.filter(email='retry@example.com').count(), 1)
+
+    def test_login_retry_does_not_mint_another_family(self):
+        self.post('users:register', self.registration, 'register-key')
+        credentials = {'email': 'retry@example.com', 'password': 'Str0ng-pass!9'}
+        first = self.post('users:login', credentials, 'login-key')
+        retry = self.post('users:login', credentials, 'login-key')
+
+        self.assertEqual(retry.data['tokens'], first.data['tokens'])
+        self.assertEqual(TokenFamily.objects.count(), 2)
+
+    def test_login_responses_expire_after_the_retry_window(self):
+        self.post('users:register', self.registration, 'register-key')
+        credentials = {'email': 'retry@example.com', 'password': 'Str0ng-pass!9'}
+        now, wall_now = time.monotonic(), time.time()
+        first = self.post('users:login', credentials, 'login-key')
+
+        window = settings.IDEMPOTENCY['SCOPE_TTL']['login']
+        self.assertLess(window, settings.IDEMPOTENCY['TTL'])
+        # Past the window both in process and in the shared cache
+        with mock.patch('users.cache.time.monotonic', return_value=now + window + 1), \
+                mock.patch('time.time', return_value=wall_now + window + 1):
+            later = self.post('users:login', credentials, 'login-key')
+        self.assertNotIn('Idempotent-Replayed', later)
+        self.assertNotEqual(later.data['tokens'], first.data['tokens'])
+
+    def test_retry_reaching_another_worker_is_replayed(self):
+        first = self.post('users:register', self.registration, 'key-3')
+        # The other worker's in-process store has never seen the key
+        get_store().clear()
+
+        with self.assertNumQueries(0):
+            retry = self.post('users:register', self.registration, 'key-3')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+
+        changed = dict(self.registration, username='someone-else')
+        get_store().clear()
+        self.assertEqual(self.post('users:register', changed, 'key-3').status_code, 422)
+
+    @override_settings(IDEMPOTENCY={**settings.IDEMPOTENCY, 'POLL_INTERVAL': 0.01})
+    def test_duplicate_waits_for_an_original_in_another_worker(self):
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        class SlowView:
+            @idempotent('tests')
+            def post(self, request):
+                runs.append(1)
+                started.set()
+                release.wait(5)
+                return Response({'run': len(runs)}, status=201)
+
+        def call():
+            request = APIRequestFactory().post('/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='same')
+            return SlowView().post(Request(request))
+
+        original = threading.Thread(target=call)
+        original.start()
+        started.wait(5)
+        # Only the shared cache knows about the original from here on
+        get_store().clear()
+        threading.Timer(0.05, release.set).start()
+        duplicate = call()
+        original.join(5)
+
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(duplicate.data, {'run': 1})
+        self.assertEqual(duplicate['Idempotent-Replayed'], 'true')
+
+    def test_key_reuse_with_different_body_is_rejected(self):
+        self.post('users:register', self.registration, 'key-2')
+        changed = dict(self.registration, username='someone-else')
+        self.assertEqual(self.post('users:register', changed, 'key-2').status_code, 422)
+
+    def test_requests_without_key_are_not_stored(self):
+        self.client.post(reverse('users:register'), self.registration, format='json')
+        self.assertEqual(len(get_store()), 0)
+
+    def test_concurrent_duplicate_waits_for_the_original(self):
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        class SlowView:
+            @idempotent('tests')
+            def post(self, request):
+                runs.append(1)
+                started.set()
+                release.wait(5)
+                return Response({'run': len(runs)}, status=201)
+
+        factory = APIRequestFactory()
+
+        def call(results):
+            request = factory.post('/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='same')
+            results.append(SlowView().post(Request(request)))
+
+        results = []
+        original = threading.Thread(target=call, args=(results,))
+        original.start()
+        started.wait(5)
+        duplicate = threading.Thread(target=call, args=(results,))
+        duplicate.start()
+        time.sleep(0.05)
+        release.set()
+        original.join(5)
+        duplicate.join(5)
+
+        self.assertEqual(len(runs), 1)
+        self.assertEqual([r.data for r in results], [{'run': 1}, {'run': 1}])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryReplicaRouterTestCase(TestCase):
+    """
+    Test suite for replica routing and read-your-writes stickiness.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='replica',
+            email='replica@example.com',
+            password='Str0ng-pass!9'
+        )
+        self.access = str(FamilyRefreshToken.for_user(self.user).access_token)
+
+    def route_during(self, request):
+        """
+        Return the alias a read would use while ``request`` is handled.
+        """
+        seen = []
+
+        def get_response(request):
+            seen.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(get_response)(request)
+        return seen[0]
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        # TestCase wraps each test in a transaction; leave it for this check
+        with mock.patch('identity_service.db_routers.is_pinned', return_value=False):
+            self.assertEqual(self.router.db_for_read(User), 'replica')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'users'))
+        self.assertTrue(self.router.allow_migrate('default', 'users'))
+
+    def test_reads_inside_transactions_stay_on_primary(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    @mock.patch('identity_service.db_routers.connections')
+    def test_middleware_pins_writes_and_sticky_users(self, connections):
+        connections.__getitem__.return_value.in_atomic_block = False
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {self.access}'}
+
+        self.assertEqual(self.route_during(self.factory.get('/api/profile/', **auth)), 'replica')
+        self.assertEqual(self.route_during(self.factory.post('/api/profile/', **auth)), 'default')
+
+        mark_recent_write(self.user.pk)
+        self.assertEqual(self.route_during(self.factory.get('/api/profile/', **auth)), 'default')
+        self.assertEqual(self.route_during(self.factory.get('/api/profile/')), 'replica')
+
+    def test_profile_update_makes_following_reads_sticky(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        response = client.patch(reverse('users:profile'), {'address': 'Delhi'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(has_recent_write(self.user.pk))
+
+    def test_registration_is_sticky_for_the_new_user(self):
+        response = APIClient().post(reverse('users:register'), {
+            'email': 'fresh@example.com',
+            'username': 'fresh',
+            'password': 'Str0ng-pass!9',
+        }, format='json')
+        self.assertTrue(has_recent_write(response.data['user']['id']))
+
+
+REGISTRATION = {
+    'username': 'sharded',
+    'email': 'sharded@example.com',
+    'password': 'Str0ng-pass!9',
+}
+
+
+class UserShardingTestCase(TestCase):
+    """
+    Test suite for email-hash buckets, sharded ids and single-shard routing.
+    """
+
+    def test_bucket_ignores_case_and_whitespace(self):
+        self.assertEqual(bucket_for_email(' Someone@Example.COM '), bucket_for_email('someone@example.com'))
+        self.assertTrue(0 <= bucket_for_email('someone@example.com') < BUCKET_COUNT)
+
+    def test_user_ids_encode_their_bucket(self):
+        ids = [make_user_id(bucket % BUCKET_COUNT) for bucket in range(2000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(user_id < 2 ** 53 for user_id in ids))
+        self.assertEqual([bucket_for_user_id(user_id) for user_id in ids[:3]], [0, 1, 2])
+        self.assertIsNone(bucket_for_user_id(42))
+
+    def test_id_blocks_never_overlap(self):
+        # Every process reserves its own block from the shared sequence
+        first, second = reserve_user_ids(ID_BLOCK_SIZE), reserve_user_ids(ID_BLOCK_SIZE)
+        self.assertEqual(len(first), ID_BLOCK_SIZE)
+        self.assertEqual(first.stop, second.start)
+        # ...above anything the earlier time-based ids used
+        legacy_now = (int(time.time() * 1000) - SHARD_EPOCH_MS) << LEGACY_SEQUENCE_BITS
+        self.assertGreater(first.start, legacy_now)
+
+    def test_blocks_reserved_in_a_transaction_wait_for_commit(self):
+        # Until the test transaction commits, a rollback could hand the
+        # block to another process, so each id reserves afresh
+        with self.captureOnCommitCallbacks() as callbacks:
+            first, second = make_user_id(0), make_user_id(0)
+        self.assertEqual(second - first, ID_BLOCK_SIZE << BUCKET_BITS)
+        self.assertEqual(len(callbacks), 2)
+
+    @override_settings(USER_SHARDS={'ALIASES': ['a', 'b'], 'BUCKET_MAP': {0: 'c'}})
+    def test_bucket_ranges_and_overrides(self):
+        self.assertEqual(alias_for_bucket(1), 'a')
+        self.assertEqual(alias_for_bucket(BUCKET_COUNT - 1), 'b')
+        self.assertEqual(alias_for_bucket(0), 'c')
+        self.assertEqual(shard_aliases(), ['a', 'b', 'c'])
+        # Ids from before sharding stay on the primary
+        self.assertEqual(shard_for_user_id(42), 'default')
+
+    def test_sharding_off_defers_to_routers(self):
+        self.assertIsNone(shard_for_email('someone@example.com'))
+        self.assertIsNone(shard_for_user_id(42))
+        self.assertEqual(shard_aliases(), [None])
+        user = User.objects.create_user(**REGISTRATION)
+        self.assertIsNone(bucket_for_user_id(user.pk))
+
+    @override_settings(USER_SHARDS={'ALIASES': ['default'], 'BUCKET_MAP': {}})
+    def test_api_flow_with_sharded_ids(self):
+        client = APIClient()
+        response = client.post(reverse('users:register'), REGISTRATION, format='json')
+        self.assertEqual(response.status_code, 201)
+        user_id = response.data['user']['id']
+        self.assertEqual(bucket_for_user_id(user_id), bucket_for_email(REGISTRATION['email']))
+
+        response = client.post(reverse('users:login'), {
+            'email': REGISTRATION['email'], 'password': REGISTRATION['password'],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        refresh = client.post(reverse('users:token_refresh'), {
+            'refresh': response.data['tokens']['refresh'],
+        }, format='json')
+        self.assertEqual(refresh.status_code, 200)
+
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.data['access']}")
+        self.assertEqual(client.get(reverse('users:profile')).data['user']['id'], user_id)
+
+        duplicate = APIClient().post(reverse('users:register'), REGISTRATION, format='json')
+        self.assertEqual(duplicate.status_code, 400)
+        self.assertEqual(set(duplicate.data), {'email', 'username'})
+
+    @override_settings(USER_SHARDS={'ALIASES': ['default'], 'BUCKET_MAP': {}})
+    def test_every_create_and_rename_goes_through_the_claim(self):
+        user = User.objects.create_user(**REGISTRATION)
+        admin_user = User.objects.create_superuser(username='root', email='root@example.com', password='x')
+        self.assertEqual(
+            dict(UsernameClaim.objects.values_list('username', 'user_id')),
+            {'sharded': user.pk, 'root': admin_user.pk},
+        )
+
+        user = User.objects.get(pk=user.pk)
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(UsernameClaim.objects.get(user_id=user.pk).username, 'renamed')
+
+        # Another shard's user holding the name is caught by the claim alone
+        UsernameClaim.objects.create(username='elsewhere', user_id=make_user_id(0))
+        user.username = 'elsewhere'
+        with self.assertRaises(UsernameTaken):
+            user.save()
+        self.assertEqual(UsernameClaim.objects.get(user_id=user.pk).username, 'renamed')
+        self.assertEqual(User.objects.get(pk=user.pk).username, 'renamed')
+
+    @override_settings(USER_SHARDS={'ALIASES': ['default'], 'BUCKET_MAP': {}})
+    def test_generated_users_claim_their_usernames(self):
+        call_command('generate_users', 5, password_hashes=1, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(UsernameClaim.objects.values_list('username', 'user_id')),
+            sorted(User.objects.values_list('username', 'pk')),
+        )
+
+
+class RegistrationRaceTestCase(TransactionTestCase):
+    """
+    Sign-ups that pass the unique validators and then lose the race to an
+    identical concurrent sign-up.
+    """
+
+    def setUp(self):
+        # Both requests validate before either inserts
+        patcher = mock.patch('users.serializers.ShardedUniqueValidator.__call__', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def register(self, **overrides):
+        return APIClient().post(reverse('users:register'), {**REGISTRATION, **overrides}, format='json')
+
+    def test_duplicate_insert_is_a_bad_request(self):
+        self.assertEqual(self.register().status_code, 201)
+        response = self.register(username='other')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.data)
+
+    @override_settings(USER_SHARDS={'ALIASES': ['default'], 'BUCKET_MAP': {}})
+    def test_username_claims_guard_sharded_sign_ups(self):
+        self.assertEqual(self.register().status_code, 201)
+        claim = UsernameClaim.objects.get()
+        self.assertEqual(claim.user_id, User.objects.get().pk)
+
+        response = self.register(email='other@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.data)
+
+        # A failed insert gives its username back
+        response = self.register(username='other')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UsernameClaim.objects.filter(username='other').exists())
+        self.assertEqual(User.objects.count(), 1)
+
+
+def email_on_shard(alias, prefix):
+    """
+    Return an email address that hashes to a bucket on ``alias``.
+    """
+    for index in range(10000):
+        email = f'{prefix}{index}@example.com'
+        if shard_for_email(email) == alias:
+            return email
+    raise AssertionError(f'No email found for shard {alias}')
+
+
+@unittest.skipUnless('shard_1' in settings.DATABASES, 'Set USER_SHARD_COUNT=2 to run')
+@override_settings(USER_SHARDS={'ALIASES': ['default', 'shard_1'], 'BUCKET_MAP': {}})
+class MultiShardTestCase(TestCase):
+    """
+    Test suite for users spread over two databases.
+    """
+    databases = {'default', 'shard_1'} & set(settings.DATABASES)
+
+    def register(self, email, username):
+        return APIClient().post(reverse('users:register'), {
+            'email': email, 'username': username, 'password': 'Str0ng-pass!9',
+        }, format='json')
+
+    def test_users_land_on_their_shard_and_can_log_in(self):
+        email = email_on_shard('shard_1', 'far')
+        response = self.register(email, 'far')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.using('shard_1').filter(email=email).exists())
+        self.assertFalse(User.objects.using('default').filter(email=email).exists())
+
+        client = APIClient()
+        login = client.post(reverse('users:login'), {
+            'email': email, 'password': 'Str0ng-pass!9',
+        }, format='json')
+        self.assertEqual(login.status_code, 200)
+        self.assertEqual(TokenFamily.objects.using('shard_1').count(), 2)
+
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['tokens']['access']}")
+        self.assertEqual(client.get(reverse('users:profile')).data['user']['email'], email)
+        client.patch(reverse('users:profile'), {'address': 'Pune'}, format='json')
+        self.assertEqual(User.objects.using('shard_1').get(email=email).address, 'Pune')
+
+    def test_usernames_are_unique_across_shards(self):
+        self.assertEqual(self.register(email_on_shard('default', 'near'), 'taken').status_code, 201)
+        response = self.register(email_on_shard('shard_1', 'far'), 'taken')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.data)
+
+    @override_settings(INTERNAL_SERVICE_TOKENS={'gateway': 'gateway-secret'})
+    def test_batch_lookup_spans_shards(self):
+        emails = [email_on_shard('shard_1', 'far'), email_on_shard('default', 'near')]
+        for index, email in enumerate(emails):
+            self.register(email, f'batch{index}')
+        ids = [User.objects.using(alias).get(email=email).pk
+               for alias, email in zip(['shard_1', 'default'], emails)]
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Service gateway-secret')
+        response = client.post(reverse('users:user_batch'), {'ids': ids}, format='json')
+        results = json.loads(b''.join(response.streaming_content))['results']
+        self.assertEqual([r['email'] for r in results], emails)
+
+    @override_settings(CHANGE_FEED={'PAGE_SIZE': 1, 'MAX_PAGE_SIZE': 10, 'SAFETY_LAG': 0})
+    def test_change_feed_merges_shards(self):
+        emails = [email_on_shard('shard_1', 'far'), email_on_shard('default', 'near'),
+                  email_on_shard('shard_1', 'farther')]
+        for index, email in enumerate(emails):
+            self.register(email, f'feed{index}')
+
+        seen, cursor, has_more = [], None, True
+        while has_more:
+            changes, cursor, has_more = fetch_changes(cursor)
+            seen.extend(change['user']['email'] for change in changes)
+        self.assertEqual(seen, emails)
+
+    def test_rebalance_moves_users_and_families(self):
+        email = email_on_shard('default', 'near')
+        self.register(email, 'mover')
+        user = User.objects.using('default').get(email=email)
+        for alias in ('default', 'shard_1'):
+            Group.objects.using(alias).create(pk=7, name='support')
+        permission = Permission.objects.using('default').get(codename='view_user')
+        user.groups.add(7)
+        user.user_permissions.add(permission)
+
+        remap = {'ALIASES': ['default', 'shard_1'], 'BUCKET_MAP': {bucket_for_email(email): 'shard_1'}}
+        with override_settings(USER_SHARDS=remap):
+            call_command('rebalance_shards', stdout=io.StringIO())
+            self.assertFalse(User.objects.using('default').filter(pk=user.pk).exists())
+            self.assertTrue(User.objects.using('shard_1').filter(pk=user.pk).exists())
+            self.assertEqual(TokenFamily.objects.using('shard_1').filter(user_id=user.pk).count(), 1)
+            moved = User.objects.using('shard_1').get(pk=user.pk)
+            self.assertEqual(list(moved.groups.values_list('name', flat=True)), ['support'])
+            self.assertTrue(moved.has_perm('users.view_user'))
+
+            login = APIClient().post(reverse('users:login'), {
+                'email': email, 'password': 'Str0ng-pass!9',
+            }, format='json')
+            self.assertEqual(login.status_code, 200)
+
+    def test_admin_lists_and_deactivates_users_per_shard(self):
+        admin_user = User.objects.create_superuser(
+            username='admin', email=email_on_shard('default', 'admin'), password='Str0ng-pass!9'
+        )
+        self.client.force_login(admin_user)
+        email = email_on_shard('shard_1', 'far')
+        self.register(email, 'far')
+        user = User.objects.using('shard_1').get(email=email)
+        FamilyRefreshToken.for_user(user)
+
+        url = reverse('admin:users_user_changelist')
+        listed = self.client.get(url, {'shard': 'shard_1', 'q': 'far'}).context['cl'].result_list
+        self.assertEqual([u.pk for u in listed], [user.pk])
+        self.assertEqual(self.client.get(reverse('admin:users_user_change', args=[user.pk])).status_code, 200)
+
+        response = self.client.post(f'{url}?shard=shard_1', {
+            'action': 'deactivate_users', '_selected_action': [user.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.using('shard_1').get(pk=user.pk).is_active)
+        self.assertFalse(TokenFamily.objects.using('shard_1').filter(revoked_at__isnull=True).exists())
+
+
+class WarmupProbeTestCase(TestCase):
+    """
+    Test suite for worker warm-up and the liveness/readiness probes.
+    """
+    # /readyz queries every configured database
+    databases = '__all__'
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(warmup, '_done', threading.Event()),
+            mock.patch.dict(warmup.timings, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_healthz_touches_nothing(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('healthz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    @override_settings(WARMUP_ON_STARTUP=True)
+    def test_readyz_waits_for_warm_up(self):
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['checks']['warm'])
+
+        warmup.warm_up()
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['warmup_ms']), {name for name, _ in warmup.STEPS})
+
+    def test_readyz_without_warm_up_checks_databases(self):
+        self.assertEqual(self.client.get(reverse('readyz')).status_code, 200)
+        # The connection is already open; the probe must still query it
+        with mock.patch.object(
+            connections['default'], 'cursor', side_effect=OperationalError('down')
+        ):
+            response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['checks']['db:default'])
+
+    def test_failing_step_does_not_block_readiness(self):
+        def broken():
+            raise RuntimeError('boom')
+
+        with mock.patch.object(warmup, 'STEPS', [('broken', broken)]):
+            with self.assertLogs('users.warmup', level='ERROR'):
+                warmup.warm_up()
+        self.assertTrue(warmup.is_warm())
+
+
+class ConcurrencyLimiterTestCase(unittest.TestCase):
+    """
+    Test suite for the admission control limiter.
+    """
+
+    def test_sheds_when_queue_is_full(self):
+        limiter = ConcurrencyLimiter('test', concurrency=1, queue_size=0)
+        self.assertIsNone(limiter.acquire())
+        self.assertEqual(limiter.acquire(), SHED_QUEUE_FULL)
+        limiter.release()
+        self.assertIsNone(limiter.acquire())
+        self.assertEqual(limiter.snapshot()['shed'], {SHED_QUEUE_FULL: 1, SHED_TIMEOUT: 0})
+
+    def test_waiters_time_out_at_the_deadline(self):
+        limiter = ConcurrencyLimiter('test', concurrency=1, queue_size=1, timeout=0.05)
+        limiter.acquire()
+        start = time.monotonic()
+        self.assertEqual(limiter.acquire(), SHED_TIMEOUT)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(limiter.snapshot()['waiting'], 0)
+
+    def test_release_admits_a_waiter(self):
+        limiter = ConcurrencyLimiter('test', concurrency=1, queue_size=1, timeout=5)
+        limiter.acquire()
+        outcome = []
+        waiter = threading.Thread(target=lambda: outcome.append(limiter.acquire()))
+        waiter.start()
+        while limiter.snapshot()['waiting'] == 0:
+            time.sleep(0.001)
+        limiter.release()
+        waiter.join(5)
+        self.assertEqual(outcome, [None])
+        self.assertEqual(limiter.snapshot()['active'], 1)
+
+
+@override_settings(ADMISSION_CONTROL={
+    'ENABLED': True,
+    'RETRY_AFTER': 2,
+    'CLASSES': {
+        'password_hashing': {
+            'URL_NAMES': ['users:login', 'users:register'],
+            'CONCURRENCY': 1,
+            'QUEUE': 0,
+            'TIMEOUT': 0,
+        },
+    },
+})
+class AdmissionControlTestCase(TestCase):
+    """
+    Test suite for AdmissionControlMiddleware and /metrics.
+    """
+
+    def setUp(self):
+        # Counters are process-wide; start every test from fresh limiters
+        reset_limiters(setting='ADMISSION_CONTROL')
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='admitted', email='admitted@example.com', password='Str0ng-pass!9'
+        )
+        self.limiter = get_limiters()['password_hashing']
+
+    def login(self, **headers):
+        return self.client.post(reverse('users:login'), {
+            'email': 'admitted@example.com', 'password': 'Str0ng-pass!9',
+        }, format='json', **headers)
+
+    def test_slot_is_released_after_the_response(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login().status_code, 200)
+        snapshot = self.limiter.snapshot()
+        self.assertEqual((snapshot['active'], snapshot['admitted']), (0, 2))
+
+    def test_saturated_class_sheds_while_other_routes_pass(self):
+        self.limiter.acquire()
+        self.addCleanup(self.limiter.release)
+
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+        access = FamilyRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(reverse('users:profile')).status_code, 200)
+
+        # Not for users, only for internal services
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Service metrics-secret')
+        with self.settings(INTERNAL_SERVICE_TOKENS={'prometheus': 'metrics-secret'}):
+            metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('admission_active{route_class="password_hashing"} 1', metrics)
+        self.assertIn(
+            'admission_shed_total{route_class="password_hashing",reason="queue_full"} 1', metrics
+        )
+
+    def test_idempotent_duplicates_do_not_take_slots(self):
+        get_store().clear()
+        cache.clear()
+        self.assertEqual(self.login(HTTP_IDEMPOTENCY_KEY='login-once').status_code, 200)
+        self.limiter.acquire()
+        self.addCleanup(self.limiter.release)
+
+        for _ in range(3):
+            retry = self.login(HTTP_IDEMPOTENCY_KEY='login-once')
+            self.assertEqual(retry.status_code, 200)
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.login(HTTP_IDEMPOTENCY_KEY='login-twice').status_code, 503)
+
+        snapshot = self.limiter.snapshot()
+        self.assertEqual((snapshot['active'], snapshot['admitted']), (1, 2))
+        self.assertEqual(snapshot['shed'][SHED_QUEUE_FULL], 1)
+
+    def test_duplicate_that_has_to_run_takes_a_slot(self):
+        # The entry is gone by the time the view runs (e.g. the original
+        # failed), so the duplicate does the hashing itself
+        self.limiter.acquire()
+        self.addCleanup(self.limiter.release)
+        with mock.patch('users.idempotency._has_entry', return_value=True):
+            self.assertEqual(self.login(HTTP_IDEMPOTENCY_KEY='fresh').status_code, 503)
+        self.assertEqual(len(get_store()), 0)
+
+    def test_disabled_admits_everything(self):
+        self.limiter.acquire()
+        self.addCleanup(self.limiter.release)
+        with self.settings(ADMISSION_CONTROL={**settings.ADMISSION_CONTROL, 'ENABLED': False}):
+            self.assertEqual(self.login().status_code, 200)
+
+
+@override_settings(
+    INTERNAL_SERVICE_TOKENS={'placements': 'placements-secret', 'gateway': 'gateway-secret'},
+    USER_BATCH_LOOKUP={'MAX_BATCH': 3, 'AADHAAR_SERVICES': ['placements']},
+)
+class UserBatchLookupTestCase(QueryBudgetMixin, TestCase):
+    """
+    Test suite for the batch user lookup endpoint.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Service placements-secret')
+        self.url = reverse('users:user_batch')
+        self.first = User.objects.create_user(
+            username='first', email='first@example.com', password='Str0ng-pass!9', first_name='Asha'
+        )
+        self.first.set_aadhaar('123456789012')
+        self.first.save()
+        self.second = User.objects.create_user(
+            username='second', email='second@example.com', password='Str0ng-pass!9'
+        )
+
+    def lookup(self, payload):
+        response = self.client.post(self.url, payload, format='json')
+        if response.streaming:
+            response.data = json.loads(b''.join(response.streaming_content))
+        return response
+
+    def test_requires_service_token(self):
+        self.client.credentials()
+        self.assertEqual(self.lookup({'ids': [self.first.pk]}).status_code, 401)
+        access = FamilyRefreshToken.for_user(self.first).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertIn(self.lookup({'ids': [self.first.pk]}).status_code, (401, 403))
+
+    def test_results_follow_input_order_with_misses(self):
+        ids = [self.second.pk, 999999, self.first.pk]
+        with self.assertQueryBudget('users:user_batch', 'POST') as queries:
+            response = self.lookup({'ids': ids, 'fields': ['username', 'first_name']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertEqual(response.data['results'], [
+            {'id': self.second.pk, 'found': True, 'username': 'second', 'first_name': ''},
+            {'id': 999999, 'found': False},
+            {'id': self.first.pk, 'found': True, 'username': 'first', 'first_name': 'Asha'},
+        ])
+        self.assertNotIn('aadhaar', queries.captured_queries[0]['sql'])
+
+    def test_lookup_by_email(self):
+        response = self.lookup({'emails': ['missing@example.com', 'first@example.com']})
+        results = response.data['results']
+        self.assertEqual(results[0], {'email': 'missing@example.com', 'found': False})
+        self.assertEqual(results[1]['id'], self.first.pk)
+        self.assertEqual(results[1]['username'], 'first')
+
+    def test_include_aadhaar_decrypts_and_audits(self):
+        response = self.lookup({
+            'ids': [self.first.pk, self.second.pk], 'fields': ['aadhaar_masked'], 'include_aadhaar': True,
+        })
+        results = response.data['results']
+        self.assertEqual(results[0]['aadhaar'], '123456789012')
+        self.assertEqual(results[0]['aadhaar_masked'], 'XXXX-XXXX-9012')
+        self.assertIsNone(results[1]['aadhaar'])
+
+        get_audit_log().flush()
+        self.assertEqual(
+            list(AadhaarAccessLog.objects.values_list('user_id', 'event', 'service')),
+            [(self.first.pk, AadhaarAccessLog.EVENT_SERVICE_LOOKUP, 'placements')],
+        )
+
+    def test_include_aadhaar_needs_an_allowed_service(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Service gateway-secret')
+        response = self.lookup({'ids': [self.first.pk], 'include_aadhaar': True})
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_requests_are_rejected(self):
+        for payload in (
+            {},
+            {'ids': [1], 'emails': ['first@example.com']},
+            {'ids': [1, 2, 3, 4]},
+            {'ids': [1], 'fields': ['encrypted_aadhaar']},
+        ):
+            self.assertEqual(self.lookup(payload).status_code, 400, payload)
+
+
+@override_settings(
+    INTERNAL_SERVICE_TOKENS={'mirror': 'mirror-secret'},
+    CHANGE_FEED={'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 10, 'SAFETY_LAG': 0},
+)
+class UserChangeFeedTestCase(QueryBudgetMixin, TestCase):
+    """
+    Test suite for the incremental user change feed.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Service mirror-secret')
+        self.url = reverse('users:user_changes')
+        base = timezone.now() - timedelta(minutes=10)
+        self.users = []
+        for index in range(3):
+            user = User.objects.create_user(
+                username=f'mirror{index}', email=f'mirror{index}@example.com', password='Str0ng-pass!9'
+            )
+            # Same timestamp for two users: the id breaks the tie
+            User.objects.filter(pk=user.pk).update(updated_at=base + timedelta(seconds=min(index, 1)))
+            self.users.append(user)
+
+    def changes(self, **params):
+        response = self.client.get(self.url, params)
+        if response.streaming:
+            response.data = json.loads(b''.join(response.streaming_content))
+        return response
+
+    def sync(self, cursor=None):
+        ids = []
+        while True:
+            page = self.changes(**({'cursor': cursor} if cursor else {})).data
+            ids.extend(change['id'] for change in page['results'])
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                return ids, cursor
+
+    def test_full_sync_pages_in_update_order(self):
+        with self.assertQueryBudget('users:user_changes', 'GET'):
+            first = self.changes()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([c['id'] for c in first.data['results']], [u.pk for u in self.users[:2]])
+        self.assertTrue(first.data['has_more'])
+        self.assertEqual(first.data['results'][0]['op'], 'upsert')
+        self.assertEqual(first.data['results'][0]['user']['email'], 'mirror0@example.com')
+        self.assertNotIn('aadhaar_ciphertext', first.data['results'][0]['user'])
+
+        ids, cursor = self.sync()
+        self.assertEqual(ids, [u.pk for u in self.users])
+        empty = self.changes(cursor=cursor).data
+        self.assertEqual((empty['results'], empty['next_cursor'], empty['has_more']), ([], cursor, False))
+
+    def test_incremental_sync_returns_changes_and_tombstones(self):
+        _, cursor = self.sync()
+
+        self.users[0].first_name = 'Renamed'
+        self.users[0].save()
+        User.objects.filter(pk=self.users[1].pk).update(is_active=False, updated_at=timezone.now())
+
+        results = self.changes(cursor=cursor).data['results']
+        self.assertEqual([(c['op'], c['id']) for c in results], [
+            ('upsert', self.users[0].pk),
+            ('delete', self.users[1].pk),
+        ])
+        self.assertEqual(results[0]['user']['first_name'], 'Renamed')
+        self.assertNotIn('user', results[1])
+
+    def test_recent_changes_wait_for_the_safety_lag(self):
+        _, cursor = self.sync()
+        self.users[0].save()
+        with self.settings(CHANGE_FEED={**settings.CHANGE_FEED, 'SAFETY_LAG': 60}):
+            self.assertEqual(self.changes(cursor=cursor).data['results'], [])
+        self.assertEqual(len(self.changes(cursor=cursor).data['results']), 1)
+
+    def test_bad_requests_are_rejected(self):
+        self.assertEqual(self.changes(cursor='not-a-cursor').status_code, 400)
+        self.assertEqual(self.changes(limit=11).status_code, 400)
+        self.client.credentials()
+        self.assertEqual(self.changes().status_code, 401)
+
+    def test_management_command_resumes_from_cursor(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('user_changes', stdout=out, stderr=err)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line['id'] for line in lines], [u.pk for u in self.users])
+
+        cursor = err.getvalue().rsplit(' ', 1)[-1].strip()
+        self.users[2].save()
+        out = io.StringIO()
+        call_command('user_changes', cursor=cursor, stdout=out, stderr=io.StringIO())
+        self.assertEqual([json.loads(line)['id'] for line in out.getvalue().splitlines()], [self.users[2].pk])
+
+
+class GenerateUsersTestCase(TestCase):
+    """
+    Test suite for the synthetic user generator.
+    """
+
+    def generate(self, count, **options):
+        options.setdefault('password_hashes', 1)
+        call_command('generate_users', count, stdout=io.StringIO(), **options)
+
+    def snapshot(self):
+        return [
+            (u.email, u.first_name, u.phone_number, u.date_of_birth, u.is_active, u.get_aadhaar())
+            for u in User.objects.order_by('username')
+        ]
+
+    def test_users_are_complete_and_can_log_in(self):
+        with self.assertNumQueries(3):
+            # SAVEPOINT, one INSERT, RELEASE
+            self.generate(50, password='Gen3rated!pw', password_hashes=2)
+
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(len(set(User.objects.values_list('password', flat=True))), 2)
+        for user in User.objects.filter(aadhaar_ciphertext__isnull=False)[:5]:
+            aadhaar = user.get_aadhaar()
+            self.assertEqual(user.aadhaar_masked, f'XXXX-XXXX-{aadhaar[-4:]}')
+            self.assertEqual(user.aadhaar_index, aadhaar_blind_index(aadhaar))
+
+        user = User.objects.filter(is_active=True).first()
+        self.assertTrue(user.check_password('Gen3rated!pw'))
+
+    def test_same_seed_gives_the_same_users(self):
+        self.generate(30, seed=7)
+        first = self.snapshot()
+        User.objects.all().delete()
+
+        # Batch size and split runs do not change the data
+        self.generate(10, seed=7, batch_size=3)
+        self.generate(20, seed=7, start=10, batch_size=7)
+        self.assertEqual(self.snapshot(), first)
+
+        User.objects.all().delete()
+        self.generate(30, seed=8)
+        self.assertNotEqual(self.snapshot(), first)
+
+
+class AadhaarMaskingTestCase(QueryBudgetMixin, TestCase):
+    """
+    Test suite for the masked Aadhaar column and the reveal endpoint.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='masked',
+            email='masked@example.com',
+            password='Str0ng-pass!9'
+        )
+        self.user.set_aadhaar('123456789012')
+        self.user.save()
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {FamilyRefreshToken.for_user(self.user).access_token}'
+        )
+        get_audit_log().flush()
+
+    def test_set_aadhaar_keeps_mask_in_sync(self):
+        self.assertEqual(self.user.aadhaar_masked, 'XXXX-XXXX-9012')
+        with override_settings(AADHAAR_STORAGE_FORMAT='cbc'):
+            self.user.set_aadhaar('210987654321')
+        self.assertEqual(self.user.aadhaar_masked, 'XXXX-XXXX-4321')
+
+    def test_profile_shows_mask_without_decrypting(self):
+        with mock.patch.object(EncryptionHelper, 'decrypt_bytes') as decrypt:
+            with self.assertQueryBudget('users:profile', 'GET'):
+                response = self.client.get(reverse('users:profile'))
+        decrypt.assert_not_called()
+        self.assertEqual(response.data['user']['aadhaar_masked'], 'XXXX-XXXX-9012')
+        self.assertNotIn('aadhaar', response.data['user'])
+        self.assertEqual(get_audit_log().flush(), 0)
+
+    @override_settings(PROFILE_AADHAAR_MODE='plaintext')
+    def test_plaintext_mode_still_decrypts_and_audits(self):
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.data['user']['aadhaar'], '123456789012')
+        self.assertEqual(response.data['user']['aadhaar_masked'], 'XXXX-XXXX-9012')
+        self.assertEqual(get_audit_log().flush(), 1)
+
+    def test_reveal_endpoint(self):
+        with self.assertQueryBudget('users:aadhaar_reveal', 'GET'):
+            response = self.client.get(reverse('users:aadhaar_reveal'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'aadhaar': '123456789012'})
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+        User.objects.filter(pk=self.user.pk).update(aadhaar_ciphertext=None, aadhaar_masked=None)
+        self.assertEqual(self.client.get(reverse('users:aadhaar_reveal')).status_code, 404)
+        self.assertEqual(APIClient().get(reverse('users:aadhaar_reveal')).status_code, 401)
+
+    def test_backfill_fills_rows_written_before_the_column(self):
+        User.objects.filter(pk=self.user.pk).update(aadhaar_masked=None)
+        legacy = User.objects.create_user(
+            username='legacy', email='legacy@example.com', password='Str0ng-pass!9',
+            encrypted_aadhaar=EncryptionHelper().encrypt('999988887777'),
+        )
+        User.objects.filter(pk=legacy.pk).update(aadhaar_masked=None)
+
+        # Until the backfill runs, the profile decrypts once to build the mask
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.data['user']['aadhaar_masked'], 'XXXX-XXXX-9012')
+
+        call_command('backfill_aadhaar', '--dry-run', stdout=io.StringIO())
+        self.assertIsNone(User.objects.get(pk=legacy.pk).aadhaar_masked)
+
+        out = io.StringIO()
+        call_command('backfill_aadhaar', '--batch-size', '1', stdout=out)
+        self.assertIn('Filled 2 rows, 0 failed', out.getvalue())
+        self.assertEqual(User.objects.get(pk=self.user.pk).aadhaar_masked, 'XXXX-XXXX-9012')
+        self.assertEqual(User.objects.get(pk=legacy.pk).aadhaar_masked, 'XXXX-XXXX-7777')
+
+
+class UserAdminTestCase(TestCase):
+    """
+    Test suite for the large-table User admin.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='Str0ng-pass!9'
+        )
+        self.client.force_login(self.admin_user)
+        self.changelist_url = reverse('admin:users_user_changelist')
+        self.users = []
+        for index, aadhaar in enumerate(['111122223333', '444455556666']):
+            user = User.objects.create_user(
+                username=f'member{index}', email=f'member{index}@example.com', password='Str0ng-pass!9'
+            )
+            user.set_aadhaar(aadhaar)
+            user.save()
+            self.users.append(user)
+
+    def changelist_ids(self, **params):
+        response = self.client.get(self.changelist_url, params)
+        self.assertEqual(response.status_code, 200)
+        return {user.pk for user in response.context['cl'].result_list}
+
+    def test_blind_index_is_keyed_and_normalized(self):
+        self.assertEqual(aadhaar_blind_index('1111 2222 3333'), aadhaar_blind_index('111122223333'))
+        self.assertEqual(self.users[0].aadhaar_index, aadhaar_blind_index('1111-2222-3333'))
+        self.assertNotEqual(self.users[0].aadhaar_index, hashlib.sha256(b'111122223333').hexdigest())
+        self.assertIsNone(aadhaar_blind_index(''))
+
+    def test_search_by_email_prefix_and_aadhaar(self):
+        self.assertEqual(self.changelist_ids(q='member1'), {self.users[1].pk})
+        self.assertEqual(self.changelist_ids(q='member'), {u.pk for u in self.users})
+        self.assertEqual(self.changelist_ids(q='4444 5555 6666'), {self.users[1].pk})
+        self.assertEqual(self.changelist_ids(q='999988887777'), set())
+
+    def test_changelist_skips_encrypted_columns_and_caches_count(self):
+        with CaptureQueriesContext(connection) as first:
+            self.changelist_ids()
+        user_queries = [q['sql'] for q in first.captured_queries if 'FROM "users_user"' in q['sql']]
+        # The session lookup for request.user loads every column; the page itself must not
+        page_selects = [sql for sql in user_queries if 'ORDER BY' in sql]
+        self.assertTrue(page_selects)
+        self.assertFalse(any('aadhaar_ciphertext' in sql for sql in page_selects))
+        self.assertTrue(any('COUNT(' in sql for sql in user_queries))
+
+        with CaptureQueriesContext(connection) as second:
+            self.changelist_ids()
+        self.assertFalse(any('COUNT(' in q['sql'] for q in second.captured_queries))
+
+    @override_settings(USER_ADMIN={**settings.USER_ADMIN, 'ACTION_BATCH_SIZE': 1})
+    def test_deactivate_action_revokes_sessions(self):
+        token = FamilyRefreshToken.for_user(self.users[0])
+        before = User.objects.get(pk=self.users[0].pk).updated_at
+        response = self.client.post(self.changelist_url, {
+            'action': 'deactivate_users',
+            '_selected_action': [u.pk for u in self.users],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(User.objects.filter(pk__in=[u.pk for u in self.users], is_active=True).count(), 0)
+        self.assertGreater(User.objects.get(pk=self.users[0].pk).updated_at, before)
+        self.assertTrue(TokenFamily.objects.get(pk=token['fam']).is_revoked)
+
+    def test_reencrypt_action_upgrades_legacy_rows(self):
+        with override_settings(AADHAAR_STORAGE_FORMAT='cbc'):
+            self.users[0].set_aadhaar('111122223333')
+            self.users[0].save()
+        self.client.post(self.changelist_url, {
+            'action': 'reencrypt_aadhaar',
+            '_selected_action': [self.users[0].pk],
+        })
+        user = User.objects.get(pk=self.users[0].pk)
+        self.assertIsNone(user.encrypted_aadhaar)
+        self.assertEqual(user.get_aadhaar(), '111122223333')
+        self.assertEqual(user.aadhaar_index, aadhaar_blind_index('111122223333'))
@@ -0,0 +1,173 @@
+"""
+JWT token classes backed by refresh-token families.
+
+A login creates one ``TokenFamily`` row. Refresh tokens carry the family id
+(``fam``) and the generation they were minted for (``gen``). Rotation is a
+single conditional UPDATE on the family row; presenting a refresh token
+from an older generation means it was replayed, so the family is revoked,
+unless it is the generation rotated in the last REFRESH_GRACE['SECONDS']
+(see refresh_grace.py).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken as BaseAccessToken, Token
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import TokenFamily
+from .sharding import shard_for_user_id
+from .signing import get_token_backend
+
+
+FAMILY_CLAIM = 'fam'
+GENERATION_CLAIM = 'gen'
+
+
+class KeyRingTokenMixin:
+    """
+    Signs and verifies through the configured key ring (see signing.py).
+    """
+
+    @property
+    def token_backend(self):
+        return get_token_backend()
+
+
+class AccessToken(KeyRingTokenMixin, BaseAccessToken):
+    pass
+
+
+class FamilyRefreshToken(KeyRingTokenMixin, Token):
+    """
+    Refresh token that belongs to a TokenFamily.
+    """
+    token_type = 'refresh'
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+    no_copy_claims = (
+        api_settings.TOKEN_TYPE_CLAIM,
+        'exp',
+        api_settings.JTI_CLAIM,
+        'jti',
+        GENERATION_CLAIM,
+    )
+    access_token_class = AccessToken
+
+    @property
+    def access_token(self):
+        """
+        Returns an access token created from this refresh token, copying
+        every claim except those in ``no_copy_claims``.
+        """
+        access = self.access_token_class()
+        access.set_exp(from_time=self.current_time)
+
+        for claim, value in self.payload.items():
+            if claim in self.no_copy_claims:
+                continue
+            access[claim] = value
+
+        return access
+
+    @property
+    def is_family_token(self):
+        """
+        False for refresh tokens issued before families existed.
+        """
+        return FAMILY_CLAIM in self.payload
+
+    @property
+    def families(self):
+        """
+        TokenFamily manager for the shard of this token's user.
+        """
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        return TokenFamily.objects.db_manager(shard_for_user_id(user_id))
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Start a new family for ``user`` and return its first refresh token.
+        """
+        token = super().for_user(user)
+        family = TokenFamily.objects.db_manager(shard_for_user_id(user.pk)).create(
+            user=user,
+            expires_at=datetime_from_epoch(token['exp']),
+        )
+        token[FAMILY_CLAIM] = str(family.pk)
+        token[GENERATION_CLAIM] = family.generation
+        return token
+
+    def rotate(self):
+        """
+        Advance the family to the next generation and return the new token.
+
+        Raises:
+            TokenError: If the family is revoked, or if this token's
+                generation was already used outside the grace window
+                (the family is revoked too)
+        """
+        family_id = self.payload[FAMILY_CLAIM]
+        generation = self.payload[GENERATION_CLAIM]
+
+        rotated = FamilyRefreshToken()
+        for claim, value in self.payload.items():
+            if claim not in self.no_copy_claims:
+                rotated[claim] = value
+        # The copy brought the login's iat along; this token is issued now.
+        # (Its access token copies the claim, so it gets the fresh one too.)
+        rotated.set_iat(at_time=rotated.current_time)
+        rotated[GENERATION_CLAIM] = generation + 1
+
+        updated = self.families.filter(
+            pk=family_id,
+            generation=generation,
+            revoked_at__isnull=True,
+        ).update(
+            generation=F('generation') + 1,
+            last_refreshed_at=rotated.current_time,
+            expires_at=datetime_from_epoch(rotated['exp']),
+        )
+        if not updated:
+            if self._rotated_within_grace(generation):
+                # A concurrent refresh of this token won the UPDATE
+                return rotated
+            # Either the family is already revoked, or an older generation
+            # is being replayed. Both mean nobody should hold a valid token.
+            self.revoke()
+            raise TokenError(_('Token is blacklisted'))
+
+        return rotated
+
+    def _rotated_within_grace(self, generation):
+        grace = settings.REFRESH_GRACE['SECONDS']
+        if not grace:
+            return False
+        return self.families.filter(
+            pk=self.payload[FAMILY_CLAIM],
+            generation=generation + 1,
+            revoked_at__isnull=True,
+            last_refreshed_at__gte=timezone.now() - timedelta(seconds=grace),
+        ).exists()
+
+    def family_is_active(self):
+        """
+        Return True unless this token's family has been revoked.
+        """
+        return self.families.filter(
+            pk=self.payload[FAMILY_CLAIM],
+            revoked_at__isnull=True,
+        ).exists()
+
+    def revoke(self):
+        """
+        Revoke every token of this family with a single UPDATE.
+        """
+        self.families.filter(
+            pk=self.payload[FAMILY_CLAIM],
+            revoked_at__isnull=True,
+        ).update(revoked_at=timezone.now())
@@ -1,11 +1,15 @@
 # users/urls.py (Keep this as you have it)
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     UserRegistrationView,
     UserLoginView,
     UserProfileView,
-    UserLogoutView
+    AadhaarRevealView,
+    UserLogoutView,
+    UserTokenRefreshView,
+    TokenIntrospectionView,
+    UserBatchLookupView,
+    UserChangeFeedView
 )
 
 app_name = 'users'
@@ -15,8 +19,14 @@ urlpatterns = [
     path('auth/register/', UserRegistrationView.as_view(), name='register'),
     path('auth/login/', UserLoginView.as_view(), name='login'),
     path('auth/logout/', UserLogoutView.as_view(), name='logout'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/token/refresh/', UserTokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/introspect/', TokenIntrospectionView.as_view(), name='introspect'),
     
     # Profile endpoints
     path('profile/', UserProfileView.as_view(), name='profile'),
+    path('profile/aadhaar/', AadhaarRevealView.as_view(), name='aadhaar_reveal'),
+
+    # Internal service endpoints
+    path('users/batch/', UserBatchLookupView.as_view(), name='user_batch'),
+    path('users/changes/', UserChangeFeedView.as_view(), name='user_changes'),
 ]
\ No newline at end of file
@@ -4,16 +4,29 @@ Handles secure storage of sensitive user data (Aadhaar/ID numbers)
 """
 import os
 import base64
+import hashlib
+import hmac
+import re
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import padding
 from django.conf import settings
 
 
+# One-byte header identifying the binary storage format
+FORMAT_AES_GCM = 0x01
+GCM_NONCE_SIZE = 12
+
+
 class EncryptionHelper:
     """
     AES-256 encryption/decryption helper class for securing sensitive data.
-    Uses CBC mode with PKCS7 padding for robust encryption.
+
+    Two storage formats are supported:
+      - encrypt/decrypt: base64 text of IV + AES-256-CBC ciphertext (legacy)
+      - encrypt_bytes/decrypt_bytes: compact binary AES-256-GCM, authenticated
     """
     
     def __init__(self, key=None):
@@ -34,6 +47,7 @@ class EncryptionHelper:
         
         self.key = key
         self.backend = default_backend()
+        self.aead = AESGCM(key)
     
     def encrypt(self, plaintext):
         """
@@ -111,6 +125,55 @@ class EncryptionHelper:
         except Exception as e:
             raise ValueError(f"Decryption failed: {str(e)}")
     
+    def encrypt_bytes(self, plaintext):
+        """
+        Encrypt plaintext using AES-256-GCM into the compact binary format.
+
+        Layout: 1-byte format header | 12-byte nonce | ciphertext + 16-byte tag.
+        The header is authenticated as associated data.
+
+        Args:
+            plaintext (str): The text to encrypt
+
+        Returns:
+            bytes: Encrypted value, or None for empty input
+        """
+        if not plaintext:
+            return None
+
+        header = bytes([FORMAT_AES_GCM])
+        nonce = os.urandom(GCM_NONCE_SIZE)
+        ciphertext = self.aead.encrypt(nonce, plaintext.encode('utf-8'), header)
+        return header + nonce + ciphertext
+
+    def decrypt_bytes(self, encrypted_data):
+        """
+        Decrypt a value produced by encrypt_bytes.
+
+        Args:
+            encrypted_data (bytes): Binary value including the format header
+
+        Returns:
+            str: Decrypted plaintext
+
+        Raises:
+            ValueError: On an unknown format, or if the value was tampered with
+        """
+        if not encrypted_data:
+            return None
+
+        encrypted_data = bytes(encrypted_data)
+        if encrypted_data[0] != FORMAT_AES_GCM:
+            raise ValueError(f"Decryption failed: unknown format {encrypted_data[0]:#04x}")
+
+        header = encrypted_data[:1]
+        nonce = encrypted_data[1:1 + GCM_NONCE_SIZE]
+        ciphertext = encrypted_data[1 + GCM_NONCE_SIZE:]
+        try:
+            return self.aead.decrypt(nonce, ciphertext, header).decode('utf-8')
+        except InvalidTag:
+            raise ValueError("Decryption failed: authentication tag mismatch")
+
     @staticmethod
     def generate_key():
         """
@@ -137,4 +200,46 @@ class EncryptionHelper:
             # Must have at least IV (16 bytes) + 1 block of ciphertext (16 bytes)
             return len(encrypted_data) >= 32
         except Exception:
-            return False
\ No newline at end of file
+            return False
+
+def mask_aadhaar(aadhaar):
+    """
+    Return the display form of an Aadhaar number, e.g. XXXX-XXXX-1234.
+
+    Args:
+        aadhaar (str): Plaintext Aadhaar number
+
+    Returns:
+        str: Masked value, or None for an empty input
+    """
+    if not aadhaar:
+        return None
+    return f"XXXX-XXXX-{aadhaar[-4:]}"
+
+
+def _blind_index_key():
+    key = getattr(settings, 'AADHAAR_INDEX_KEY', None)
+    if key:
+        return base64.b64decode(key)
+    # Derived from SECRET_KEY, but never equal to the encryption key
+    return hashlib.sha256(b'aadhaar-blind-index:' + settings.SECRET_KEY.encode()).digest()
+
+
+def aadhaar_blind_index(aadhaar):
+    """
+    Return a keyed hash of an Aadhaar number for exact-match lookups.
+
+    The HMAC is deterministic, so equal numbers have equal indexes and can
+    be found through a database index, while the column reveals nothing
+    without the key. Spaces and hyphens are ignored.
+
+    Args:
+        aadhaar (str): Plaintext Aadhaar number
+
+    Returns:
+        str: 64 hex characters, or None for an empty input
+    """
+    digits = re.sub(r'[\s-]', '', aadhaar or '')
+    if not digits:
+        return None
+    return hmac.new(_blind_index_key(), digits.encode('utf-8'), hashlib.sha256).hexdigest()
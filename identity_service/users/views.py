@@ -4,16 +4,38 @@ API Views for user authentication and profile management
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import parse_etags
+from django.views.decorators.http import require_GET
+from identity_service.db_routers import mark_recent_write
 from .models import User
 from .serializers import (
     UserSerializer,
     RegisterSerializer,
     LoginSerializer,
-    ProfileSerializer
+    ProfileSerializer,
+    FamilyTokenRefreshSerializer,
+    TokenIntrospectionSerializer,
+    UserBatchLookupSerializer,
+    UserChangeFeedSerializer
 )
+from .audit import record_aadhaar_access
+from .changes import InvalidCursor, fetch_changes
+from .authentication import IsInternalService, ServiceTokenAuthentication
+from .introspection import introspect_tokens
+from .idempotency import idempotent
+from .jobs import enqueue_many
+from .lookup import lookup_users, may_decrypt_aadhaar
+from .signing import get_jwks_document
+from .tokens import FamilyRefreshToken
 
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -25,13 +47,31 @@ class UserRegistrationView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
     
+    @idempotent('register')
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+
+        # Jobs commit with the user: no lost jobs if the process dies in
+        # between, no jobs for a user whose insert was rolled back. (A user
+        # on another shard commits first; only its jobs can still be lost.)
+        with transaction.atomic():
+            user = serializer.save()
+
+            # Side effects run on the job workers; this is a single INSERT
+            enqueue_many([
+                ('users.send_welcome_email', {'user_id': user.id}),
+                ('users.track_registration', {
+                    'user_id': user.id,
+                    'has_aadhaar': bool(user.aadhaar_ciphertext or user.encrypted_aadhaar),
+                }),
+            ])
+
+        # The new account is not on the replicas yet
+        mark_recent_write(user.id)
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = FamilyRefreshToken.for_user(user)
         
         return Response({
             'message': 'User registered successfully',
@@ -56,6 +96,7 @@ class UserLoginView(APIView):
     permission_classes = [AllowAny]
     serializer_class = LoginSerializer
     
+    @idempotent('login')
     def post(self, request):
         # Pass the request context to the serializer
         serializer = self.serializer_class(data=request.data, context={'request': request})
@@ -84,6 +125,14 @@ class UserLoginView(APIView):
 
 
 
+class UserTokenRefreshView(TokenRefreshView):
+    """
+    API endpoint for rotating a refresh token.
+    POST /api/auth/token/refresh/
+    """
+    serializer_class = FamilyTokenRefreshSerializer
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
    
     serializer_class = ProfileSerializer 
@@ -123,6 +172,29 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         }, status=status.HTTP_200_OK)
 
 
+class AadhaarRevealView(APIView):
+    """
+    API endpoint returning the caller's full Aadhaar number.
+    GET /api/profile/aadhaar/
+
+    The only place the plaintext is decrypted for display; every reveal
+    is written to the Aadhaar access log.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        aadhaar = request.user.get_aadhaar()
+        if aadhaar is None:
+            return Response({
+                'error': 'No Aadhaar number on file'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        record_aadhaar_access(request.user, request)
+        response = Response({'aadhaar': aadhaar}, status=status.HTTP_200_OK)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
 class UserLogoutView(APIView):
     """
     API endpoint for user logout (blacklist refresh token).
@@ -138,8 +210,12 @@ class UserLogoutView(APIView):
                     'error': 'Refresh token is required'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            token = RefreshToken(refresh_token)
-            token.blacklist()
+            token = FamilyRefreshToken(refresh_token)
+            if token.is_family_token:
+                # Revokes every refresh token of this login session
+                token.revoke()
+            else:
+                RefreshToken(refresh_token).blacklist()
             
             return Response({
                 'message': 'Logout successful'
@@ -147,4 +223,131 @@ class UserLogoutView(APIView):
         except Exception as e:
             return Response({
                 'error': 'Invalid token or token already blacklisted'
-            }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TokenIntrospectionView(APIView):
+    """
+    API endpoint for internal services to check a batch of tokens.
+    POST /api/auth/introspect/
+
+    Returns one result per token, in request order, with a cache_ttl
+    hint telling the caller how long it may reuse the answer.
+    """
+    authentication_classes = [ServiceTokenAuthentication]
+    permission_classes = [IsInternalService]
+
+    def post(self, request):
+        serializer = TokenIntrospectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = introspect_tokens(serializer.validated_data['tokens'])
+
+        return Response(
+            {'results': results},
+            status=status.HTTP_200_OK,
+            headers={'Cache-Control': 'no-store'}
+        )
+
+
+class UserBatchLookupView(APIView):
+    """
+    API endpoint for internal services to resolve many users at once.
+    POST /api/users/batch/
+
+    Accepts ``ids`` or ``emails`` plus the ``fields`` to return, and streams
+    one result per key back in request order; unknown keys come back with
+    ``found: false``. ``include_aadhaar`` decrypts the numbers too, for the
+    services listed in USER_BATCH_LOOKUP['AADHAAR_SERVICES'] only.
+    """
+    authentication_classes = [ServiceTokenAuthentication]
+    permission_classes = [IsInternalService]
+
+    def post(self, request):
+        serializer = UserBatchLookupSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if data['include_aadhaar'] and not may_decrypt_aadhaar(request.user):
+            raise PermissionDenied('This service may not read Aadhaar numbers')
+
+        results = lookup_users(
+            data['keys'],
+            key_field=data['key_field'],
+            fields=data['fields'],
+            include_aadhaar=data['include_aadhaar'],
+            request=request,
+        )
+        return json_stream_response(results)
+
+
+class UserChangeFeedView(APIView):
+    """
+    API endpoint for internal services to mirror users incrementally.
+    GET /api/users/changes/?cursor=<next_cursor>&limit=<n>
+
+    Streams the users changed since ``cursor`` (all users when omitted) in
+    (updated_at, id) order: ``upsert`` rows with the profile and ``delete``
+    tombstones for deactivated users, followed by ``next_cursor`` and
+    ``has_more``.
+    """
+    authentication_classes = [ServiceTokenAuthentication]
+    permission_classes = [IsInternalService]
+
+    def get(self, request):
+        serializer = UserChangeFeedSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            changes, next_cursor, has_more = fetch_changes(
+                serializer.validated_data.get('cursor'),
+                serializer.validated_data.get('limit'),
+            )
+        except InvalidCursor as e:
+            return Response({'cursor': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return json_stream_response(changes, next_cursor=next_cursor, has_more=has_more)
+
+
+def json_stream_response(results, **extra):
+    """
+    Stream ``{"results": [...], **extra}`` one result at a time.
+    """
+    encoder = JSONEncoder()
+
+    def stream():
+        yield '{"results": ['
+        for index, result in enumerate(results):
+            yield (',' if index else '') + encoder.encode(result)
+        yield ']'
+        for key, value in extra.items():
+            yield f', {encoder.encode(key)}: {encoder.encode(value)}'
+        yield '}'
+
+    response = StreamingHttpResponse(stream(), content_type='application/json')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@require_GET
+def jwks_view(request):
+    """
+    Public signing keys for local token verification.
+    GET /.well-known/jwks.json
+
+    The document is built once per key ring and served with an ETag so
+    downstream verifiers can revalidate cheaply.
+    """
+    body, etag = get_jwks_document()
+    max_age = settings.JWKS_CACHE_MAX_AGE
+    cache_control = f'public, max-age={max_age}, stale-while-revalidate={max_age}'
+
+    # Weak comparison, as If-None-Match requires: W/"x" matches "x"
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in if_none_match or etag in (tag.removeprefix('W/') for tag in if_none_match):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,136 @@
+"""
+Worker warm-up.
+
+Without it, the first request each worker serves pays for importing the
+views, building DRF serializer fields, loading the cryptography backend,
+the password hashers and the JWT backend. UsersConfig.ready() calls start_warm_up() when
+``settings.WARMUP_ON_STARTUP`` is set (wsgi.py and asgi.py turn it on), and
+/readyz answers 503 until the warm-up has finished.
+
+Database connections are not warmed: Django keeps one per thread, so a
+connection opened here would never serve a request.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+_done = threading.Event()
+_start_lock = threading.Lock()
+_thread = None
+
+# Step name -> milliseconds, for logs and /readyz
+timings = {}
+
+
+def _load_urls():
+    from django.urls import get_resolver
+    # Resolving the URLconf imports every view module
+    get_resolver().url_patterns
+
+
+def _build_serializers():
+    from .serializers import LoginSerializer, ProfileSerializer, RegisterSerializer, UserSerializer
+    for serializer_class in (LoginSerializer, ProfileSerializer, RegisterSerializer, UserSerializer):
+        serializer_class().fields
+
+
+def _load_authentication():
+    from rest_framework.settings import api_settings
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        authentication_class()
+
+
+def _load_crypto():
+    from .utils import EncryptionHelper
+    helper = EncryptionHelper()
+    helper.decrypt_bytes(helper.encrypt_bytes('000000000000'))
+
+
+def _load_hashers():
+    from django.contrib.auth.hashers import get_hasher
+    get_hasher()
+
+
+def _load_jwt():
+    from rest_framework_simplejwt.settings import api_settings
+    from .tokens import AccessToken
+    token = AccessToken()
+    token[api_settings.USER_ID_CLAIM] = 0
+    AccessToken(str(token))
+
+
+STEPS = [
+    ('urls', _load_urls),
+    ('serializers', _build_serializers),
+    ('authentication', _load_authentication),
+    ('crypto', _load_crypto),
+    ('hashers', _load_hashers),
+    ('jwt', _load_jwt),
+]
+
+
+def warm_up():
+    """
+    Run every warm-up step. A failing step is logged and skipped.
+    """
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up step '%s' failed", name)
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    _done.set()
+    logger.info("Worker warm-up finished in %.1f ms", sum(timings.values()))
+
+
+def _run():
+    # The URLconf must not be loaded before every app (admin) is ready
+    apps.ready_event.wait()
+    try:
+        warm_up()
+    finally:
+        # In case a step touched the database: this thread's connections
+        # would otherwise stay open until the process exits
+        connections.close_all()
+
+
+def start_warm_up():
+    """
+    Warm up in a background thread, once per process.
+    """
+    global _thread
+    with _start_lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run, name='worker-warmup', daemon=True)
+        _thread.start()
+
+
+def _restart_after_fork():
+    # Servers that import the app before forking (gunicorn --preload) copy
+    # this module's state, but not the thread: finish the job in the child.
+    global _thread
+    if _thread is None or _done.is_set():
+        return
+    _thread = None
+    start_warm_up()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def is_warm():
+    """
+    True once warm-up has finished, or when it is not enabled.
+    """
+    return _done.is_set() or not settings.WARMUP_ON_STARTUP